@@ -1,20 +1,32 @@
 import random
-from typing import List, Optional, Tuple 
+from typing import List, Optional
 
 from acquisitions.game_logic.constants import *
 from acquisitions.game_logic.player import *
+from acquisitions.game_logic.results import *
 from acquisitions.game_logic.tile import *
+from acquisitions.game_logic.zobrist import *
 
 class BankState:
-    def __init__(self):
+    def __init__(self, rng: Optional[random.Random] = None):
+        """
+        rng is used to shuffle the tile pool; pass a seeded random.Random
+        for a reproducible game. Defaults to the global random module.
+        """
         self.property = [TOTAL_SHARES] * NUM_HOTELS
-        self.tiles = [Tile(r, c) for r in range(NUM_ROWS) for c in range(NUM_COLS)]
-        random.shuffle(self.tiles)
+        self.tiles = list(TILES)
+        (rng or random).shuffle(self.tiles)
+
+    def clone(self) -> "BankState":
+        bank = BankState.__new__(BankState)
+        bank.property = self.property[:]
+        bank.tiles = self.tiles[:]
+        return bank
 
     def draw_tile(self, player: PlayerState):
         tile = self.tiles.pop() if self.tiles else None
         if tile:
-            player.tiles.append(tile) 
+            player.tiles.add(tile) 
     
     def issue_free_share(self, player: PlayerState, hotel: Hotel):
         if self.property[hotel.value] > 0:
@@ -24,62 +36,45 @@ class BankState:
             self, 
             player: PlayerState, 
             buy_order: List[int],
-            hotel_sizes: List[int]) -> Tuple[bool, str]:
+            hotel_sizes: List[int]) -> TransactionResult:
         """ 
         buy_order is a list of quantities of each share player wants.
         """
-        valid, cost, msg = self.validate_transaction(player, buy_order, hotel_sizes)
-        if not valid:
-            return False, msg
-        player.money -= cost
-        msg += f"Awarding the following shares: \n"
+        result = self.validate_transaction(player, buy_order, hotel_sizes)
+        if not result.success:
+            return result
+        player.money -= result.cost
         for (hotel, shares) in filter(lambda p: p[1], zip(Hotel, buy_order)):
-            msg += f"{hotel.name}: {shares}, "
             self.transfer(player, hotel, shares)
-        return True, msg
+        return result._replace(buy_order=list(buy_order))
 
     def validate_transaction(
             self, 
             player: PlayerState, 
             buy_order: List[int],
-            hotel_sizes: List[int]) -> Tuple[bool, int, str]:
-        share_prices = [share_price(hotel, size) for (hotel, size) in zip(Hotel, hotel_sizes)]
+            hotel_sizes: List[int]) -> TransactionResult:
+        prices = share_prices(hotel_sizes)
         total_shares = sum(buy_order)
         if total_shares > MAX_SHARES_PER_TURN:
-            msg = f"Transaction rejected.\n Max {MAX_SHARES_PER_TURN} can be purchased in one turn. Please try again."
-            return False, 0, msg 
+            return TransactionResult(False, error=TransactionError.TOO_MANY_SHARES)
         if any(x < 0 for x in buy_order):
-            msg = (
-                f"Transaction rejected. Cannot have negative "
-                f"entries in buy order. Please try again."
-            )
-            return False, 0, msg
+            return TransactionResult(False, error=TransactionError.NEGATIVE_QUANTITY)
 
         cost = 0
-        for (hotel, num_shares, size, price) in zip(Hotel, buy_order, hotel_sizes, share_prices):
+        for (hotel, num_shares, size, price) in zip(Hotel, buy_order, hotel_sizes, prices):
             if size == 0 and num_shares > 0:
-                msg = (
-                    f"Transaction rejected; attempt to purchase {hotel.name} "
-                    f"which is not on board. Please try again."
-                )
-                return False, 0, msg
+                return TransactionResult(
+                    False, error=TransactionError.HOTEL_NOT_ON_BOARD, hotel=hotel)
             if num_shares > self.property[hotel.value]:
-                msg = (
-                    f"Transaction rejected; only {self.property[hotel.value]} "
-                    f"shares of {hotel.name} available. Please try again."
-                )
-                return False, 0, msg
+                return TransactionResult(
+                    False, error=TransactionError.SHARES_UNAVAILABLE, hotel=hotel,
+                    available=self.property[hotel.value])
             cost += num_shares * price
         if cost > player.money:
-            msg = (
-                f"Transaction rejected; player has insufficient funds.\n"
-                f"Please try again."
-            )
-            return False, 0, msg
-        msg = f"Transaction valid!\n"
-        return True, cost, msg
+            return TransactionResult(False, error=TransactionError.INSUFFICIENT_FUNDS)
+        return TransactionResult(True, cost)
     
-    def grant_awards(self, players: List[PlayerState], hotel: Hotel, size) -> str:
+    def grant_awards(self, players: List[PlayerState], hotel: Hotel, size) -> AwardResult:
         """
         In the most common case, the player with the most shares of hotel
         receives a majority award, and the player with the 2nd most shares
@@ -97,43 +92,35 @@ class BankState:
         """
         ownership = [p.property[hotel.value] for p in players]
         ranking = sorted(zip(players, ownership), key=lambda x: -x[1])
-        msg = f"\nGranting awards for {hotel.name}.\n"
-        if ranking[0][1] == 0:
-            msg += f"No shareholders of {hotel.name}"
-            return msg  # Case 0
-        
         majority_bonus = majority_holder_award(hotel, size)
         minority_bonus = minority_holder_award(hotel, size)
-        msg += (
-            f"Majority and minority awards are "
-            f"{majority_bonus} and {minority_bonus}.\n"
-        )
+        awards = []
+        if ranking[0][1] == 0:
+            return AwardResult(hotel, majority_bonus, minority_bonus, awards)  # Case 0
+        
         num_majority_holders = sum(1 for x in ranking if x[1] == ranking[0][1])
         if num_majority_holders >= 2:  # Case 1
-            msg += f"Splitting majority bonus among: "
             bonus_per_winner = (majority_bonus + minority_bonus) // num_majority_holders
             bonus_per_winner = (bonus_per_winner // 100) * 100  # round to nearest 100
             for i in range(num_majority_holders):
                 ranking[i][0].money += bonus_per_winner
-                msg += f"{ranking[i][0].name}, "
-            return msg
+                awards.append(Award(ranking[i][0].name, AwardKind.SPLIT, bonus_per_winner))
+            return AwardResult(hotel, majority_bonus, minority_bonus, awards)
         # Cases 2-4
-        msg += f"Awarding majority bonus to: {ranking[0][0].name} \n"
         ranking[0][0].money += majority_bonus
+        awards.append(Award(ranking[0][0].name, AwardKind.MAJORITY, majority_bonus))
         num_minority_holders = sum(1 for x in ranking if x[1] == ranking[1][1] and x[1] > 0)
         if num_minority_holders == 0:  # Case 2
-            msg += f"No minority holders; awarding minority bonus " \
-                 f"to {ranking[0][0].name} \n"
             ranking[0][0].money += minority_bonus
-            return msg
+            awards.append(Award(ranking[0][0].name, AwardKind.MINORITY, minority_bonus))
+            return AwardResult(hotel, majority_bonus, minority_bonus, awards)
         # Cases 3 and 4
         bonus_per_runnerup = minority_bonus // num_minority_holders
         bonus_per_runnerup = (bonus_per_runnerup // 100) * 100
-        msg += f"Awarding minority grant to: " 
         for i in range(1, num_minority_holders+1):
-            msg += f"{ranking[i][0].name}, "
             ranking[i][0].money += bonus_per_runnerup
-        return msg
+            awards.append(Award(ranking[i][0].name, AwardKind.MINORITY, bonus_per_runnerup))
+        return AwardResult(hotel, majority_bonus, minority_bonus, awards)
 
     def liquidate_shares(
             self, 
@@ -142,67 +129,60 @@ class BankState:
             size: int,
             sell: int, 
             twofer: int, 
-            owning_hotel: Hotel) -> Tuple[bool, str]:
+            owning_hotel: Hotel) -> LiquidationResult:
         # validation
-        msg = ""
+        if sell < 0 or twofer < 0:
+            return LiquidationResult(
+                False, player.name, liquidated_hotel, owning_hotel,
+                error=LiquidationError.NEGATIVE_QUANTITY)
         transaction_shares = sell + twofer 
         if transaction_shares > player.property[liquidated_hotel.value]:
-            msg = (
-                f"{player.name} does not have enough shares for this"
-                f"transaction. Please try again."
-            )
-            return False, msg
+            return LiquidationResult(
+                False, player.name, liquidated_hotel, owning_hotel,
+                error=LiquidationError.NOT_ENOUGH_SHARES)
         
-        if twofer % 2:
-            msg = "Rolling over remainder of twofer to sell\n"
+        rolled_over = bool(twofer % 2)
+        if rolled_over:
             twofer, sell = twofer-1, sell+1
 
         owning_hotel_shares = twofer // 2
         if self.property[owning_hotel.value] < owning_hotel_shares:
-            msg = (
-                f"Rejecting transaction; bank has insufficient shares of" 
-                f"{owning_hotel.name} for selected twofer. Please try again."
-            )
-            return False, msg
+            return LiquidationResult(
+                False, player.name, liquidated_hotel, owning_hotel,
+                error=LiquidationError.BANK_SHARES_UNAVAILABLE)
         
         # execution
-        player.money += share_price(liquidated_hotel, size) * sell
+        proceeds = share_price(liquidated_hotel, size) * sell
+        player.money += proceeds
         self.transfer(player, liquidated_hotel, -transaction_shares)
         self.transfer(player, owning_hotel, owning_hotel_shares)
-        return True, msg + f"\nLiquidation successful"
+        return LiquidationResult(
+            True, player.name, liquidated_hotel, owning_hotel,
+            sell, twofer, proceeds, rolled_over)
 
     def tally_scores(
-            self, players: List[PlayerState], hotel_sizes: List[int]) -> str:
-        msg = "Tallying final scores!\n"
+            self, players: List[PlayerState], hotel_sizes: List[int]) -> FinalScores:
+        liquidations = []
         for (hotel, size) in zip(Hotel, hotel_sizes):
-            if hotel.value < NUM_HOTELS:
-                msg += self.liquidate_all(players, hotel, hotel_sizes[hotel.value])
-        msg += f"Final scores:\n "
+            if hotel.value < NUM_HOTELS and size:
+                liquidations.append(self.liquidate_all(players, hotel, size))
         scores = [p.money for p in players]
         rankings = sorted(zip(players, scores), key=lambda x: -x[1])
-        for (player, money) in rankings:
-            msg += f"{player.name}: {money} \n"
-        winners = [x[0].name for x in rankings if x[1] == x[0][1]]
-        if len(winners) == 1:
-            msg += f"The winner is: {winners[0]}. Congratulations!\n"
-        else:
-            msg += f"The winners are: {winners}. Congratulations!\n"
-        return msg
+        winners = [x[0].name for x in rankings if x[1] == rankings[0][1]]
+        return FinalScores(
+            liquidations, [(player.name, money) for (player, money) in rankings], winners)
 
     def liquidate_all(
-            self, players: List[PlayerState], hotel: Hotel, size: int) -> str:
-        if not size:
-            return ""
-        msg = self.grant_awards(players, hotel, size)
-        msg += f"\nLiquidating assets for {hotel.name} \n"
+            self, players: List[PlayerState], hotel: Hotel, size: int) -> HotelLiquidation:
+        awards = self.grant_awards(players, hotel, size)
         share_value = share_price(hotel, size)
-        msg += f"\nShare value is {share_value}"
+        payouts = []
         for player in players:
             n_shares = player.property[hotel.value]
             liquidity = share_value * n_shares
-            msg += f"{player.name} has {n_shares}; liquid value is {liquidity} \n"
+            payouts.append((player.name, n_shares, liquidity))
             player.money += liquidity
-        return msg
+        return HotelLiquidation(hotel, share_value, awards, payouts)
 
     def transfer(self, player: PlayerState, hotel: Hotel, k: int):
         """
@@ -210,5 +190,8 @@ class BankState:
         Negative value of k means transfer of |k| from player to bank.
         pre: all validation done prior to this call.
         """
-        player.property[hotel.value] += k
+        keys = SHARE_KEYS[hotel.value]
+        held = player.property[hotel.value]
+        player.zobrist ^= keys[held] ^ keys[held + k]
+        player.property[hotel.value] = held + k
         self.property[hotel.value] -= k
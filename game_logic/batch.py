@@ -0,0 +1,234 @@
+import argparse
+import math
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, List, Optional
+
+from acquisitions.game_logic.constants import *
+from acquisitions.game_logic.simulator import *
+
+# Builds the per-seat policies inside each worker process. Must be picklable,
+# i.e. a module-level function.
+PolicyFactory = Callable[[int], List[Policy]]
+
+
+def random_policies(num_players: int) -> List[Policy]:
+    return [Policy() for _ in range(num_players)]
+
+
+class RunningStats:
+    """
+    Streaming count / mean / variance / min / max (Welford's algorithm),
+    mergeable across shards (Chan et al.).
+    """
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, x: float):
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (x - self.mean)
+        self.min = min(self.min, x)
+        self.max = max(self.max, x)
+
+    def merge(self, other: "RunningStats"):
+        if not other.count:
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    @property
+    def stddev(self) -> float:
+        return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else 0.0
+
+    def __str__(self):
+        return (f"mean {self.mean:.1f}, stddev {self.stddev:.1f}, "
+                f"min {self.min:g}, max {self.max:g}")
+
+
+class Histogram:
+    """Fixed-width bucket counts; values past the last bucket are clamped."""
+    def __init__(self, bucket_width: int, num_buckets: int):
+        self.bucket_width = bucket_width
+        self.counts = [0] * num_buckets
+
+    def add(self, x: float):
+        bucket = min(max(int(x // self.bucket_width), 0), len(self.counts) - 1)
+        self.counts[bucket] += 1
+
+    def merge(self, other: "Histogram"):
+        for i, count in enumerate(other.counts):
+            self.counts[i] += count
+
+
+class BatchSummary:
+    """
+    Streaming reducer over GameResults. Holds only aggregates, so its size
+    does not depend on the number of games, and two summaries of disjoint
+    sets of games can be merged.
+    """
+    def __init__(self, num_players: int):
+        self.num_players = num_players
+        self.num_games = 0
+        self.wins = [0.0] * num_players  # ties split the win
+        self.money = [RunningStats() for _ in range(num_players)]
+        self.winning_money = RunningStats()
+        self.money_histogram = Histogram(bucket_width=1000, num_buckets=100)
+        self.mergers = RunningStats()
+        self.chains_started = RunningStats()
+        self.dead_tiles = RunningStats()
+        self.turns = RunningStats()
+        self.elapsed = 0.0  # wall time spent playing, summed over shards
+
+    def add(self, result: GameResult):
+        self.num_games += 1
+        for seat in result.winners:
+            self.wins[seat] += 1 / len(result.winners)
+        for seat, score in enumerate(result.scores):
+            self.money[seat].add(score)
+            self.money_histogram.add(score)
+        self.winning_money.add(max(result.scores))
+        self.mergers.add(result.num_mergers)
+        self.chains_started.add(result.num_chains_started)
+        self.dead_tiles.add(result.num_dead_tiles)
+        self.turns.add(result.num_turns)
+
+    def merge(self, other: "BatchSummary"):
+        self.num_games += other.num_games
+        for seat in range(self.num_players):
+            self.wins[seat] += other.wins[seat]
+            self.money[seat].merge(other.money[seat])
+        self.winning_money.merge(other.winning_money)
+        self.money_histogram.merge(other.money_histogram)
+        self.mergers.merge(other.mergers)
+        self.chains_started.merge(other.chains_started)
+        self.dead_tiles.merge(other.dead_tiles)
+        self.turns.merge(other.turns)
+        self.elapsed += other.elapsed
+
+    @property
+    def win_rates(self) -> List[float]:
+        return [w / self.num_games if self.num_games else 0.0 for w in self.wins]
+
+    def __str__(self):
+        lines = [f"Games: {self.num_games}"]
+        for seat in range(self.num_players):
+            lines.append(
+                f"Seat {seat}: win rate {self.win_rates[seat]:.3f}, "
+                f"money {self.money[seat]}")
+        lines.append(f"Winning money: {self.winning_money}")
+        lines.append(f"Mergers per game: {self.mergers}")
+        lines.append(f"Chains started per game: {self.chains_started}")
+        lines.append(f"Dead tiles per game: {self.dead_tiles}")
+        return "\n".join(lines)
+
+
+def run_shard(
+        num_players: int,
+        policy_factory: PolicyFactory,
+        seed: int,
+        first_game: int,
+        num_games: int) -> BatchSummary:
+    """Plays games [first_game, first_game + num_games) of a seeded run."""
+    summary = BatchSummary(num_players)
+    simulator = Simulator(policy_factory(num_players), seed)
+    report = simulator.run(num_games, on_result=summary.add, first_game=first_game)
+    summary.elapsed = report.elapsed
+    return summary
+
+
+class BatchRunner:
+    """
+    Fans a seeded run of headless games out across a ProcessPoolExecutor.
+    Game i of the run is seeded with game_seed(seed, i), so the aggregate
+    result depends only on (seed, num_games), not on the number of workers
+    or the shard size. Workers return BatchSummary reducers, which are merged
+    in shard order, so that floating point sums are added in the same order
+    on every run.
+    """
+    def __init__(
+            self,
+            num_players: int,
+            policy_factory: PolicyFactory = random_policies,
+            seed: Optional[int] = None,
+            workers: Optional[int] = None,
+            shard_size: int = 1000):
+        self.num_players = num_players
+        self.policy_factory = policy_factory
+        self.seed = seed if seed is not None else random.getrandbits(32)
+        self.workers = workers or os.cpu_count() or 1
+        self.shard_size = shard_size
+
+    def run(self, num_games: int) -> "BatchReport":
+        summary = BatchSummary(self.num_players)
+        start = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            futures = [
+                executor.submit(
+                    run_shard, self.num_players, self.policy_factory, self.seed,
+                    first_game, min(self.shard_size, num_games - first_game))
+                for first_game in range(0, num_games, self.shard_size)
+            ]
+            for future in futures:
+                summary.merge(future.result())
+        return BatchReport(summary, time.perf_counter() - start, self.workers)
+
+
+class BatchReport:
+    def __init__(self, summary: BatchSummary, elapsed: float, workers: int):
+        self.summary = summary
+        self.elapsed = elapsed
+        self.workers = workers
+
+    @property
+    def games_per_sec(self) -> float:
+        return self.summary.num_games / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def parallel_efficiency(self) -> float:
+        """
+        Summed per-shard wall time over (workers * total wall time). Close
+        to 1 when every worker was busy for the whole run; on oversubscribed
+        hosts the per-shard times inflate too, so compare games_per_sec.
+        """
+        if not self.elapsed:
+            return 0.0
+        return self.summary.elapsed / self.elapsed / self.workers
+
+    def __str__(self):
+        return (
+            f"{self.summary}\n"
+            f"{self.summary.num_games} games in {self.elapsed:.2f}s on "
+            f"{self.workers} workers ({self.games_per_sec:.1f} games/sec, "
+            f"{self.games_per_sec * 3600:.0f} games/hour, "
+            f"parallel efficiency {self.parallel_efficiency:.2f})"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a seeded batch of headless Acquisitions games.")
+    parser.add_argument("--games", type=int, default=100000)
+    parser.add_argument("--players", type=int, default=DEFAULT_PLAYERS)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--shard-size", type=int, default=1000)
+    args = parser.parse_args()
+    runner = BatchRunner(
+        args.players, seed=args.seed, workers=args.workers, shard_size=args.shard_size)
+    print(runner.run(args.games))
+
+# To run: python -m acquisitions.game_logic.batch from top level dir
+if __name__ == "__main__":
+    main()
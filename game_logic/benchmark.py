@@ -0,0 +1,413 @@
+import argparse
+import asyncio
+import gc
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from acquisitions.game_logic.constants import *
+from acquisitions.game_logic.tile import *
+from acquisitions.game_logic.player import *
+from acquisitions.game_logic.board_state import *
+from acquisitions.game_logic.bank import *
+from acquisitions.game_logic.game_orchestrator import GameOrchestrator
+from acquisitions.game_logic.simulator import *
+from acquisitions.ui.ui_interface import BaseUI
+
+# Benchmarks of the game logic's hot paths and of whole games, for catching
+# performance regressions between commits. The board size is fixed when the
+# game logic is imported (see BOARD_SIZE_ENV), so each board size is
+# benchmarked in a subprocess of its own. Every benchmark is seeded: a run
+# with the same seed times the same boards, hands and choices.
+#
+# Results are written as JSON (to stdout, or --out) and can be compared with
+# a previous run's with --compare, e.g.
+#   python -m acquisitions.game_logic.benchmark --out before.json
+#   (change something)
+#   python -m acquisitions.game_logic.benchmark --compare before.json
+
+DEFAULT_BOARDS = "3x4,9x12,18x24"
+DEFAULT_RUNS = 20
+REGRESSION_THRESHOLD = 0.10  # slowdown of the median flagged by --compare
+ARM_LENGTHS = (12, 11, 10, 9)  # chain sizes meeting in the merger benchmarks
+ARM_DIRECTIONS = ((0, -1), (0, 1), (-1, 0), (1, 0))
+BATCH = 1000  # calls per run of the benchmarks of quick, repeatable calls
+BOARDS_PER_RUN = 100  # boards per run of the benchmarks that use boards up
+
+
+class Benchmark(NamedTuple):
+    name: str
+    # Builds what one run works on, from the benchmark's rng; not timed
+    setup: Callable[[random.Random], object]
+    # The timed part of a run; returns the number of operations it did
+    run: Callable[[object], int]
+
+
+class BenchmarkResult(NamedTuple):
+    board: str  # e.g. 9x12
+    name: str
+    ops: int  # operations per run
+    runs: int
+    min_us: float  # microseconds per operation
+    median_us: float
+    mean_us: float
+
+
+def measure(benchmark: Benchmark, runs: int, seed: int) -> BenchmarkResult:
+    rng = random.Random(seed)
+    times = []
+    for _ in range(runs):
+        state = benchmark.setup(rng)
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            ops = benchmark.run(state)
+            elapsed = time.perf_counter() - start
+        finally:
+            gc.enable()
+        times.append(elapsed * 1e6 / ops)
+    return BenchmarkResult(
+        f"{NUM_ROWS}x{NUM_COLS}", benchmark.name, ops, runs,
+        min(times), statistics.median(times), statistics.fmean(times))
+
+
+# Board benchmarks
+
+def fill_board(board_state: BoardState, rng: random.Random) -> List[Tuple[Tile, Optional[List[Hotel]]]]:
+    """
+    Places every playable tile, in random order, starting chains and
+    resolving mergers as a game would. Returns the steps taken: each tile,
+    with the hotel it started or the hotels of the merger it caused.
+    """
+    steps = []
+    tiles = list(TILES)
+    rng.shuffle(tiles)
+    for tile in tiles:
+        if board_state.classify(tile) == TileClass.UNPLAYABLE:
+            continue
+        event = board_state.place_tile(tile)
+        hotels = None
+        if event == GameEvent.START_CHAIN and board_state.available_hotels():
+            hotels = [rng.choice(board_state.available_hotels())]
+            board_state.mark_recursive(tile, hotels[0])
+        elif event == GameEvent.MERGER:
+            _, _, hotels = board_state.check_merger(tile)
+            board_state.execute_merger(tile, hotels)
+        steps.append((tile, hotels))
+    return steps
+
+
+def replay_fill(state) -> int:
+    board_state, steps = state
+    for tile, hotels in steps:
+        event = board_state.place_tile(tile)
+        if hotels is None:
+            continue
+        if event == GameEvent.MERGER:
+            board_state.execute_merger(tile, hotels)
+        else:
+            board_state.mark_recursive(tile, hotels[0])
+    return len(steps)
+
+
+def large_chain_boards(rng: random.Random):
+    """Boards whose top half is one chain without a hotel, and a tile of it."""
+    board_state = BoardState()
+    half = TILES[:max(NUM_ROWS // 2, 1) * NUM_COLS]
+    for tile in half:
+        board_state.place_tile(tile)
+    hotel = rng.choice(board_state.available_hotels())
+    return [board_state.clone() for _ in range(BOARDS_PER_RUN)], rng.choice(half), hotel
+
+
+def mark_large_chains(state) -> int:
+    boards, tile, hotel = state
+    for board_state in boards:
+        board_state.mark_recursive(tile, hotel)
+    return len(boards)
+
+
+def merger_board(ways: int) -> Tuple[BoardState, Tile, List[Hotel]]:
+    """
+    A board on which the center tile merges `ways` hotels, whose chains run
+    straight out from it (as long as the board allows, up to ARM_LENGTHS).
+    The center tile has been placed; returns the board, the center tile and
+    the hotels of the merger.
+    """
+    board_state = BoardState()
+    r0, c0 = NUM_ROWS // 2, NUM_COLS // 2
+    arms = 0
+    for (dr, dc), length, hotel in zip(ARM_DIRECTIONS, ARM_LENGTHS, Hotel):
+        arm = []
+        for j in range(1, length + 1):
+            if not (0 <= r0 + dr * j < NUM_ROWS and 0 <= c0 + dc * j < NUM_COLS):
+                break
+            arm.append(Tile(r0 + dr * j, c0 + dc * j))
+        if not arm:
+            continue
+        for tile in arm:
+            board_state.place_tile(tile)
+        board_state.mark_recursive(arm[0], hotel)
+        arms += 1
+        if arms == ways:
+            break
+    center = Tile(r0, c0)
+    board_state.place_tile(center)
+    _, _, hotels = board_state.check_merger(center)
+    return board_state, center, hotels
+
+
+def check_mergers(state) -> int:
+    board_state, tile = state
+    for _ in range(BATCH):
+        board_state.check_merger(tile)
+    return BATCH
+
+
+def execute_mergers(state) -> int:
+    boards, tile, hotels = state
+    for board_state in boards:
+        board_state.execute_merger(tile, hotels)
+    return len(boards)
+
+
+def merger_benchmarks(ways: int) -> List[Benchmark]:
+    def setup_check(rng):
+        board_state, tile, _ = merger_board(ways)
+        return board_state, tile
+
+    def setup_execute(rng):
+        board_state, tile, hotels = merger_board(ways)
+        return [board_state.clone() for _ in range(BOARDS_PER_RUN)], tile, hotels
+
+    return [
+        Benchmark(f"check_merger_{ways}way", setup_check, check_mergers),
+        Benchmark(f"execute_merger_{ways}way", setup_execute, execute_mergers),
+    ]
+
+
+# Bank benchmarks
+
+def shareholders(rng: random.Random, num_players: int = 4) -> List[PlayerState]:
+    return [
+        PlayerState(f"Player{i}", property=[
+            rng.randint(0, TOTAL_SHARES // num_players) for _ in range(NUM_HOTELS)])
+        for i in range(num_players)
+    ]
+
+
+def random_hotel_sizes(rng: random.Random) -> List[int]:
+    return [rng.randint(2, 2 * MAX_MERGEABLE_SIZE) for _ in range(NUM_HOTELS)] + [0]
+
+
+def validate_transactions(state) -> int:
+    bank, player, buy_order, hotel_sizes = state
+    for _ in range(BATCH):
+        bank.validate_transaction(player, buy_order, hotel_sizes)
+    return BATCH
+
+
+def grant_many_awards(state) -> int:
+    bank, players, hotel, size = state
+    for _ in range(BATCH):
+        bank.grant_awards(players, hotel, size)
+    return BATCH
+
+
+def tally_many_scores(state) -> int:
+    bank, players, hotel_sizes = state
+    for _ in range(BATCH // 10):
+        bank.tally_scores(players, hotel_sizes)
+    return BATCH // 10
+
+
+def bank_benchmarks() -> List[Benchmark]:
+    def setup_transaction(rng):
+        buy_order = [0] * NUM_HOTELS
+        for hotel in rng.sample(range(NUM_HOTELS), MAX_SHARES_PER_TURN):
+            buy_order[hotel] = 1
+        return BankState(rng), PlayerState("Player0"), buy_order, random_hotel_sizes(rng)
+
+    def setup_awards(rng):
+        return BankState(rng), shareholders(rng), rng.choice(list(Hotel)[:NUM_HOTELS]), rng.randint(2, 41)
+
+    def setup_tally(rng):
+        return BankState(rng), shareholders(rng), random_hotel_sizes(rng)
+
+    return [
+        Benchmark("validate_transaction", setup_transaction, validate_transactions),
+        Benchmark("grant_awards", setup_awards, grant_many_awards),
+        Benchmark("tally_scores", setup_tally, tally_many_scores),
+    ]
+
+
+# Whole games
+
+class ScriptedUI(BaseUI):
+    """Answers every prompt of a GameOrchestrator with a random legal choice."""
+    def __init__(self, rng: random.Random):
+        self.rng = rng
+        self.game = None
+
+    def render_board(self, cell_states):
+        pass
+
+    def display_message(self, msg: str):
+        pass
+
+    async def get_tile_from_user(self, player: PlayerState) -> Tile:
+        return self.rng.choice(self.game.legal_actions())
+
+    async def get_hotel_from_user(self, player: PlayerState, hotels: List[Hotel]) -> Hotel:
+        return self.rng.choice(hotels)
+
+    async def get_buy_order_from_user(self, player: PlayerState, hotels: List[Hotel]) -> List[int]:
+        return list(self.rng.choice(self.game.legal_actions()))
+
+    async def get_user_liquidation_option(self, name: str, num_shares: int) -> Tuple[int, int]:
+        return self.rng.choice(self.game.legal_actions())
+
+
+def scripted_game(rng: random.Random, num_players: int = 4):
+    uis = [ScriptedUI(rng) for _ in range(num_players)]
+    game = GameOrchestrator(uis)
+    game.bank = BankState(rng)
+    for seat, ui in enumerate(uis):
+        ui.game = game
+        game.add_player(f"Player{seat}")
+    return game, asyncio.new_event_loop()
+
+
+def play_scripted_game(state) -> int:
+    game, loop = state
+    loop.run_until_complete(game.play())
+    loop.close()
+    return game.turn
+
+
+def play_simulation(simulation: Simulation) -> int:
+    simulation.play()
+    return simulation.num_turns
+
+
+def game_benchmarks() -> List[Benchmark]:
+    def setup_simulation(rng):
+        return Simulation([Policy() for _ in range(4)], random.Random(rng.getrandbits(32)))
+
+    return [
+        Benchmark("orchestrator_turn", scripted_game, play_scripted_game),
+        Benchmark("simulation_turn", setup_simulation, play_simulation),
+    ]
+
+
+def benchmarks() -> List[Benchmark]:
+    suite = [
+        Benchmark("place_tile", lambda rng: (BoardState(), fill_board(BoardState(), rng)),
+                  replay_fill),
+        Benchmark("mark_recursive_large_chain", large_chain_boards, mark_large_chains),
+    ]
+    for ways in range(2, len(ARM_DIRECTIONS) + 1):
+        suite.extend(merger_benchmarks(ways))
+    return suite + bank_benchmarks() + game_benchmarks()
+
+
+def run_benchmarks(runs: int, seed: int, names: Optional[List[str]] = None) -> List[BenchmarkResult]:
+    """Runs the suite (or the named benchmarks) on the board of this process."""
+    return [measure(benchmark, runs, seed) for benchmark in benchmarks()
+            if names is None or benchmark.name in names]
+
+
+def run_board(board: str, args) -> List[BenchmarkResult]:
+    """Runs the suite on a board size (e.g. "9x12") in a subprocess."""
+    command = [sys.executable, "-m", "acquisitions.game_logic.benchmark", "--child",
+               "--runs", str(args.runs), "--seed", str(args.seed)]
+    if args.only:
+        command += ["--only", args.only]
+    env = dict(os.environ, **{BOARD_SIZE_ENV: board})
+    output = subprocess.run(command, env=env, check=True, capture_output=True, text=True).stdout
+    return [BenchmarkResult(**result) for result in json.loads(output)]
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+            check=True, capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: List[BenchmarkResult], baseline: dict, threshold: float) -> bool:
+    """Prints each result against a previous run's; returns whether any regressed."""
+    before: Dict[Tuple[str, str], dict] = {
+        (result["board"], result["name"]): result for result in baseline["results"]}
+    regressed = False
+    for result in results:
+        old = before.get((result.board, result.name))
+        if old is None:
+            continue
+        change = result.median_us / old["median_us"] - 1
+        flag = "REGRESSION" if change > threshold else ""
+        regressed |= bool(flag)
+        print(f"{result.board:>6} {result.name:<28} {old['median_us']:10.2f}us -> "
+              f"{result.median_us:10.2f}us {change:+7.1%} {flag}", file=sys.stderr)
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Acquisitions game logic.")
+    parser.add_argument("--boards", type=str, default=DEFAULT_BOARDS,
+                        help="comma-separated board sizes, as ROWSxCOLS")
+    parser.add_argument("--runs", type=int, default=DEFAULT_RUNS)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--only", type=str, default=None,
+                        help="comma-separated names of the benchmarks to run")
+    parser.add_argument("--out", type=str, default=None,
+                        help="write the JSON results here instead of to stdout")
+    parser.add_argument("--compare", type=str, default=None,
+                        help="JSON results of an earlier run; exits 1 on a regression")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    names = args.only.split(",") if args.only else None
+    if args.child:
+        print(json.dumps([result._asdict() for result in run_benchmarks(args.runs, args.seed, names)]))
+        return
+
+    results = []
+    for board in args.boards.split(","):
+        for result in run_board(board, args):
+            print(f"{result.board:>6} {result.name:<28} median {result.median_us:10.2f}us "
+                  f"min {result.min_us:10.2f}us ({result.ops} ops x {result.runs} runs)",
+                  file=sys.stderr)
+            results.append(result)
+    report = json.dumps({
+        "meta": {
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "runs": args.runs,
+            "seed": args.seed,
+        },
+        "results": [result._asdict() for result in results],
+    }, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(report + "\n")
+    else:
+        print(report)
+    if args.compare:
+        with open(args.compare) as f:
+            if compare(results, json.load(f), args.threshold):
+                sys.exit(1)
+
+# To run: python -m acquisitions.game_logic.benchmark from top level dir
+if __name__ == "__main__":
+    main()
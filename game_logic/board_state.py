@@ -1,24 +1,73 @@
-
-from typing import List, Tuple
-from collections import deque
+from array import array
+from typing import Dict, Iterator, List, Tuple
 
 from acquisitions.game_logic.constants import *
 from acquisitions.game_logic.tile import *
+from acquisitions.game_logic.zobrist import *
+
+# Packed cell encoding: each cell of the board is one byte.
+# Bits 0-2 hold a hotel id (Hotel.NO_HOTEL.value when there is none). Since
+# chains are tracked by a ChainIndex, the hotel bits are only authoritative on
+# the root cell of a chain; use BoardState.hotel_at to read a cell's hotel.
+HOTEL_MASK = 0b00111
+OCCUPIED_BIT = 0b01000
+DEAD_ZONE_BIT = 0b10000
+EMPTY_CELL = Hotel.NO_HOTEL.value
+DEAD_CELL = OCCUPIED_BIT | DEAD_ZONE_BIT | Hotel.NO_HOTEL.value
+
+HOTELS_BY_ID = tuple(Hotel)
+
+# Adjacency entries: one byte per empty cell, summarising the chains it
+# borders. Bit h is set if it borders hotel h, and LOOSE_BIT if it borders a
+# chain without a hotel.
+LOOSE_BIT = 1 << NUM_HOTELS
+HOTEL_BITS = LOOSE_BIT - 1
+# HOTEL_IDS_IN_MASK[mask] holds the ids of the hotels set in a hotel mask.
+HOTEL_IDS_IN_MASK = tuple(
+    tuple(h for h in range(NUM_HOTELS) if mask & (1 << h)) for mask in range(LOOSE_BIT))
+
+
+def indices_in_mask(mask: int) -> Iterator[int]:
+    """The cell indices set in a cell bitmask, in increasing order."""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
 
 class CellState:
     """
-    Represents the state of an individual tile on the Board.
+    Read-only view of an individual cell of a BoardState, used by the UIs.
     There are 4 basic types of state a cell can be in:
     0. Unoccupied
     1. Occupied, and not a part of any hotel
     2. Occupied, and part of one of the 7 types of hotels
     3. Occupied, and part of a Dead Zone
     """
-    def __init__(self, occupied=False, hotel=Hotel.NO_HOTEL, dead_zone=False, tile=None):
-        self.occupied = occupied  # True in all cases except Case 0
-        self.hotel = hotel  # NO_HOTEL in all cases except Case 2
-        self.dead_zone = dead_zone  # False in all cases except Case 3
-        self.tile = tile
+    __slots__ = ("board_state", "index")
+
+    def __init__(self, board_state: "BoardState", index: int):
+        self.board_state = board_state
+        self.index = index
+
+    @property
+    def occupied(self) -> bool:
+        """True in all cases except Case 0."""
+        return bool(self.board_state.cells[self.index] & OCCUPIED_BIT)
+
+    @property
+    def dead_zone(self) -> bool:
+        """False in all cases except Case 3."""
+        return bool(self.board_state.cells[self.index] & DEAD_ZONE_BIT)
+
+    @property
+    def hotel(self) -> Hotel:
+        """NO_HOTEL in all cases except Case 2."""
+        return self.board_state.hotel_at(self.index)
+
+    @property
+    def tile(self) -> Tile:
+        return TILES[self.index]
 
     def __str__(self):
         if not self.occupied:
@@ -29,21 +78,91 @@ class CellState:
             return self.hotel.name[0:2]
         else:
             return "XX"
-        
+
     def __repr__(self):
         return self.__str__()
-        
+
+
+class ChainIndex:
+    """
+    Disjoint-set forest over the cells of the Board, indexed by
+    row * NUM_COLS + col. Each set is a chain of connected, occupied,
+    non-dead-zone tiles, and the root of each set records the size of the
+    chain (the hotel of the chain is stored in the root's packed cell) and
+    its lowest cell. Uses path halving and union by size, so find and union
+    run in amortized O(alpha(n)).
+    """
+    def __init__(self, num_cells: int):
+        self.parent = array('H', range(num_cells))
+        self.size = array('H', [1] * num_cells)
+        self.low = array('H', range(num_cells))
+
+    def find(self, i: int) -> int:
+        """Returns the root of the chain containing cell i."""
+        parent = self.parent
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(self, i: int, j: int) -> int:
+        """
+        Merges the chains containing cells i and j, and returns the root of
+        the merged chain. The hotel of the merged chain is left to the caller.
+        """
+        ri, rj = self.find(i), self.find(j)
+        if ri == rj:
+            return ri
+        if self.size[ri] < self.size[rj]:
+            ri, rj = rj, ri
+        self.parent[rj] = ri
+        self.size[ri] += self.size[rj]
+        if self.low[rj] < self.low[ri]:
+            self.low[ri] = self.low[rj]
+        return ri
+
+    def size_of(self, i: int) -> int:
+        """Returns the number of tiles in the chain containing cell i."""
+        return self.size[self.find(i)]
+
 
 class BoardState:
     """
     Maintains the state of the Board during the game.
-    The state of the Board is defined by a grid of CellStates, plus an 
-    auxiliary structure for tracking sizes of hotels on the board.
+    The state of the Board is defined by a packed bytearray with one byte per
+    cell (see HOTEL_MASK, OCCUPIED_BIT and DEAD_ZONE_BIT), plus a ChainIndex
+    tracking which connected chain (and hence which hotel) every occupied cell
+    belongs to. hotel_sizes[h] is always the exact size of the chain of hotel
+    h on the board (0 if h is not on the board).
+
+    An adjacency index is maintained alongside, so that placing a tile can be
+    classified in O(1) (see classify): adjacency[i] is the adjacency entry of
+    each empty cell i, and frontiers maps the root of each chain to a bitmask
+    of the empty cells bordering it (bit i for cell i). When a chain changes
+    hotel, only the entries on its frontier are refreshed.
+
+    zobrist is the board's Zobrist hash (see zobrist.py), kept up to date as
+    cells are occupied and hotels marked; hotel_keys[h] is the part of it
+    contributed by hotel h (0 if h is not on the board).
     """
     def __init__(self):
-        self.board = [[CellState(
-            tile=Tile(r, c)) for c in range(NUM_COLS)] for r in range(NUM_ROWS)]
+        self.cells = bytearray([EMPTY_CELL]) * NUM_CELLS
+        self.chains = ChainIndex(NUM_CELLS)
         self.hotel_sizes = [0] * (NUM_HOTELS + 1)
+        self.adjacency = bytearray(NUM_CELLS)
+        self.frontiers: Dict[int, int] = {}
+        self.zobrist = 0
+        self.hotel_keys = [0] * NUM_HOTELS
+
+    @property
+    def board(self) -> List[List[CellState]]:
+        """Grid of CellState views, for the UIs."""
+        return self.cell_views()
+
+    def cell_views(self) -> List[List[CellState]]:
+        """Returns a NUM_ROWS x NUM_COLS grid of CellState views."""
+        return [[CellState(self, r * NUM_COLS + c) for c in range(NUM_COLS)]
+                for r in range(NUM_ROWS)]
 
     def place_tile(self, tile: Tile) -> GameEvent:
         """
@@ -54,42 +173,61 @@ class BoardState:
         1. Possibly starts a chain
         2. Absorbed into existing chain
         3. Merger
+        In cases 0-2 the tile is joined to its neighboring chains right away;
+        in case 3 that is deferred to execute_merger (or mark_dead_tile).
         """
-        cell = self.cell(tile)
-        neighbor_cells = self.get_neighbor_cells(tile)
-        neighbor_hotels = self.get_neighbor_hotels(tile)
-        num_neighbor_hotels = len(neighbor_hotels)
-        cell.occupied = True
-        if num_neighbor_hotels == 0:
-            if not any(nc.occupied and not nc.dead_zone for nc in neighbor_cells):
+        idx = tile.index
+        entry = self.adjacency[idx]
+        neighbor_hotels = HOTEL_IDS_IN_MASK[entry & HOTEL_BITS]
+        self.occupy(idx)
+        if not neighbor_hotels:
+            if not entry & LOOSE_BIT:
                 return GameEvent.NOOP  # Case 0
-            else:
-                return GameEvent.START_CHAIN  # Case 1
-        elif num_neighbor_hotels == 1:
-            self.mark_recursive(tile, neighbor_hotels[0])
+            self.join_neighbors(idx)
+            return GameEvent.START_CHAIN  # Case 1
+        elif len(neighbor_hotels) == 1:
+            self.mark_recursive(tile, HOTELS_BY_ID[neighbor_hotels[0]])
             return GameEvent.JOIN_CHAIN  # Case 2
         else:
             return GameEvent.MERGER  # Case 3
-        
+
+    def classify(self, tile: Tile) -> TileClass:
+        """
+        What placing the given tile would do, in O(1).
+        pre: the tile's cell is empty.
+        """
+        entry = self.adjacency[tile.index]
+        neighbor_hotels = HOTEL_IDS_IN_MASK[entry & HOTEL_BITS]
+        if not neighbor_hotels:
+            return TileClass.START if entry & LOOSE_BIT else TileClass.ISOLATED
+        if len(neighbor_hotels) == 1:
+            return TileClass.JOIN
+        # All but the largest hotel are absorbed, so at most one may be too large
+        too_large = sum(1 for h in neighbor_hotels if self.hotel_sizes[h] > MAX_MERGEABLE_SIZE)
+        return TileClass.MERGER if too_large <= 1 else TileClass.UNPLAYABLE
+
     def hotels_on_board(self) -> List[Hotel]:
         """Returns a list of hotels present on the Board."""
         return [h for h in Hotel if h.value < NUM_HOTELS and self.hotel_sizes[h.value] > 0]
-            
+
     def available_hotels(self) -> List[Hotel]:
         """Returns a list of hotels not present on the Board."""
         return [h for h in Hotel if h.value < NUM_HOTELS and self.hotel_sizes[h.value] == 0]
-    
+
     def check_merger(self, tile: Tile) -> Tuple[bool, List[Hotel], List[Hotel]]:
         """
         Checks if a given Tile causes a merger between two or more hotels.
         Returns:
-        can_merge: Whether a merger is caused
+        can_merge: Whether a merger is caused (False if the tile borders
+        fewer than two hotels)
         majority_options: Which of the merged hotels is larger (can be multiple
         in case of a tie)
         neighbor_hotels: The Hotels in neighboring Tiles
         """
         neighbor_hotels = self.get_neighbor_hotels(tile)
         sizes = [self.hotel_sizes[nh.value] for nh in neighbor_hotels]
+        if len(neighbor_hotels) < 2:
+            return False, neighbor_hotels[:1], neighbor_hotels
         can_merge = sizes[1] <= MAX_MERGEABLE_SIZE
         majority_options = [h for (h, sz) in zip(neighbor_hotels, sizes) if sz == sizes[0]]
         return can_merge, majority_options, neighbor_hotels
@@ -101,58 +239,212 @@ class BoardState:
         selected by player.
         """
         self.mark_recursive(tile, hotels[0])
-        for i in range(1, len(hotels)):
-            self.hotel_sizes[hotels[i].value] = 0 
-        
+
     def mark_recursive(self, tile: Tile, hotel: Hotel):
         """
-        Mark the given tile as belonging to the given hotel, and recursively
-        map all non-deadzone tiles it is connected to as also belonging to the
-        given hotel. 
+        Mark the given tile as belonging to the given hotel, along with all
+        non-deadzone tiles it is connected to. Any other hotels absorbed this
+        way are removed from the board.
+        """
+        idx = tile.index
+        cells, find = self.cells, self.chains.find
+        # Chains changing hotel, whose frontiers need their entries refreshed
+        stale = {find(idx)}
+        for n in NEIGHBOR_INDICES[idx]:
+            if cells[n] & (OCCUPIED_BIT | DEAD_ZONE_BIT) == OCCUPIED_BIT:
+                root = find(n)
+                absorbed = cells[root] & HOTEL_MASK
+                if absorbed != hotel.value:
+                    stale.add(root)
+                    if absorbed != Hotel.NO_HOTEL.value:
+                        self.hotel_sizes[absorbed] = 0
+                        self.zobrist ^= self.hotel_keys[absorbed]
+                        self.hotel_keys[absorbed] = 0
+        stale_cells = 0
+        for root in stale:
+            stale_cells |= self.frontiers[root]
+        self.join_neighbors(idx)
+        self.mark_hotel(tile, hotel)
+        for e in indices_in_mask(stale_cells):
+            self.refresh_adjacency(e)
+
+    def join_neighbors(self, idx: int) -> bool:
+        """
+        Join the cell at the given index to the chains of all of its occupied,
+        non-deadzone neighbors. Returns whether it had any such neighbors.
+        pre: the cell is occupied.
         """
-        q = deque([tile])
-        while q:
-            curr_tile = q.pop()
-            self.mark_hotel(curr_tile, hotel)
-            for neighbor_tile in self.get_neighbor_tiles(curr_tile):
-                nc = self.cell(neighbor_tile)
-                if nc.occupied and nc.hotel != hotel and not nc.dead_zone:
-                    q.append(neighbor_tile)
+        cells = self.cells
+        joined = False
+        for n in NEIGHBOR_INDICES[idx]:
+            if cells[n] & (OCCUPIED_BIT | DEAD_ZONE_BIT) == OCCUPIED_BIT:
+                self.link(idx, n)
+                joined = True
+        return joined
+
+    def link(self, i: int, j: int):
+        """Unions the chains containing cells i and j, and their frontiers."""
+        ri, rj = self.chains.find(i), self.chains.find(j)
+        if ri == rj:
+            return
+        root = self.chains.union(ri, rj)
+        self.frontiers[root] |= self.frontiers.pop(rj if root == ri else ri)
+
+    def occupy(self, idx: int):
+        """Marks an empty cell occupied, as a chain of its own with no hotel."""
+        cells = self.cells
+        cells[idx] |= OCCUPIED_BIT
+        self.zobrist ^= OCCUPIED_KEYS[idx]
+        frontier = 0
+        for n in NEIGHBOR_INDICES[idx]:
+            state = cells[n] & (OCCUPIED_BIT | DEAD_ZONE_BIT)
+            if state == OCCUPIED_BIT:
+                self.frontiers[self.chains.find(n)] &= ~(1 << idx)
+            elif not state:
+                frontier |= 1 << n
+                self.adjacency[n] |= LOOSE_BIT
+        self.frontiers[idx] = frontier
+
+    def refresh_adjacency(self, idx: int):
+        """Recomputes the adjacency entry of the empty cell at the given index."""
+        cells, find = self.cells, self.chains.find
+        entry = 0
+        for n in NEIGHBOR_INDICES[idx]:
+            if cells[n] & (OCCUPIED_BIT | DEAD_ZONE_BIT) == OCCUPIED_BIT:
+                hotel = cells[find(n)] & HOTEL_MASK
+                entry |= LOOSE_BIT if hotel == Hotel.NO_HOTEL.value else 1 << hotel
+        self.adjacency[idx] = entry
+
+    def rebuild_adjacency(self):
+        """Rebuilds the adjacency index from scratch, e.g. after a restore."""
+        cells, parent = self.cells, self.chains.parent
+
+        def find(i):
+            # Without path halving, so a restored board keeps its exact bytes
+            while parent[i] != i:
+                i = parent[i]
+            return i
+
+        self.frontiers = {
+            find(i): 0 for i in range(NUM_CELLS)
+            if cells[i] & (OCCUPIED_BIT | DEAD_ZONE_BIT) == OCCUPIED_BIT
+        }
+        for idx in range(NUM_CELLS):
+            if cells[idx] & OCCUPIED_BIT:
+                continue
+            entry = 0
+            for n in NEIGHBOR_INDICES[idx]:
+                if cells[n] & (OCCUPIED_BIT | DEAD_ZONE_BIT) == OCCUPIED_BIT:
+                    root = find(n)
+                    self.frontiers[root] |= 1 << idx
+                    hotel = cells[root] & HOTEL_MASK
+                    entry |= LOOSE_BIT if hotel == Hotel.NO_HOTEL.value else 1 << hotel
+            self.adjacency[idx] = entry
+
+    def rebuild_zobrist(self):
+        """Recomputes the Zobrist hash from scratch, e.g. after a restore."""
+        cells, chains = self.cells, self.chains
+        self.zobrist = 0
+        self.hotel_keys = [0] * NUM_HOTELS
+        roots = set()
+        for idx in range(NUM_CELLS):
+            state = cells[idx] & (OCCUPIED_BIT | DEAD_ZONE_BIT)
+            if state == OCCUPIED_BIT:
+                root = idx
+                while chains.parent[root] != root:
+                    root = chains.parent[root]
+                if root not in roots:  # idx is the chain's lowest cell
+                    roots.add(root)
+                    chains.low[root] = idx
+                    hotel = cells[root] & HOTEL_MASK
+                    if hotel != Hotel.NO_HOTEL.value:
+                        self.hotel_keys[hotel] = HOTEL_KEYS[hotel][idx]
+                self.zobrist ^= OCCUPIED_KEYS[idx]
+            elif state:
+                self.zobrist ^= DEAD_KEYS[idx]
+        for key in self.hotel_keys:
+            self.zobrist ^= key
 
     def mark_hotel(self, tile: Tile, hotel: Hotel):
-        """Mark the given tile as belonging to the given hotel."""
-        self.cell(tile).hotel = hotel
-        self.hotel_sizes[hotel.value] += 1
-    
+        """Mark the chain containing the given tile as belonging to the given hotel."""
+        root = self.chains.find(tile.index)
+        self.cells[root] = (self.cells[root] & ~HOTEL_MASK) | hotel.value
+        self.hotel_sizes[hotel.value] = self.chains.size[root]
+        key = HOTEL_KEYS[hotel.value][self.chains.low[root]]
+        self.zobrist ^= self.hotel_keys[hotel.value] ^ key
+        self.hotel_keys[hotel.value] = key
+
     def mark_dead_tile(self, tile: Tile):
-        """Mark the given tile as belonging to a dead zone."""
-        cell = self.cell(tile)
-        cell.occupied = True
-        cell.hotel = Hotel.NO_HOTEL
-        cell.dead_zone = True
-        cell.tile = tile
+        """
+        Mark the given tile as belonging to a dead zone.
+        pre: the tile was placed and not joined to any chain (a failed merger).
+        """
+        idx = tile.index
+        self.cells[idx] = DEAD_CELL
+        self.zobrist ^= OCCUPIED_KEYS[idx] ^ DEAD_KEYS[idx]
+        for e in indices_in_mask(self.frontiers.pop(idx, 0)):
+            self.refresh_adjacency(e)
+
+    def hotel_at(self, idx: int) -> Hotel:
+        """Returns the hotel of the cell at the given index (NO_HOTEL if none)."""
+        if self.cells[idx] & (OCCUPIED_BIT | DEAD_ZONE_BIT) != OCCUPIED_BIT:
+            return Hotel.NO_HOTEL
+        return HOTELS_BY_ID[self.cells[self.chains.find(idx)] & HOTEL_MASK]
+
+    def chain_hotel(self, tile: Tile) -> Hotel:
+        """Returns the hotel the given tile belongs to (NO_HOTEL if none)."""
+        return self.hotel_at(tile.index)
+
+    def chain_size(self, tile: Tile) -> int:
+        """Returns the size of the chain containing the given tile."""
+        idx = tile.index
+        if self.cells[idx] & (OCCUPIED_BIT | DEAD_ZONE_BIT) != OCCUPIED_BIT:
+            return 0
+        return self.chains.size_of(idx)
 
     def get_neighbor_tiles(self, tile: Tile) -> List[Tile]:
         """Get the tiles neighboring the given tile."""
-        dirs = [(0, 1), (0, -1), (-1, 0), (1, 0)]
-        r, c = tile.row, tile.col 
-        neighbor_tiles = [Tile(r + dr, c + dc) for (dr, dc) in dirs]
-        return [nt for nt in neighbor_tiles if nt.is_valid()]
-        
+        return [TILES[n] for n in NEIGHBOR_INDICES[tile.index]]
+
     def get_neighbor_cells(self, tile: Tile) -> List[CellState]:
         """Get the cell states for the tiles neighboring the given tile."""
-        return [self.cell(nt) for nt in self.get_neighbor_tiles(tile)]
-    
+        return [CellState(self, n) for n in NEIGHBOR_INDICES[tile.index]]
+
     def get_neighbor_hotels(self, tile: Tile) -> List[Hotel]:
         """
-        Returns a list of hotels neighboring the given Tile, in descending 
+        Returns a list of hotels neighboring the given Tile, in descending
         order of size.
         """
-        neighbor_cells = self.get_neighbor_cells(tile)
-        neighbor_hotels = list(set(c.hotel for c in neighbor_cells if c.hotel != Hotel.NO_HOTEL))
+        neighbor_hotels = []
+        for n in NEIGHBOR_INDICES[tile.index]:
+            hotel = self.hotel_at(n)
+            if hotel != Hotel.NO_HOTEL and hotel not in neighbor_hotels:
+                neighbor_hotels.append(hotel)
         neighbor_hotels.sort(key=lambda x: -self.hotel_sizes[x.value])
         return neighbor_hotels
-       
-    def cell(self, tile: Tile):
-        """Get the cell state for the given tile."""
-        return self.board[tile.row][tile.col]
+
+    def cell(self, tile: Tile) -> CellState:
+        """Get a view of the cell state for the given tile."""
+        return CellState(self, tile.index)
+
+    def save(self) -> tuple:
+        """
+        Copies of the board's buffers, for load(). These are flat byte and
+        int copies, so saving is cheap enough to do before every move.
+        """
+        return (
+            self.cells[:], self.chains.parent[:], self.chains.size[:],
+            self.chains.low[:], self.hotel_sizes[:], self.adjacency[:],
+            self.frontiers.copy(), self.zobrist, self.hotel_keys[:])
+
+    def load(self, saved: tuple):
+        """Restores a state returned by save(), which must not be reused."""
+        (self.cells, self.chains.parent, self.chains.size, self.chains.low,
+         self.hotel_sizes, self.adjacency, self.frontiers, self.zobrist,
+         self.hotel_keys) = saved
+
+    def clone(self) -> "BoardState":
+        board_state = BoardState.__new__(BoardState)
+        board_state.chains = ChainIndex.__new__(ChainIndex)
+        board_state.load(self.save())
+        return board_state
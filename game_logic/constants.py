@@ -1,13 +1,43 @@
 
+import os
 from enum import Enum
+from typing import List, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; only used by the *_batch helpers
+    np = None
 
 # Board parameters
 NUM_ROWS = 3
 NUM_COLS = 4
+# Setting ACQUISITIONS_BOARD=<rows>x<cols> (at most 26 rows) overrides the
+# board size, e.g. to benchmark larger boards. It is read once, at import.
+BOARD_SIZE_ENV = "ACQUISITIONS_BOARD"
+MAX_ROWS = 26  # rows are named A-Z
+
+
+def parse_board_size(value: str) -> Tuple[int, int]:
+    """(rows, cols) of a <rows>x<cols> board size; ValueError if it is not one."""
+    try:
+        rows, cols = map(int, value.split("x"))
+    except ValueError:
+        raise ValueError(f"{BOARD_SIZE_ENV}={value!r} is not <rows>x<cols>, e.g. 9x12") from None
+    if not 1 <= rows <= MAX_ROWS or cols < 1:
+        raise ValueError(
+            f"{BOARD_SIZE_ENV}={value!r}: a board has 1 to {MAX_ROWS} rows and at least 1 column")
+    return rows, cols
+
+
+if os.environ.get(BOARD_SIZE_ENV):
+    NUM_ROWS, NUM_COLS = parse_board_size(os.environ[BOARD_SIZE_ENV])
 
 # Player parameters
 TILES_PER_PLAYER = 6
 MAX_SHARES_PER_TURN = 3
+# Players in headless runs by default: up to 4, but no more than the board
+# can deal a full hand to
+DEFAULT_PLAYERS = min(4, max(2, NUM_ROWS * NUM_COLS // TILES_PER_PLAYER))
 
 # Hotel parameters
 NUM_HOTELS = 7  # There are 7 types of hotels
@@ -35,42 +65,103 @@ class Hotel(Enum):
     
     @classmethod
     def from_str(cls, s: str):
-        if len(s) >= 2:
-            s = s[0:2]
-            for hotel in cls:
-                if hotel.name[0:2] == s:
-                    return hotel
-        return cls.NO_HOTEL
-        
-def share_price(hotel: Hotel, size: int):
-    """
-    Share price is a function of hotel level and size
-    """
+        """The hotel whose two-letter code s starts with, else NO_HOTEL."""
+        return HOTELS_BY_CODE.get(s[0:2], cls.NO_HOTEL)
+
+# Hotels by name (e.g. CONTI) and by two-letter code (e.g. CO); NO_HOTEL is
+# not listed.
+HOTELS_BY_CODE = {
+    code: hotel
+    for hotel in Hotel if hotel != Hotel.NO_HOTEL
+    for code in (hotel.name, hotel.name[0:2])
+}
+
+# Hotel tiers: the two most expensive hotels are tier 2, the next three are
+# tier 1, and the rest are tier 0. Indexed by Hotel value (incl. NO_HOTEL).
+HOTEL_TIERS = tuple(2 if h <= 1 else 1 if h <= 4 else 0 for h in range(NUM_HOTELS + 1))
+MAX_PRICED_SIZE = SIZE_BRACKETS[-1] + 1  # share prices are flat beyond this size
+
+def _bracket_price(tier: int, size: int) -> int:
     if size < 2:
         return 0
-    
-    if hotel.value <= 1:
-        level = 2
-    elif hotel.value <= 4:
-        level = 1
-    else:
-        level = 0
-    price = BASE_PRICE + PRICE_INCR * level
+    price = BASE_PRICE + PRICE_INCR * tier
     for val in SIZE_BRACKETS:
         if size <= val:
             break
         price += 100
     return price
 
+# PRICE_TABLE[tier][size] is the share price of a hotel of the given tier and
+# chain size, for 0 <= size <= MAX_PRICED_SIZE.
+PRICE_TABLE = tuple(
+    tuple(_bracket_price(tier, size) for size in range(MAX_PRICED_SIZE + 1))
+    for tier in range(3)
+)
+# The same rows, indexed by Hotel value instead of tier.
+HOTEL_PRICE_TABLE = tuple(PRICE_TABLE[tier] for tier in HOTEL_TIERS)
+
+def share_price(hotel: Hotel, size: int):
+    """
+    Share price is a function of hotel level and size
+    """
+    return HOTEL_PRICE_TABLE[hotel.value][min(size, MAX_PRICED_SIZE)]
+
 def majority_holder_award(hotel: Hotel, size: int):
     return 10 * share_price(hotel, size)
 
 def minority_holder_award(hotel: Hotel, size: int):
     return 5 * share_price(hotel, size)
 
+def share_prices(hotel_sizes: List[int]) -> List[int]:
+    """
+    Share prices of every hotel, given the sizes of every hotel (indexed by
+    Hotel value, as in BoardState.hotel_sizes).
+    """
+    return [row[min(size, MAX_PRICED_SIZE)]
+            for (row, size) in zip(HOTEL_PRICE_TABLE, hotel_sizes)]
+
+def share_prices_batch(hotel_sizes_batch):
+    """
+    Share prices for a batch of games in one call. hotel_sizes_batch has
+    shape (num_games, NUM_HOTELS); returns prices of the same shape. Uses a
+    single NumPy gather when NumPy is installed (returning an ndarray), and
+    falls back to nested lists otherwise.
+    """
+    if np is None:
+        return [share_prices(hotel_sizes) for hotel_sizes in hotel_sizes_batch]
+    sizes = np.minimum(np.asarray(hotel_sizes_batch, dtype=np.intp), MAX_PRICED_SIZE)
+    tiers = _NP_HOTEL_TIERS[:sizes.shape[-1]]
+    return _NP_PRICE_TABLE[tiers, sizes]
+
+def majority_awards_batch(hotel_sizes_batch):
+    """Majority holder awards for a batch of games; see share_prices_batch."""
+    prices = share_prices_batch(hotel_sizes_batch)
+    if np is None:
+        return [[10 * p for p in row] for row in prices]
+    return 10 * prices
+
+def minority_awards_batch(hotel_sizes_batch):
+    """Minority holder awards for a batch of games; see share_prices_batch."""
+    prices = share_prices_batch(hotel_sizes_batch)
+    if np is None:
+        return [[5 * p for p in row] for row in prices]
+    return 5 * prices
+
+if np is not None:
+    _NP_PRICE_TABLE = np.array(PRICE_TABLE, dtype=np.int64)
+    _NP_HOTEL_TIERS = np.array(HOTEL_TIERS, dtype=np.intp)
+
 # Game events
 class GameEvent(Enum):
     NOOP = 0
     JOIN_CHAIN = 1
     START_CHAIN = 2
     MERGER = 4
+
+# What placing a tile on an empty cell would do (see BoardState.classify)
+class TileClass(Enum):
+    ISOLATED = 0  # borders no occupied tiles
+    START = 1  # borders only tiles without a hotel; starts a chain
+    JOIN = 2  # borders exactly one hotel
+    MERGER = 3  # borders two or more hotels that can merge
+    UNPLAYABLE = 4  # would merge a hotel too large to absorb; becomes dead
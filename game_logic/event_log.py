@@ -0,0 +1,316 @@
+import bisect
+import struct
+from typing import BinaryIO, Iterator, List, NamedTuple, Optional, Tuple
+
+from acquisitions.game_logic.constants import *
+from acquisitions.game_logic.tile import *
+from acquisitions.game_logic.player import *
+from acquisitions.game_logic.board_state import *
+from acquisitions.game_logic.bank import *
+from acquisitions.game_logic.snapshot import Reader, check_header, decode_state, encode_state, header
+
+# Append-only binary log of game state transitions.
+# Each record is framed as <uint32 length><uint8 record type><payload>, where
+# length counts the type byte and the payload. All integers are little-endian;
+# players are seat indices, tiles are flat board indices and hotels are Hotel
+# values. Replaying the records in order through the same BoardState /
+# BankState methods the orchestrator uses rebuilds the game exactly.
+
+_FRAME = struct.Struct("<IB")
+
+
+class Checkpoint(NamedTuple):
+    """Full board/bank/player state as of the start of turn `turn`."""
+    turn: int
+    state: bytes
+
+    def encode(self) -> bytes:
+        return struct.pack("<H", self.turn) + self.state
+
+    @classmethod
+    def decode(cls, payload: bytes):
+        return cls(struct.unpack_from("<H", payload)[0], bytes(payload[2:]))
+
+
+class TilePlaced(NamedTuple):
+    player: int
+    tile: Tile
+
+    def encode(self) -> bytes:
+        return struct.pack("<BH", self.player, self.tile.index)
+
+    @classmethod
+    def decode(cls, payload: bytes):
+        player, tile = struct.unpack("<BH", payload)
+        return cls(player, TILES[tile])
+
+
+class ChainStarted(NamedTuple):
+    player: int
+    tile: Tile
+    hotel: Hotel
+
+    def encode(self) -> bytes:
+        return struct.pack("<BHB", self.player, self.tile.index, self.hotel.value)
+
+    @classmethod
+    def decode(cls, payload: bytes):
+        player, tile, hotel = struct.unpack("<BHB", payload)
+        return cls(player, TILES[tile], Hotel(hotel))
+
+
+class TileDead(NamedTuple):
+    tile: Tile
+
+    def encode(self) -> bytes:
+        return struct.pack("<H", self.tile.index)
+
+    @classmethod
+    def decode(cls, payload: bytes):
+        return cls(TILES[struct.unpack("<H", payload)[0]])
+
+
+class AwardsGranted(NamedTuple):
+    hotel: Hotel
+    size: int
+
+    def encode(self) -> bytes:
+        return struct.pack("<BH", self.hotel.value, self.size)
+
+    @classmethod
+    def decode(cls, payload: bytes):
+        hotel, size = struct.unpack("<BH", payload)
+        return cls(Hotel(hotel), size)
+
+
+class SharesLiquidated(NamedTuple):
+    player: int
+    liquidated_hotel: Hotel
+    owning_hotel: Hotel
+    size: int
+    sell: int
+    twofer: int
+
+    def encode(self) -> bytes:
+        return struct.pack(
+            "<BBBHHH", self.player, self.liquidated_hotel.value,
+            self.owning_hotel.value, self.size, self.sell, self.twofer)
+
+    @classmethod
+    def decode(cls, payload: bytes):
+        player, liquidated, owning, size, sell, twofer = struct.unpack("<BBBHHH", payload)
+        return cls(player, Hotel(liquidated), Hotel(owning), size, sell, twofer)
+
+
+class MergerResolved(NamedTuple):
+    """hotels[0] is the surviving hotel."""
+    tile: Tile
+    hotels: List[Hotel]
+
+    def encode(self) -> bytes:
+        return struct.pack("<H", self.tile.index) + bytes(h.value for h in self.hotels)
+
+    @classmethod
+    def decode(cls, payload: bytes):
+        tile = struct.unpack_from("<H", payload)[0]
+        return cls(TILES[tile], [Hotel(h) for h in payload[2:]])
+
+
+class SharesBought(NamedTuple):
+    player: int
+    buy_order: List[int]
+
+    def encode(self) -> bytes:
+        return struct.pack("<B", self.player) + bytes(self.buy_order)
+
+    @classmethod
+    def decode(cls, payload: bytes):
+        return cls(payload[0], list(payload[1:]))
+
+
+class TileDrawn(NamedTuple):
+    player: int
+
+    def encode(self) -> bytes:
+        return struct.pack("<B", self.player)
+
+    @classmethod
+    def decode(cls, payload: bytes):
+        return cls(payload[0])
+
+
+class TurnEnded(NamedTuple):
+    turn: int
+
+    def encode(self) -> bytes:
+        return struct.pack("<H", self.turn)
+
+    @classmethod
+    def decode(cls, payload: bytes):
+        return cls(struct.unpack("<H", payload)[0])
+
+
+class GameEnded(NamedTuple):
+    def encode(self) -> bytes:
+        return b""
+
+    @classmethod
+    def decode(cls, payload: bytes):
+        return cls()
+
+
+# Record type codes are part of the on-disk format; append only.
+RECORD_TYPES = (
+    Checkpoint, TilePlaced, ChainStarted, TileDead, AwardsGranted,
+    SharesLiquidated, MergerResolved, SharesBought, TileDrawn, TurnEnded,
+    GameEnded,
+)
+_TYPE_CODES = {record_type: code for code, record_type in enumerate(RECORD_TYPES)}
+
+
+def encode_record(record) -> bytes:
+    payload = record.encode()
+    return _FRAME.pack(len(payload) + 1, _TYPE_CODES[type(record)]) + payload
+
+
+def read_records(data: bytes) -> Iterator[Tuple[int, NamedTuple]]:
+    """
+    Yields (offset, record) for every complete record in data. A truncated
+    final record (e.g. from a crash mid-write) is ignored.
+    """
+    view = memoryview(data)
+    pos = 0
+    while pos + _FRAME.size <= len(view):
+        length, code = _FRAME.unpack_from(view, pos)
+        end = pos + 4 + length
+        if end > len(view):
+            break
+        yield pos, RECORD_TYPES[code].decode(view[pos + _FRAME.size:end])
+        pos = end
+
+
+def encode_checkpoint_state(
+        board_state: BoardState, bank: BankState, players: List[PlayerState]) -> bytes:
+    return header() + encode_state(board_state, bank, players)
+
+
+class EventLog:
+    """
+    Writer for an append-only event log. stream is any binary file-like
+    object opened for appending (a file opened with 'ab', or io.BytesIO).
+    A Checkpoint is written every checkpoint_interval turns.
+    """
+    def __init__(self, stream: BinaryIO, checkpoint_interval: int = 10):
+        self.stream = stream
+        self.checkpoint_interval = checkpoint_interval
+
+    @classmethod
+    def open(cls, path: str, checkpoint_interval: int = 10) -> "EventLog":
+        return cls(open(path, "ab"), checkpoint_interval)
+
+    def append(self, record):
+        self.stream.write(encode_record(record))
+
+    def checkpoint(
+            self, turn: int, board_state: BoardState, bank: BankState,
+            players: List[PlayerState]):
+        self.append(Checkpoint(turn, encode_checkpoint_state(board_state, bank, players)))
+        self.stream.flush()
+
+    def turn_ended(
+            self, turn: int, board_state: BoardState, bank: BankState,
+            players: List[PlayerState]):
+        """Records the end of turn `turn`, checkpointing when one is due."""
+        self.append(TurnEnded(turn))
+        if (turn + 1) % self.checkpoint_interval == 0:
+            self.checkpoint(turn + 1, board_state, bank, players)
+        self.stream.flush()
+
+    def close(self):
+        self.stream.close()
+
+
+class GameReplay:
+    """
+    Rebuilds BoardState, BankState and PlayerStates at any turn of a logged
+    game. Indexes the log once; seeking restores the latest checkpoint at or
+    before the target and replays only the records after it.
+    """
+    def __init__(self, data: bytes):
+        self.records: List[NamedTuple] = []
+        self.checkpoints: List[Tuple[int, int]] = []  # (turn, record position)
+        self.turn_ends: List[int] = []  # record position of each TurnEnded
+        self.finished = False
+        for _, record in read_records(data):
+            if isinstance(record, Checkpoint):
+                self.checkpoints.append((record.turn, len(self.records)))
+            elif isinstance(record, TurnEnded):
+                self.turn_ends.append(len(self.records))
+            elif isinstance(record, GameEnded):
+                self.finished = True
+            self.records.append(record)
+        if not self.checkpoints:
+            raise ValueError("Event log has no checkpoint to replay from")
+
+    @classmethod
+    def from_file(cls, path: str) -> "GameReplay":
+        with open(path, "rb") as f:
+            return cls(f.read())
+
+    @property
+    def num_turns(self) -> int:
+        """Number of completed turns in the log."""
+        return len(self.turn_ends)
+
+    def state_at(self, turn: Optional[int] = None) -> Tuple[BoardState, BankState, List[PlayerState]]:
+        """
+        State at the start of the given turn (i.e. after `turn` completed
+        turns). Defaults to the end of the log, including any partially
+        logged turn.
+        """
+        if turn is None:
+            stop = len(self.records)
+        elif turn > self.num_turns:
+            raise ValueError(f"Log only covers {self.num_turns} turns")
+        else:
+            stop = self.turn_ends[turn - 1] + 1 if turn else self.checkpoints[0][1] + 1
+        # Latest checkpoint positioned at or before stop
+        i = bisect.bisect_right([pos for (_, pos) in self.checkpoints], stop - 1) - 1
+        start = self.checkpoints[max(i, 0)][1]
+        board_state = bank = players = None
+        for record in self.records[start:stop]:
+            if isinstance(record, Checkpoint):
+                reader = Reader(record.state)
+                check_header(reader)
+                board_state, bank, players = decode_state(reader)
+            else:
+                apply_record(record, board_state, bank, players)
+        return board_state, bank, players
+
+
+def apply_record(
+        record, board_state: BoardState, bank: BankState, players: List[PlayerState]):
+    """Re-applies a single logged transition to the given state."""
+    if isinstance(record, TilePlaced):
+        players[record.player].tiles.discard(record.tile)
+        board_state.place_tile(record.tile)
+    elif isinstance(record, ChainStarted):
+        bank.issue_free_share(players[record.player], record.hotel)
+        board_state.mark_recursive(record.tile, record.hotel)
+    elif isinstance(record, TileDead):
+        board_state.mark_dead_tile(record.tile)
+    elif isinstance(record, AwardsGranted):
+        bank.grant_awards(players, record.hotel, record.size)
+    elif isinstance(record, SharesLiquidated):
+        bank.liquidate_shares(
+            players[record.player], record.liquidated_hotel, record.size,
+            record.sell, record.twofer, record.owning_hotel)
+    elif isinstance(record, MergerResolved):
+        board_state.execute_merger(record.tile, record.hotels)
+    elif isinstance(record, SharesBought):
+        bank.execute_transaction(
+            players[record.player], record.buy_order, board_state.hotel_sizes)
+    elif isinstance(record, TileDrawn):
+        bank.draw_tile(players[record.player])
+    elif isinstance(record, GameEnded):
+        bank.tally_scores(players, board_state.hotel_sizes)
@@ -7,6 +7,9 @@ from acquisitions.game_logic.player import *
 from acquisitions.game_logic.tile import *
 from acquisitions.game_logic.board_state import *
 from acquisitions.game_logic.bank import *
+from acquisitions.game_logic.event_log import *
+from acquisitions.game_logic.legal_moves import *
+from acquisitions.game_logic.metrics import NO_METRICS
 from acquisitions.ui.ui_interface import *
 from acquisitions.ui.text_ui import *
 from acquisitions.ui.web_ui import *
@@ -14,44 +17,98 @@ from acquisitions.ui.web_ui import *
 class GameOrchestrator:
     def __init__(self, uis: List[WebUI]):
         self.players = []
+        self.seats = []  # a Seat per player
         self.bank = BankState()
         self.board_state = BoardState()
         self.uis = uis
         self.player_to_id = {}
+        self.turn = 0  # index of the next turn to be played
+        self.curr_player_id = 0
+        self.started = False
+        self.finished = False
+        # (player id, input type) of the input currently being awaited, if any
+        self.pending_input = None
+        # What the awaited input chooses from: the hotels offered, or the
+        # (liquidated, owning) hotels of a liquidation
+        self.pending_options = None
+        # The tile placed this turn, and the hotels of a merger it caused
+        # (survivor first) while the merger is being resolved; for bots
+        self.current_tile = None
+        self.merger = None
+        # Optional callback, called with the orchestrator after every turn
+        # and at game end (e.g. to persist a snapshot).
+        self.on_turn_end = None
+        # Optional EventLog recording every state transition of the game
+        self.event_log = None
+        # Per-phase counters and timings (see metrics.py); off by default
+        self.metrics = NO_METRICS
+        # Optional channel shared by all UIs (e.g. a RoomChannel): public
+        # updates are sent through it once instead of once per UI.
+        self.room = None
+        # Public updates are coalesced and sent at the next flush
+        self.outbox = []
+        self.board_dirty = False
 
-    def add_player(self, player_name: str):
+    def add_player(self, player_name: str, seat: Seat = Seat()):
         self.players.append(PlayerState(player_name))
-        logging.debug(f"Added player {player_name}")
+        self.seats.append(seat)
+        logging.debug("Added player %s", player_name)
 
     def is_ready(self) -> bool:
         return len(self.players) >= 2
 
     async def play(self):
-        """Core game loop."""
+        """
+        Core game loop. A restored game resumes from the start of self.turn.
+        """
         logging.debug("In play!")
         self.player_to_id = {player: i for i, player in enumerate(self.players)}
-        for player in self.players:
-            self.message_one(
-                f"Welcome {player.name}! Beginning Acquisitions game",
-                player
-            )
+        if not self.started:
+            for player in self.players:
+                self.message_one(
+                    f"Welcome {player.name}! Beginning Acquisitions game",
+                    player
+                )
+            self.init_tiles()
+            self.started = True
+        if self.event_log:
+            self.event_log.checkpoint(
+                self.turn, self.board_state, self.bank, self.players)
         self.render_boards()
-        self.init_tiles()
         logging.debug("Starting turns")
-        for turn in range(NUM_ROWS * NUM_COLS):
-            logging.debug(f"Playing turn {turn}")
-            await self.play_turn(turn)
+        while not game_over(self.players):
+            turn = self.turn
+            logging.debug("Playing turn %d", turn)
+            with self.metrics.timed('turn_seconds'):
+                await self.play_turn(turn)
+            self.metrics.inc('turns')
+            self.turn = turn + 1
+            self.turn_ended()
         await self.handle_game_end()
+        self.finished = True
+        self.turn_ended()
+
+    def turn_ended(self):
+        self.flush()
+        if self.event_log and not self.finished:
+            self.event_log.turn_ended(
+                self.turn - 1, self.board_state, self.bank, self.players)
+        if self.on_turn_end:
+            self.on_turn_end(self)
 
     async def play_turn(self, turn: int):
         self.curr_player_id = turn % len(self.players)
         player = self.players[self.curr_player_id]
-        logging.debug(f"Playing turn {turn} rendering board")
+        if not player.tiles:
+            return
         tile = await self.get_tile(player)
-        self.place_tile(player, tile)
+        self.current_tile = tile
+        await self.place_tile(player, tile)
         self.render_boards()
-        await self.execute_purchases(player)
+        with self.metrics.timed('purchase_seconds'):
+            await self.execute_purchases(player)
         self.bank.draw_tile(player)
+        self.record(TileDrawn(self.id(player)))
 
     def init_tiles(self):
         for player in self.players:
@@ -59,33 +116,59 @@ class GameOrchestrator:
                 self.bank.draw_tile(player)
 
     async def get_tile(self, player: PlayerState) -> Tile:
-        tile = await self.ui(player).get_tile_from_user(player)
+        legal = legal_tiles(self.board_state, player.tiles)
+        while True:
+            self.awaiting(player, 'tile')
+            with self.metrics.timed('tile_wait_seconds'):
+                tile = await self.ui(player).get_tile_from_user(player)
+            self.pending_input = None
+            if tile in legal:
+                break
+            self.metrics.inc('rejected_inputs')
+            self.message_one(f"Tile {tile} cannot be played now. Please try again.", player)
         player.tiles.remove(tile)
         return tile
 
-    def place_tile(self, player: PlayerState, tile: Tile):
-        game_event = self.board_state.place_tile(tile)
+    async def get_hotel(self, player: PlayerState, hotels: List[Hotel]) -> Hotel:
+        while True:
+            self.awaiting(player, 'hotel', hotels)
+            hotel = await self.ui(player).get_hotel_from_user(player, hotels)
+            self.pending_input = None
+            if hotel in hotels:
+                return hotel
+            self.metrics.inc('rejected_inputs')
+            self.message_one(f"{hotel.name} is not one of {hotels}. Please try again.", player)
+
+    async def place_tile(self, player: PlayerState, tile: Tile):
+        with self.metrics.timed('placement_seconds'):
+            game_event = self.board_state.place_tile(tile)
+        self.record(TilePlaced(self.id(player), tile))
         if game_event == GameEvent.START_CHAIN:
-            return self.start_chain(player, tile)
+            return await self.start_chain(player, tile)
         elif game_event == GameEvent.MERGER:
-            return self.handle_merger(player, tile)
+            with self.metrics.timed('merger_seconds'):
+                return await self.handle_merger(player, tile)
         else:
             self.message_all(f"Player {player.name} placed tile {tile}.")
 
     async def execute_purchases(self, player: PlayerState):
         hotels = self.board_state.hotels_on_board()
         if not hotels:
-            await self.message_all("No hotels on board; skipping purchases")
+            self.message_all("No hotels on board; skipping purchases")
             return
         while True:
+            self.awaiting(player, 'buy_order')
             buy_order = await self.ui(
                 player).get_buy_order_from_user(player, hotels)
-            success, msg = self.bank.execute_transaction(
+            self.pending_input = None
+            result = self.bank.execute_transaction(
                 player, buy_order, self.board_state.hotel_sizes)
-            self.message_all(msg)
-            if success:
+            self.message_all(result)
+            if result.success:
+                self.record(SharesBought(self.id(player), buy_order))
                 break
-        self.message_one(player.property(), player)        
+            self.metrics.inc('rejected_inputs')
+        self.message_one(player.property_summary(), player)
     
     async def start_chain(self, player: PlayerState, tile: Tile):
         available_hotels = self.board_state.available_hotels()
@@ -93,56 +176,108 @@ class GameOrchestrator:
             self.message_all("No available hotels to start.")
             return
         self.message_all(f"{player.name}, gets to start a hotel!")
-        hotel = await self.ui(player).get_hotel_from_user(player, available_hotels)
+        hotel = await self.get_hotel(player, available_hotels)
         self.bank.issue_free_share(player, hotel)
         self.board_state.mark_recursive(tile, hotel)
+        self.metrics.inc('chains_started')
+        self.record(ChainStarted(self.id(player), tile, hotel))
 
     async def handle_merger(self, player: PlayerState, tile: Tile):
         can_merge, majority_options, hotels = self.board_state.check_merger(tile)
         if not can_merge:
-            return self.board_state.mark_dead_tile(tile)
+            self.board_state.mark_dead_tile(tile)
+            self.metrics.inc('dead_tiles')
+            return self.record(TileDead(tile))
         self.message_all("A merger has occurred!")
+        self.merger = hotels
         if len(majority_options) > 1:
             self.message_all(f"Due to a tie, {player.name}" 
                   " must select which hotel *remains* on the board.")
-            hotel = await self.ui(player).get_hotel_from_user(player, majority_options)
+            hotel = await self.get_hotel(player, majority_options)
             hotels.remove(hotel)
             hotels.insert(0, hotel)
         self.message_all(f"Merging {hotels[1:]} into {hotels[0].name}")
         for hotel in hotels[1:]:
-            self.execute_liquidity_event(hotel, hotels[0])
-        return self.board_state.execute_merger(tile, hotels)
+            await self.execute_liquidity_event(hotel, hotels[0])
+        self.board_state.execute_merger(tile, hotels)
+        self.merger = None
+        self.metrics.inc('mergers')
+        self.record(MergerResolved(tile, hotels))
     
-    def execute_liquidity_event(
+    async def execute_liquidity_event(
             self, liquidated_hotel: Hotel, owning_hotel: Hotel):
         size = self.board_state.hotel_sizes[liquidated_hotel.value]
-        award_msg = self.bank.grant_awards(self.players, liquidated_hotel, size)
-        self.message_all(award_msg)
+        awards = self.bank.grant_awards(self.players, liquidated_hotel, size)
+        self.record(AwardsGranted(liquidated_hotel, size))
+        self.message_all(awards)
         ownership = [p.property[liquidated_hotel.value] for p in self.players]
         for (player, shares) in sorted(zip(self.players, ownership), key=lambda x: -x[1]):
-            while True:
-                sell, twofer = asyncio.create_task(
-                    self.ui(player).get_user_liquidation_option(player.name, shares))
-                success, msg = self.bank.liquidate_shares(
-                    player, liquidated_hotel, size, sell, twofer, owning_hotel)
-                self.message_all(msg)
-                if success:
-                    break
+            if not shares:
+                continue
+            with self.metrics.timed('liquidation_seconds'):
+                await self.liquidate_holdings(
+                    player, shares, liquidated_hotel, owning_hotel, size)
+
+    async def liquidate_holdings(self, player: PlayerState, shares: int,
+                                 liquidated_hotel: Hotel, owning_hotel: Hotel, size: int):
+        while True:
+            self.awaiting(player, 'liquidation', (liquidated_hotel, owning_hotel))
+            sell, twofer = await self.ui(
+                player).get_user_liquidation_option(player.name, shares)
+            self.pending_input = None
+            result = self.bank.liquidate_shares(
+                player, liquidated_hotel, size, sell, twofer, owning_hotel)
+            self.message_all(result)
+            if result.success:
+                self.record(SharesLiquidated(
+                    self.id(player), liquidated_hotel, owning_hotel,
+                    size, sell, twofer))
+                break
+            self.metrics.inc('rejected_inputs')
     
     async def handle_game_end(self):
-        msg = self.bank.tally_scores(self.players, self.board_state.hotel_sizes)
-        await self.message_all(msg)
+        scores = self.bank.tally_scores(self.players, self.board_state.hotel_sizes)
+        self.record(GameEnded())
+        self.message_all(scores)
+        self.flush()
+        for ui in self.uis:
+            await ui.display_final_scores(self.players)
+
+    def record(self, record):
+        """Appends a state transition to the event log, if there is one."""
+        if self.event_log:
+            self.event_log.append(record)
 
     def render_boards(self):
+        self.board_dirty = True
+
+    def message_all(self, msg):
+        """msg is a string or a bank result; results are rendered on flush."""
+        self.outbox.append(msg)
+
+    def flush(self):
+        """
+        Sends the updates coalesced since the last flush: the board (once,
+        however many times it changed) and public messages, then lets every
+        UI send what it has buffered.
+        """
+        targets = [self.room] if self.room else self.uis
+        if self.board_dirty:
+            cell_states = self.board_state.cell_views()
+            for target in targets:
+                target.render_board(cell_states)
+            self.board_dirty = False
+        for msg in map(str, self.outbox):
+            for target in targets:
+                target.display_message(msg)
+        self.outbox = []
+        if self.room:
+            self.room.flush()
         for ui in self.uis:
-            ui.render_board(self.board_state.board)
-    
-    def message_all(self, msg: str):
-        for ui in self.uis:
-            ui.display_message(msg)
+            ui.flush()
 
-    def message_one(self, msg: str, player: PlayerState):
-        self.ui(player).display_message(msg)
+    def message_one(self, msg, player: PlayerState):
+        self.ui(player).display_message(str(msg))
 
     def id(self, player: PlayerState):
         return self.player_to_id[player]
@@ -150,5 +285,36 @@ class GameOrchestrator:
     def ui(self, player: PlayerState):
         return self.uis[self.id(player)]
     
+    def awaiting(self, player: PlayerState, input_type: str, options=None):
+        """
+        Records that the game is waiting on the given input from player.
+        Pending updates are flushed first, so the player sees the current
+        state before being prompted.
+        """
+        self.pending_input = (self.id(player), input_type)
+        self.pending_options = options
+        self.flush()
+
+    def legal_actions(self) -> list:
+        """
+        Every legal choice for the input currently awaited (empty if none):
+        tiles, hotels, buy orders or (sell, twofer) liquidation options.
+        """
+        if not self.pending_input:
+            return []
+        player_id, input_type = self.pending_input
+        player = self.players[player_id]
+        if input_type == 'tile':
+            return legal_tiles(self.board_state, player.tiles)
+        if input_type == 'buy_order':
+            return legal_buy_orders(self.board_state, self.bank, player)
+        if self.pending_options is None:
+            return []  # a restored game, until the player is prompted again
+        if input_type == 'liquidation':
+            return legal_liquidations(self.bank, player, *self.pending_options)
+        return list(self.pending_options)
+
     def receive_input(self, data):
-        self.uis[self.curr_player_id].receive_input(data)
+        """Routes input to the UI of the player whose input is awaited."""
+        player_id = self.pending_input[0] if self.pending_input else self.curr_player_id
+        self.uis[player_id].receive_input(data)
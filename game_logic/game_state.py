@@ -0,0 +1,74 @@
+from typing import List
+
+from acquisitions.game_logic.board_state import *
+from acquisitions.game_logic.bank import *
+from acquisitions.game_logic.player import *
+from acquisitions.game_logic.event_log import *
+from acquisitions.game_logic.snapshot import encode_state
+from acquisitions.game_logic.zobrist import position_key
+
+# Records that change the board; the board is only saved before these.
+BOARD_RECORDS = (TilePlaced, ChainStarted, TileDead, MergerResolved)
+
+
+class GameState:
+    """
+    The board, bank and players of a game, for search. Moves are event log
+    records (see event_log.py): apply() plays one and undo() reverts the
+    last, so a search can walk down and back up a line of play in place.
+    clone() makes an independent copy, e.g. for a rollout in another process.
+
+    Undo keeps, per move, only what the move can change: the board's packed
+    buffers (for board moves), the bank's shares, players' accounts, and
+    the tile moved between hands and the pool.
+    """
+    def __init__(self, board_state: BoardState, bank: BankState, players: List[PlayerState]):
+        self.board_state = board_state
+        self.bank = bank
+        self.players = players
+        self.undo_stack = []
+
+    @classmethod
+    def of(cls, game) -> "GameState":
+        """A copy of the state of a GameOrchestrator or Simulation."""
+        return cls(game.board_state, game.bank, game.players).clone()
+
+    def clone(self) -> "GameState":
+        """A copy of the current state, with an empty undo stack."""
+        return GameState(
+            self.board_state.clone(), self.bank.clone(),
+            [player.clone() for player in self.players])
+
+    def apply(self, record):
+        board = self.board_state.save() if isinstance(record, BOARD_RECORDS) else None
+        accounts = [(player.money, player.property[:], player.zobrist)
+                    for player in self.players]
+        drawn = None
+        if isinstance(record, TileDrawn) and self.bank.tiles:
+            drawn = self.bank.tiles[-1]
+        self.undo_stack.append((record, board, accounts, self.bank.property[:], drawn))
+        apply_record(record, self.board_state, self.bank, self.players)
+
+    def undo(self):
+        """Reverts the last move applied."""
+        record, board, accounts, shares, drawn = self.undo_stack.pop()
+        if board is not None:
+            self.board_state.load(board)
+        for player, (money, property, zobrist) in zip(self.players, accounts):
+            player.money = money
+            player.property = property
+            player.zobrist = zobrist
+        self.bank.property = shares
+        if isinstance(record, TilePlaced):
+            self.players[record.player].tiles.add(record.tile)
+        elif drawn is not None:
+            self.players[record.player].tiles.discard(drawn)
+            self.bank.tiles.append(drawn)
+
+    def key(self) -> int:
+        """The Zobrist hash of the public position (see zobrist.position_key)."""
+        return position_key(self.board_state, self.bank, self.players)
+
+    def encode(self) -> bytes:
+        """The state in the snapshot encoding, e.g. to compare positions."""
+        return encode_state(self.board_state, self.bank, self.players)
@@ -0,0 +1,93 @@
+from typing import List, Optional
+
+from acquisitions.game_logic.constants import *
+from acquisitions.game_logic.tile import *
+from acquisitions.game_logic.legal_moves import *
+
+# Validation of player moves before they reach a game's coroutine, so that
+# malformed, stale or illegal input can be refused where it arrives (e.g. on
+# a server's socket thread) instead of after a round trip through the game.
+# A move is the dict a client sends in answer to an 'input_required' prompt;
+# MOVE_SCHEMAS gives its fields and their types for each input type. Names
+# are resolved through the precomputed TILES_BY_STR and HOTELS_BY_CODE.
+#
+# The game still checks every input it receives, so a move judged against
+# a slightly stale view of the game (one read from another thread) is at
+# worst refused by the game rather than here.
+
+MOVE_SCHEMAS = {
+    'tile': {'tile': str},
+    'hotel': {'hotel': str},
+    'buy_order': {'buy_order': dict},
+    'liquidation': {'sell': int, 'twofer': int},
+}
+
+
+def check_schema(input_type: str, move) -> bool:
+    """Whether move has exactly the fields the input type needs, of the right types."""
+    schema = MOVE_SCHEMAS[input_type]
+    if not isinstance(move, dict) or move.keys() != schema.keys():
+        return False
+    for field, field_type in schema.items():
+        value = move.get(field)
+        # bools are ints to isinstance, but not valid quantities
+        if not isinstance(value, field_type) or isinstance(value, bool):
+            return False
+    return True
+
+
+def parse_buy_order(buy_order: dict) -> Optional[List[int]]:
+    """A {hotel code: quantity} dict as a list of quantities, or None if malformed."""
+    order = [0] * NUM_HOTELS
+    for code, quantity in buy_order.items():
+        hotel = HOTELS_BY_CODE.get(code)
+        if hotel is None or not isinstance(quantity, int) or isinstance(quantity, bool):
+            return None
+        order[hotel.value] = quantity
+    return order
+
+
+def validate_move(game, move) -> Optional[str]:
+    """
+    None if move is a legal answer to the input game (a GameOrchestrator)
+    is awaiting, or else why it is not.
+    """
+    pending_input = game.pending_input
+    if not pending_input:
+        return "No input is awaited"
+    player_id, input_type = pending_input
+    if not check_schema(input_type, move):
+        return f"Malformed {input_type} move"
+    player = game.players[player_id]
+    options = game.pending_options
+
+    if input_type == 'tile':
+        tile = TILES_BY_STR.get(move['tile'])
+        if tile is None:
+            return f"No such tile: {move['tile']}"
+        if not legal_tile_mask(game.board_state, player.tiles) >> tile.index & 1:
+            return f"Tile {tile} cannot be played now"
+    elif input_type == 'hotel':
+        hotel = HOTELS_BY_CODE.get(move['hotel'])
+        if hotel is None:
+            return f"No such hotel: {move['hotel']}"
+        if options is not None and hotel not in options:
+            return f"{hotel.name} is not one of {options}"
+    elif input_type == 'buy_order':
+        order = parse_buy_order(move['buy_order'])
+        if order is None:
+            return "Malformed buy_order move"
+        result = game.bank.validate_transaction(
+            player, order, game.board_state.hotel_sizes)
+        if not result.success:
+            return str(result)
+    elif input_type == 'liquidation' and options is not None:
+        liquidated_hotel, owning_hotel = options
+        sell, twofer = move['sell'], move['twofer']
+        if sell < 0 or twofer < 0:
+            return "Cannot sell or trade a negative number of shares"
+        if sell + twofer > player.property[liquidated_hotel.value]:
+            return f"{player.name} does not hold {sell + twofer} shares of {liquidated_hotel.name}"
+        if twofer // 2 > game.bank.property[owning_hotel.value]:
+            return f"Not enough shares of {owning_hotel.name} left to trade for"
+    return None
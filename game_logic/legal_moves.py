@@ -0,0 +1,112 @@
+from itertools import combinations_with_replacement
+from typing import Iterable, List, Tuple
+
+from acquisitions.game_logic.constants import *
+from acquisitions.game_logic.tile import *
+from acquisitions.game_logic.player import *
+from acquisitions.game_logic.board_state import *
+from acquisitions.game_logic.bank import *
+
+# Legal-move generation, for bots and for validating player input. Sets of
+# tiles can be passed around as bitmasks over cell indices: bit i stands for
+# TILES[i].
+
+# Every buy order of at most MAX_SHARES_PER_TURN shares, as (order, mask of
+# the hotels it buys), in increasing number of shares.
+BUY_ORDERS = tuple(
+    (tuple(hotels.count(h) for h in range(NUM_HOTELS)),
+     sum(1 << h for h in set(hotels)))
+    for k in range(MAX_SHARES_PER_TURN + 1)
+    for hotels in combinations_with_replacement(range(NUM_HOTELS), k)
+)
+
+
+def tile_mask(tiles: Iterable[Tile]) -> int:
+    mask = 0
+    for tile in tiles:
+        mask |= 1 << tile.index
+    return mask
+
+
+def tiles_in_mask(mask: int) -> List[Tile]:
+    """The tiles set in mask, in board order."""
+    tiles = []
+    while mask:
+        low = mask & -mask
+        tiles.append(TILES[low.bit_length() - 1])
+        mask ^= low
+    return tiles
+
+
+def legal_tile_mask(board_state: BoardState, tiles: Iterable[Tile]) -> int:
+    """
+    Mask of the tiles of a hand that may be placed: all but those that would
+    merge two or more hotels too large to be absorbed, or start a chain while
+    every hotel is on the board. Since the game only ends once every tile is
+    placed, if no tile of the hand qualifies then any may be placed (a tile
+    that cannot merge becomes a dead zone).
+    """
+    chain_available = any(
+        not size for size in board_state.hotel_sizes[:NUM_HOTELS])
+    hand = legal = 0
+    for tile in tiles:
+        bit = 1 << tile.index
+        hand |= bit
+        tile_class = board_state.classify(tile)
+        if tile_class == TileClass.UNPLAYABLE:
+            continue
+        if tile_class == TileClass.START and not chain_available:
+            continue
+        legal |= bit
+    return legal or hand
+
+
+def legal_tiles(board_state: BoardState, tiles: Iterable[Tile]) -> List[Tile]:
+    return tiles_in_mask(legal_tile_mask(board_state, tiles))
+
+
+def legal_buy_orders(
+        board_state: BoardState,
+        bank: BankState,
+        player: PlayerState) -> List[Tuple[int, ...]]:
+    """
+    Every buy order player may place (see BankState.validate_transaction),
+    including buying nothing. At most len(BUY_ORDERS) = 120 orders.
+    """
+    hotel_sizes = board_state.hotel_sizes
+    prices = share_prices(hotel_sizes)
+    on_board = sum(1 << h for h in range(NUM_HOTELS) if hotel_sizes[h])
+    available = bank.property
+    money = player.money
+    orders = []
+    for order, hotels in BUY_ORDERS:
+        if hotels & ~on_board:
+            continue
+        cost = 0
+        for h in HOTEL_IDS_IN_MASK[hotels]:
+            if order[h] > available[h]:
+                break
+            cost += order[h] * prices[h]
+        else:
+            if cost <= money:
+                orders.append(order)
+    return orders
+
+
+def legal_liquidations(
+        bank: BankState,
+        player: PlayerState,
+        liquidated_hotel: Hotel,
+        owning_hotel: Hotel) -> List[Tuple[int, int]]:
+    """
+    Every (sell, twofer) option player has for their shares of a hotel
+    absorbed by owning_hotel; shares not sold or traded are kept. Only even
+    twofers are listed, since an odd one is rolled over into a sale.
+    """
+    shares = player.property[liquidated_hotel.value]
+    max_twofer = min(shares, 2 * bank.property[owning_hotel.value])
+    return [
+        (sell, twofer)
+        for twofer in range(0, max_twofer + 1, 2)
+        for sell in range(shares - twofer + 1)
+    ]
@@ -0,0 +1,294 @@
+import math
+import random
+import time
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from acquisitions.game_logic.constants import *
+from acquisitions.game_logic.tile import *
+from acquisitions.game_logic.player import *
+from acquisitions.game_logic.board_state import *
+from acquisitions.game_logic.bank import *
+from acquisitions.game_logic.legal_moves import *
+from acquisitions.game_logic.simulator import *
+from acquisitions.game_logic.zobrist import *
+from acquisitions.game_logic.metrics import NO_METRICS
+
+# Determinized Monte Carlo tree search, for computer players.
+# Each iteration samples the information hidden from the searching player
+# (the other hands and the order of the tile pool), then plays the game out
+# from the decision being searched as a Simulation. Decisions inside the tree
+# are picked by UCB over the actions legal in that sample (counting how often
+# each action was available, as in information set MCTS); past the tree's
+# frontier the default random policies play on. Every decision in the tree,
+# the opponents' included, is scored from the deciding seat's point of view.
+# Actions are tile indices, hotel values, buy order tuples and (sell, twofer)
+# tuples.
+#
+# Nodes are also kept in a transposition table by the Zobrist hash of their
+# public position (see zobrist.py), so a decision point reached by different
+# orders of moves is one node, sharing its statistics, and the next search
+# picks up where the last one left off by looking up its root there.
+
+EXPLORATION = 0.7
+TABLE_SIZE = 50000  # nodes kept in each searcher's transposition table
+MAX_TABLES = 64  # tables kept per process for reuse, least recent evicted
+KINDS = ('tile', 'hotel', 'buy_order', 'liquidation')
+# DECISION_KEYS[kind][seat][detail]: what is being decided, and by whom, for
+# up to MAX_SEATS seats; detail is a liquidated hotel's value, or NUM_HOTELS
+MAX_SEATS = 8
+_rng = random.Random(0xDEC1DE)
+DECISION_KEYS = tuple(
+    tuple(tuple(_rng.getrandbits(64) for _ in range(NUM_HOTELS + 1)) for _ in range(MAX_SEATS))
+    for _ in KINDS)
+
+
+class Decision(NamedTuple):
+    """A decision awaited from seat during turn_seat's turn."""
+    kind: str  # 'tile', 'hotel', 'buy_order' or 'liquidation'
+    seat: int
+    turn_seat: int
+    tile: Optional[Tile] = None  # placed this turn, for hotel and liquidation
+    hotels: Optional[List[Hotel]] = None  # hotels of a merger, survivor first
+    liquidated_hotel: Optional[Hotel] = None
+
+
+class Node:
+    __slots__ = ("children", "visits", "values", "available")
+
+    def __init__(self, num_seats: int):
+        self.children: Dict[object, "Node"] = {}  # action -> Node
+        self.visits = 0
+        # Total reward of each seat over the iterations through this node
+        self.values = [0.0] * num_seats
+        # Iterations in which the action leading here was legal when it
+        # could be chosen
+        self.available = 0
+
+
+def decision_key(board_state: BoardState, bank: BankState, players: List[PlayerState],
+                 kind: str, seat: int, detail: Optional[int] = None) -> int:
+    """
+    Hash of everything public about a decision point: the same in every
+    sample of the hidden information, so it identifies a node across
+    iterations and searches.
+    """
+    detail = NUM_HOTELS if detail is None else detail
+    return (position_key(board_state, bank, players)
+            ^ DECISION_KEYS[KINDS.index(kind)][seat][detail])
+
+
+def determinize(board_state: BoardState, bank: BankState, players: List[PlayerState],
+                observer: int, rng: random.Random):
+    """
+    A copy of the state in which the tiles observer cannot see (the other
+    hands and the pool) are dealt again at random.
+    """
+    bank = bank.clone()
+    players = [player.clone() for player in players]
+    pool = list(bank.tiles)
+    for seat, player in enumerate(players):
+        if seat != observer:
+            pool.extend(sorted(player.tiles, key=lambda t: t.index))
+    rng.shuffle(pool)
+    for seat, player in enumerate(players):
+        if seat != observer:
+            n = len(player.tiles)
+            player.tiles = set(pool[:n])
+            del pool[:n]
+    bank.tiles = pool
+    return board_state.clone(), bank, players
+
+
+class SearchGame(Simulation):
+    """A Simulation resumed at a decision of a game in progress."""
+    def __init__(self, policies: List[Policy], board_state: BoardState, bank: BankState,
+                 players: List[PlayerState], rng: random.Random):
+        self.policies = policies
+        self.rng = rng
+        self.players = players
+        self.bank = bank
+        self.board_state = board_state
+        self.metrics = NO_METRICS
+        self.num_turns = 0
+        self.num_chains_started = 0
+        self.num_mergers = 0
+        self.num_dead_tiles = 0
+        self.owning_hotel = None  # of the liquidation in progress
+
+    def liquidate_holdings(
+            self, seats: List[int], liquidated_hotel: Hotel, owning_hotel: Hotel, size: int):
+        self.owning_hotel = owning_hotel
+        super().liquidate_holdings(seats, liquidated_hotel, owning_hotel, size)
+
+    def resume(self, decision: Decision) -> GameResult:
+        """Plays on from decision, which is asked of its seat's policy first."""
+        turn_seat = decision.turn_seat
+        if decision.kind == 'tile':
+            return self.play_from(turn_seat)
+        if decision.kind == 'hotel' and decision.hotels is None:
+            self.start_chain(turn_seat, decision.tile)
+        elif decision.kind == 'hotel':
+            self.handle_merger(turn_seat, decision.tile)
+        elif decision.kind == 'liquidation':
+            self.finish_merger(decision)
+        self.execute_purchases(turn_seat)
+        self.bank.draw_tile(self.players[turn_seat])
+        return self.play_from((turn_seat + 1) % len(self.players))
+
+    def finish_merger(self, decision: Decision):
+        """
+        Resolves the rest of a merger, from decision.seat's liquidation.
+        Which seats already liquidated the current hotel is not known here,
+        so all others still holding its shares are asked after the decider.
+        """
+        hotels, liquidated = decision.hotels, decision.liquidated_hotel
+        size = self.board_state.hotel_sizes[liquidated.value]
+        others = sorted(
+            (i for i in range(len(self.players))
+             if i != decision.seat and self.players[i].property[liquidated.value]),
+            key=lambda i: -self.players[i].property[liquidated.value])
+        self.liquidate_holdings([decision.seat] + others, liquidated, hotels[0], size)
+        for hotel in hotels[hotels.index(liquidated) + 1:]:
+            self.execute_liquidity_event(hotel, hotels[0])
+        self.board_state.execute_merger(decision.tile, hotels)
+
+
+class TreeWalker:
+    """
+    Policy for every seat of one search iteration: walks down the tree
+    while it can, expands one node, then defers to the default policies.
+    """
+    def __init__(self, root: Node, table: TranspositionTable, rng: random.Random,
+                 exploration: float):
+        self.node = root
+        self.table = table
+        self.rng = rng
+        self.exploration = exploration
+        self.in_tree = True
+        self.path: List[Node] = [root]
+        self.policy = Policy(
+            self.choose_tile, self.choose_hotel, self.choose_buy_order, self.choose_liquidation)
+
+    def choose(self, sim: Simulation, player: PlayerState, kind: str, options: list, detail=None):
+        seat = sim.players.index(player)
+        node = self.transpose(decision_key(
+            sim.board_state, sim.bank, sim.players, kind, seat, detail))
+        children = node.children
+        unvisited = []
+        best, best_score = None, -math.inf
+        for option in options:
+            child = children.get(option)
+            if child is None:
+                unvisited.append(option)
+                continue
+            child.available += 1
+            score = child.values[seat] / child.visits + self.exploration * math.sqrt(
+                math.log(child.available) / child.visits)
+            if score > best_score:
+                best, best_score = option, score
+        if unvisited:
+            best = self.rng.choice(unvisited)
+            child = children[best] = Node(len(sim.players))
+            child.available = 1
+            self.in_tree = False
+        self.node = children[best]
+        self.path.append(self.node)
+        self.action = best
+        return best
+
+    def transpose(self, key: int) -> Node:
+        """
+        The node for the position reached, key: the one in the table if this
+        position was reached before (by any line of play), relinked under
+        the node the walk came from, else the node reached, now tabled.
+        """
+        node = self.node
+        known = self.table.get(key)
+        if known is None:
+            self.table.put(key, node)
+        elif known is not node:
+            if len(self.path) > 1:
+                self.path[-2].children[self.action] = known
+            self.path[-1] = self.node = known
+        return self.node
+
+    def choose_tile(self, sim: Simulation, player: PlayerState, tiles: List[Tile]) -> Tile:
+        if not self.in_tree:
+            return random_tile(sim, player, tiles)
+        return TILES[self.choose(sim, player, 'tile', [t.index for t in tiles])]
+
+    def choose_hotel(self, sim: Simulation, player: PlayerState, hotels: List[Hotel]) -> Hotel:
+        if not self.in_tree:
+            return random_hotel(sim, player, hotels)
+        return HOTELS_BY_ID[self.choose(sim, player, 'hotel', [h.value for h in hotels])]
+
+    def choose_buy_order(self, sim: Simulation, player: PlayerState, hotels: List[Hotel]) -> List[int]:
+        if not self.in_tree:
+            return random_buy_order(sim, player, hotels)
+        orders = legal_buy_orders(sim.board_state, sim.bank, player)
+        return list(self.choose(sim, player, 'buy_order', orders))
+
+    def choose_liquidation(self, sim: Simulation, player: PlayerState, hotel: Hotel,
+                           num_shares: int) -> Tuple[int, int]:
+        if not self.in_tree:
+            return sell_all(sim, player, hotel, num_shares)
+        options = legal_liquidations(sim.bank, player, hotel, sim.owning_hotel)
+        return self.choose(sim, player, 'liquidation', options, hotel.value)
+
+    def backpropagate(self, result: GameResult):
+        share = 1.0 / len(result.winners)
+        for node in self.path:
+            node.visits += 1
+            for seat in result.winners:
+                node.values[seat] += share
+
+
+def search(root: Node, table: TranspositionTable, board_state: BoardState, bank: BankState,
+           players: List[PlayerState], decision: Decision, deadline: float,
+           rng: random.Random, exploration: float = EXPLORATION) -> int:
+    """Grows the tree under root until deadline (time.monotonic()). Returns iterations."""
+    iterations = 0
+    while time.monotonic() < deadline:
+        walker = TreeWalker(root, table, rng, exploration)
+        sample = determinize(board_state, bank, players, decision.seat, rng)
+        game = SearchGame([walker.policy] * len(players), *sample, rng)
+        walker.backpropagate(game.resume(decision))
+        iterations += 1
+    return iterations
+
+
+# Transposition tables kept between searches, by searcher id, in the
+# process that ran them
+_tables: "OrderedDict[str, TranspositionTable]" = OrderedDict()
+
+
+def run_search(searcher: str, board_state: BoardState, bank: BankState,
+               players: List[PlayerState], decision: Decision, budget: float,
+               seed: int, exploration: float = EXPLORATION) -> Dict[object, Tuple[int, float]]:
+    """
+    Searches decision for budget seconds, continuing from what this process
+    last learned for searcher if the position is in its table. Returns
+    (visits, total reward) per root action, for the deciding seat. Safe to
+    run in a worker process or thread.
+    """
+    deadline = time.monotonic() + budget
+    detail = decision.liquidated_hotel.value if decision.kind == 'liquidation' else None
+    key = decision_key(board_state, bank, players, decision.kind, decision.seat, detail)
+    table = _tables.pop(searcher, None) or TranspositionTable(TABLE_SIZE)
+    root = table.get(key)
+    if root is None:
+        root = Node(len(players))
+        table.put(key, root)
+    search(root, table, board_state, bank, players, decision, deadline,
+           random.Random(seed), exploration)
+    _tables[searcher] = table
+    while len(_tables) > MAX_TABLES:
+        _tables.popitem(last=False)
+    seat = decision.seat
+    return {action: (child.visits, child.values[seat])
+            for action, child in root.children.items()}
+
+
+def forget_tree(searcher: str):
+    _tables.pop(searcher, None)
@@ -0,0 +1,156 @@
+import time
+from bisect import bisect_left
+from contextlib import nullcontext
+from typing import Dict, List, Optional, Tuple
+
+# Counters and histograms of what games spend their time on, cheap enough
+# to leave on in production. A GameOrchestrator (or Simulation) records into
+# its metrics attribute:
+#   turn_seconds, tile_wait_seconds (waiting for the player's tile),
+#   placement_seconds, merger_seconds (resolving a merger, liquidations
+#   included), liquidation_seconds (one player's liquidation),
+#   purchase_seconds (buying, including waiting for the order),
+#   emit_bytes (the JSON size of each update sent to players, only with
+#   emit_sizes, as measuring it costs an extra serialization per emit),
+#   and the counters turns, chains_started, mergers, dead_tiles, emits and
+#   rejected_inputs.
+# Metrics are off unless a Metrics is given: the default, NO_METRICS,
+# records nothing, and instrumented code pays one attribute lookup and a
+# no-op context manager per phase.
+
+LATENCY_BUCKETS = (1e-5, 1e-4, 1e-3, 0.01, 0.1, 1.0, 10.0, 60.0, 600.0)  # seconds
+SIZE_BUCKETS = (64, 256, 1024, 4096, 16384, 65536)  # bytes
+METRIC_PREFIX = "acquisitions_"
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class BucketHistogram:
+    """Counts of observations at or below each bucket bound, Prometheus style."""
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # the last is for > bounds[-1]
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def merge(self, other: "BucketHistogram"):
+        for i, n in enumerate(other.counts):
+            self.counts[i] += n
+        self.sum += other.sum
+        self.count += other.count
+
+    def cumulative(self) -> List[int]:
+        total, counts = 0, []
+        for n in self.counts:
+            total += n
+            counts.append(total)
+        return counts
+
+
+class Timer:
+    """Context manager observing its duration into a histogram."""
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram: BucketHistogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+
+class Metrics:
+    """Named counters and histograms (see the module comment for the names)."""
+    enabled = True
+
+    def __init__(self, emit_sizes: bool = False):
+        self.emit_sizes = emit_sizes
+        self.counters: Dict[str, int] = {}
+        self.histograms: Dict[str, BucketHistogram] = {}
+
+    def inc(self, name: str, n: int = 1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def histogram(self, name: str, bounds: Tuple[float, ...] = LATENCY_BUCKETS) -> BucketHistogram:
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = BucketHistogram(bounds)
+        return histogram
+
+    def observe(self, name: str, value: float, bounds: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.histogram(name, bounds).observe(value)
+
+    def timed(self, name: str) -> Timer:
+        """with metrics.timed(name): ... observes the block's duration, in seconds."""
+        return Timer(self.histogram(name))
+
+    def merge(self, other: "Metrics"):
+        for name, n in other.counters.items():
+            self.inc(name, n)
+        for name, histogram in other.histograms.items():
+            self.histogram(name, histogram.bounds).merge(histogram)
+
+    def snapshot(self) -> dict:
+        """A JSON-serializable copy of everything recorded."""
+        return {
+            'counters': dict(self.counters),
+            'histograms': {
+                name: {
+                    'bounds': list(h.bounds), 'counts': list(h.counts),
+                    'sum': h.sum, 'count': h.count,
+                    'mean': h.sum / h.count if h.count else 0.0,
+                }
+                for name, h in self.histograms.items()
+            },
+        }
+
+    def prometheus(self, gauges: Optional[Dict[str, float]] = None) -> str:
+        """
+        Everything recorded, plus the given gauges, in the Prometheus text
+        format. Gauges whose value is None (unknown) are left out.
+        """
+        lines = []
+        for name, value in sorted((gauges or {}).items()):
+            if value is None:
+                continue
+            lines.append(f"# TYPE {METRIC_PREFIX}{name} gauge")
+            lines.append(f"{METRIC_PREFIX}{name} {value}")
+        for name, n in sorted(self.counters.items()):
+            lines.append(f"# TYPE {METRIC_PREFIX}{name}_total counter")
+            lines.append(f"{METRIC_PREFIX}{name}_total {n}")
+        for name, h in sorted(self.histograms.items()):
+            metric = METRIC_PREFIX + name
+            lines.append(f"# TYPE {metric} histogram")
+            for bound, n in zip(h.bounds + ("+Inf",), h.cumulative()):
+                lines.append(f'{metric}_bucket{{le="{bound}"}} {n}')
+            lines.append(f"{metric}_sum {h.sum}")
+            lines.append(f"{metric}_count {h.count}")
+        return "\n".join(lines) + "\n"
+
+
+class NullMetrics(Metrics):
+    """Metrics that records nothing; see NO_METRICS."""
+    enabled = False
+    emit_sizes = False
+
+    def inc(self, name: str, n: int = 1):
+        pass
+
+    def observe(self, name: str, value: float, bounds: Tuple[float, ...] = LATENCY_BUCKETS):
+        pass
+
+    def timed(self, name: str):
+        return _NULL_TIMER
+
+
+_NULL_TIMER = nullcontext()
+NO_METRICS = NullMetrics()
@@ -1,8 +1,18 @@
-import random
-from typing import Optional 
+from typing import List, NamedTuple
 
 from acquisitions.game_logic.tile import *
 from acquisitions.game_logic.constants import *
+from acquisitions.game_logic.zobrist import *
+
+class Seat(NamedTuple):
+    """
+    Who occupies a player's seat, beyond the game state: a computer player,
+    or a human, with the secret they present to reclaim the seat on
+    reconnecting ('' if none).
+    """
+    token: str = ''
+    bot: bool = False
+
 
 class PlayerState:
     def __init__(self, name: str, money: int=6000, property=None, tiles=None):
@@ -10,14 +20,30 @@ class PlayerState:
         self.money = money
         # number of shares owned of each hotel type
         self.property = property if property else [0] * NUM_HOTELS
-        self.tiles = []
+        # Zobrist hash of property, kept up to date by BankState.transfer
+        self.zobrist = holdings_key(self.property)
+        # tiles in hand, as a set of the interned board Tiles
+        self.tiles = set(tiles) if tiles else set()
+
+    def clone(self) -> "PlayerState":
+        player = PlayerState.__new__(PlayerState)
+        player.name, player.money, player.zobrist = self.name, self.money, self.zobrist
+        player.property = self.property[:]
+        player.tiles = set(self.tiles)
+        return player
 
     def has_tile(self, tile: Tile) -> bool:
         return tile in self.tiles
     
-    def property(self) -> str:
-        msg = f"Propery for {self.name}: "
+    def property_summary(self) -> str:
+        msg = f"Property for {self.name}: "
         for (hotel, num_shares) in zip(Hotel, self.property):
             if num_shares > 0:
-                msg += f"{hotel.name}: {num_shares}"
-        print(f"Cash: {self.money}")
+                msg += f"{hotel.name}: {num_shares}, "
+        msg += f"Cash: {self.money}"
+        return msg
+
+
+def game_over(players: List[PlayerState]) -> bool:
+    """Whether a game is over: every tile has been placed, so no hand holds one."""
+    return not any(player.tiles for player in players)
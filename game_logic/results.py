@@ -0,0 +1,161 @@
+from enum import Enum
+from typing import List, NamedTuple, Optional, Tuple
+
+from acquisitions.game_logic.constants import *
+
+# Typed results of BankState operations. They record what happened (who was
+# paid what, which shares moved) without building any text; str(result)
+# renders the message shown to players, only when a UI needs one. Results
+# are NamedTuples, so clients that format messages themselves can use
+# result._asdict().
+
+
+class AwardKind(Enum):
+    MAJORITY = 'majority'
+    MINORITY = 'minority'
+    SPLIT = 'split'  # tied majority holders split both bonuses
+
+
+class Award(NamedTuple):
+    player: str
+    kind: AwardKind
+    amount: int
+
+
+class AwardResult(NamedTuple):
+    """Majority/minority awards for a hotel. No awards: no shareholders."""
+    hotel: Hotel
+    majority_bonus: int
+    minority_bonus: int
+    awards: List[Award]
+
+    def __str__(self):
+        msg = f"\nGranting awards for {self.hotel.name}.\n"
+        if not self.awards:
+            return msg + f"No shareholders of {self.hotel.name}"
+        msg += (f"Majority and minority awards are "
+                f"{self.majority_bonus} and {self.minority_bonus}.\n")
+        if self.awards[0].kind == AwardKind.SPLIT:
+            return msg + "Splitting majority bonus among: " + "".join(
+                f"{award.player}, " for award in self.awards)
+        majority, minority = self.awards[0], self.awards[1:]
+        msg += f"Awarding majority bonus to: {majority.player} \n"
+        if minority[0].player == majority.player:
+            return msg + (f"No minority holders; awarding minority bonus "
+                          f"to {majority.player} \n")
+        return msg + "Awarding minority grant to: " + "".join(
+            f"{award.player}, " for award in minority)
+
+
+class TransactionError(Enum):
+    TOO_MANY_SHARES = 'too_many_shares'
+    NEGATIVE_QUANTITY = 'negative_quantity'
+    HOTEL_NOT_ON_BOARD = 'hotel_not_on_board'
+    SHARES_UNAVAILABLE = 'shares_unavailable'
+    INSUFFICIENT_FUNDS = 'insufficient_funds'
+
+
+class TransactionResult(NamedTuple):
+    """
+    Outcome of a buy order. On failure, hotel and available describe the
+    offending hotel, where the error concerns one.
+    """
+    success: bool
+    cost: int = 0
+    buy_order: Optional[List[int]] = None
+    error: Optional[TransactionError] = None
+    hotel: Optional[Hotel] = None
+    available: int = 0
+
+    def __str__(self):
+        if self.error == TransactionError.TOO_MANY_SHARES:
+            return (f"Transaction rejected.\n Max {MAX_SHARES_PER_TURN} can be "
+                    f"purchased in one turn. Please try again.")
+        if self.error == TransactionError.NEGATIVE_QUANTITY:
+            return ("Transaction rejected. Cannot have negative "
+                    "entries in buy order. Please try again.")
+        if self.error == TransactionError.HOTEL_NOT_ON_BOARD:
+            return (f"Transaction rejected; attempt to purchase {self.hotel.name} "
+                    f"which is not on board. Please try again.")
+        if self.error == TransactionError.SHARES_UNAVAILABLE:
+            return (f"Transaction rejected; only {self.available} "
+                    f"shares of {self.hotel.name} available. Please try again.")
+        if self.error == TransactionError.INSUFFICIENT_FUNDS:
+            return ("Transaction rejected; player has insufficient funds.\n"
+                    "Please try again.")
+        msg = "Transaction valid!\n"
+        if self.buy_order is not None:
+            msg += "Awarding the following shares: \n" + "".join(
+                f"{hotel.name}: {shares}, "
+                for hotel, shares in zip(Hotel, self.buy_order) if shares)
+        return msg
+
+
+class LiquidationError(Enum):
+    NEGATIVE_QUANTITY = 'negative_quantity'
+    NOT_ENOUGH_SHARES = 'not_enough_shares'
+    BANK_SHARES_UNAVAILABLE = 'bank_shares_unavailable'
+
+
+class LiquidationResult(NamedTuple):
+    """
+    A player's sale and 2-for-1 trade of shares in a hotel absorbed in a
+    merger. rolled_over is set when an odd twofer count had its remainder
+    sold instead.
+    """
+    success: bool
+    player: str
+    liquidated_hotel: Hotel
+    owning_hotel: Hotel
+    sold: int = 0
+    traded: int = 0
+    proceeds: int = 0
+    rolled_over: bool = False
+    error: Optional[LiquidationError] = None
+
+    def __str__(self):
+        if self.error == LiquidationError.NEGATIVE_QUANTITY:
+            return (f"{self.player} cannot sell or trade a negative number of "
+                    f"shares. Please try again.")
+        if self.error == LiquidationError.NOT_ENOUGH_SHARES:
+            return (f"{self.player} does not have enough shares for this"
+                    f"transaction. Please try again.")
+        if self.error == LiquidationError.BANK_SHARES_UNAVAILABLE:
+            return (f"Rejecting transaction; bank has insufficient shares of"
+                    f"{self.owning_hotel.name} for selected twofer. Please try again.")
+        msg = "Rolling over remainder of twofer to sell\n" if self.rolled_over else ""
+        return msg + "\nLiquidation successful"
+
+
+class HotelLiquidation(NamedTuple):
+    """End-of-game payout for one hotel: awards, then every share sold."""
+    hotel: Hotel
+    share_value: int
+    awards: AwardResult
+    payouts: List[Tuple[str, int, int]]  # (player, shares, value)
+
+    def __str__(self):
+        msg = str(self.awards)
+        msg += f"\nLiquidating assets for {self.hotel.name} \n"
+        msg += f"\nShare value is {self.share_value}"
+        for player, shares, value in self.payouts:
+            msg += f"{player} has {shares}; liquid value is {value} \n"
+        return msg
+
+
+class FinalScores(NamedTuple):
+    liquidations: List[HotelLiquidation]
+    rankings: List[Tuple[str, int]]  # (player, money), richest first
+    winners: List[str]
+
+    def __str__(self):
+        msg = "Tallying final scores!\n"
+        msg += "".join(str(liquidation) for liquidation in self.liquidations)
+        msg += "Final scores:\n "
+        for player, money in self.rankings:
+            msg += f"{player}: {money} \n"
+        if len(self.winners) == 1:
+            msg += f"The winner is: {self.winners[0]}. Congratulations!\n"
+        else:
+            msg += f"The winners are: {self.winners}. Congratulations!\n"
+        return msg
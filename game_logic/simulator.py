@@ -0,0 +1,296 @@
+import argparse
+import json
+import random
+import time
+from typing import Callable, List, NamedTuple, Optional, Tuple
+
+from acquisitions.game_logic.constants import *
+from acquisitions.game_logic.tile import *
+from acquisitions.game_logic.player import *
+from acquisitions.game_logic.board_state import *
+from acquisitions.game_logic.bank import *
+from acquisitions.game_logic.legal_moves import *
+from acquisitions.game_logic.metrics import Metrics, NO_METRICS
+
+# Policy callables. Each receives the Simulation in progress (for access to
+# board_state, bank, players and rng), the deciding player, and the options.
+TilePolicy = Callable[["Simulation", PlayerState, List[Tile]], Tile]
+HotelPolicy = Callable[["Simulation", PlayerState, List[Hotel]], Hotel]
+BuyPolicy = Callable[["Simulation", PlayerState, List[Hotel]], List[int]]
+LiquidationPolicy = Callable[["Simulation", PlayerState, Hotel, int], Tuple[int, int]]
+
+
+def random_tile(sim: "Simulation", player: PlayerState, tiles: List[Tile]) -> Tile:
+    return sim.rng.choice(sorted(tiles, key=lambda t: t.index))
+
+
+def random_hotel(sim: "Simulation", player: PlayerState, hotels: List[Hotel]) -> Hotel:
+    return sim.rng.choice(hotels)
+
+
+def random_buy_order(sim: "Simulation", player: PlayerState, hotels: List[Hotel]) -> List[int]:
+    """Buys up to MAX_SHARES_PER_TURN random shares the player can afford."""
+    buy_order = [0] * NUM_HOTELS
+    money = player.money
+    prices = share_prices(sim.board_state.hotel_sizes)
+    for _ in range(sim.rng.randint(0, MAX_SHARES_PER_TURN)):
+        hotel = sim.rng.choice(hotels)
+        price = prices[hotel.value]
+        if price > money or buy_order[hotel.value] >= sim.bank.property[hotel.value]:
+            continue
+        buy_order[hotel.value] += 1
+        money -= price
+    return buy_order
+
+
+def sell_all(sim: "Simulation", player: PlayerState, hotel: Hotel, num_shares: int) -> Tuple[int, int]:
+    return num_shares, 0
+
+
+class Policy:
+    """
+    The set of decision callables used for one seat of a Simulation.
+    Any callable left unspecified falls back to a uniformly random choice
+    (or selling everything, for liquidation).
+    """
+    def __init__(
+            self,
+            choose_tile: Optional[TilePolicy] = None,
+            choose_hotel: Optional[HotelPolicy] = None,
+            choose_buy_order: Optional[BuyPolicy] = None,
+            choose_liquidation: Optional[LiquidationPolicy] = None):
+        self.choose_tile = choose_tile or random_tile
+        self.choose_hotel = choose_hotel or random_hotel
+        self.choose_buy_order = choose_buy_order or random_buy_order
+        self.choose_liquidation = choose_liquidation or sell_all
+
+
+class GameResult(NamedTuple):
+    """Outcome of a single simulated game. Lists are indexed by seat."""
+    scores: List[int]
+    winners: List[int]
+    num_turns: int
+    num_chains_started: int
+    num_mergers: int
+    num_dead_tiles: int
+    hotel_sizes: List[int]
+
+
+class Simulation:
+    """
+    A single, synchronous, UI-free game of Acquisitions. Follows the same
+    rules as GameOrchestrator, but asks Policy callables for every decision
+    instead of awaiting input from a UI. Records the same per-phase metrics
+    as GameOrchestrator into metrics, if given.
+    """
+    def __init__(self, policies: List[Policy], rng: Optional[random.Random] = None,
+                 metrics: Metrics = NO_METRICS):
+        self.policies = policies
+        self.rng = rng or random.Random()
+        self.metrics = metrics
+        self.players = [PlayerState(f"Player{i}") for i in range(len(policies))]
+        self.bank = BankState(self.rng)
+        self.board_state = BoardState()
+        self.num_turns = 0
+        self.num_chains_started = 0
+        self.num_mergers = 0
+        self.num_dead_tiles = 0
+
+    def play(self) -> GameResult:
+        """Plays the game to completion and returns its result."""
+        for player in self.players:
+            for _ in range(TILES_PER_PLAYER):
+                self.bank.draw_tile(player)
+        return self.play_from(0)
+
+    def play_from(self, seat: int) -> GameResult:
+        """Plays the game to completion, starting with seat's turn."""
+        num_players = len(self.players)
+        while not game_over(self.players):
+            if self.players[seat].tiles:
+                with self.metrics.timed('turn_seconds'):
+                    self.play_turn(seat)
+            seat = (seat + 1) % num_players
+        self.bank.tally_scores(self.players, self.board_state.hotel_sizes)
+        scores = [p.money for p in self.players]
+        best = max(scores)
+        return GameResult(
+            scores=scores,
+            winners=[i for i, s in enumerate(scores) if s == best],
+            num_turns=self.num_turns,
+            num_chains_started=self.num_chains_started,
+            num_mergers=self.num_mergers,
+            num_dead_tiles=self.num_dead_tiles,
+            hotel_sizes=self.board_state.hotel_sizes[:NUM_HOTELS],
+        )
+
+    def play_turn(self, seat: int):
+        player = self.players[seat]
+        policy = self.policies[seat]
+        tile = policy.choose_tile(
+            self, player, legal_tiles(self.board_state, player.tiles))
+        player.tiles.remove(tile)
+        self.place_tile(seat, tile)
+        with self.metrics.timed('purchase_seconds'):
+            self.execute_purchases(seat)
+        self.bank.draw_tile(player)
+        self.num_turns += 1
+        self.metrics.inc('turns')
+
+    def place_tile(self, seat: int, tile: Tile):
+        with self.metrics.timed('placement_seconds'):
+            game_event = self.board_state.place_tile(tile)
+        if game_event == GameEvent.START_CHAIN:
+            self.start_chain(seat, tile)
+        elif game_event == GameEvent.MERGER:
+            with self.metrics.timed('merger_seconds'):
+                self.handle_merger(seat, tile)
+
+    def start_chain(self, seat: int, tile: Tile):
+        available_hotels = self.board_state.available_hotels()
+        if not available_hotels:
+            return
+        player = self.players[seat]
+        hotel = self.policies[seat].choose_hotel(self, player, available_hotels)
+        self.bank.issue_free_share(player, hotel)
+        self.board_state.mark_recursive(tile, hotel)
+        self.num_chains_started += 1
+        self.metrics.inc('chains_started')
+
+    def handle_merger(self, seat: int, tile: Tile):
+        can_merge, majority_options, hotels = self.board_state.check_merger(tile)
+        if not can_merge:
+            self.board_state.mark_dead_tile(tile)
+            self.num_dead_tiles += 1
+            self.metrics.inc('dead_tiles')
+            return
+        if len(majority_options) > 1:
+            hotel = self.policies[seat].choose_hotel(
+                self, self.players[seat], majority_options)
+            hotels.remove(hotel)
+            hotels.insert(0, hotel)
+        for hotel in hotels[1:]:
+            self.execute_liquidity_event(hotel, hotels[0])
+        self.board_state.execute_merger(tile, hotels)
+        self.num_mergers += 1
+        self.metrics.inc('mergers')
+
+    def execute_liquidity_event(self, liquidated_hotel: Hotel, owning_hotel: Hotel):
+        size = self.board_state.hotel_sizes[liquidated_hotel.value]
+        self.bank.grant_awards(self.players, liquidated_hotel, size)
+        seats = sorted(
+            range(len(self.players)),
+            key=lambda i: -self.players[i].property[liquidated_hotel.value])
+        self.liquidate_holdings(seats, liquidated_hotel, owning_hotel, size)
+
+    def liquidate_holdings(
+            self, seats: List[int], liquidated_hotel: Hotel, owning_hotel: Hotel, size: int):
+        """Asks the given seats, in order, what to do with their shares."""
+        for i in seats:
+            player = self.players[i]
+            shares = player.property[liquidated_hotel.value]
+            if not shares:
+                continue
+            with self.metrics.timed('liquidation_seconds'):
+                sell, twofer = self.policies[i].choose_liquidation(
+                    self, player, liquidated_hotel, shares)
+                result = self.bank.liquidate_shares(
+                    player, liquidated_hotel, size, sell, twofer, owning_hotel)
+                if not result.success:
+                    # Policies get a single attempt; fall back to selling everything
+                    self.metrics.inc('rejected_inputs')
+                    self.bank.liquidate_shares(
+                        player, liquidated_hotel, size, shares, 0, owning_hotel)
+
+    def execute_purchases(self, seat: int):
+        hotels = self.board_state.hotels_on_board()
+        if not hotels:
+            return
+        player = self.players[seat]
+        buy_order = self.policies[seat].choose_buy_order(self, player, hotels)
+        self.bank.execute_transaction(player, buy_order, self.board_state.hotel_sizes)
+
+
+class SimulationReport:
+    """Aggregate outcome and throughput of a run of simulated games."""
+    def __init__(self, num_players: int):
+        self.num_games = 0
+        self.elapsed = 0.0
+        self.wins = [0] * num_players
+        self.total_turns = 0
+
+    @property
+    def games_per_sec(self) -> float:
+        return self.num_games / self.elapsed if self.elapsed else 0.0
+
+    def add(self, result: GameResult):
+        self.num_games += 1
+        self.total_turns += result.num_turns
+        for seat in result.winners:
+            self.wins[seat] += 1
+
+    def __str__(self):
+        return (
+            f"{self.num_games} games in {self.elapsed:.2f}s "
+            f"({self.games_per_sec:.1f} games/sec, "
+            f"{self.games_per_sec * 3600:.0f} games/hour)\n"
+            f"Wins by seat: {self.wins}"
+        )
+
+
+def game_seed(seed: int, game_index: int) -> int:
+    """The RNG seed of game number game_index in a run seeded with seed."""
+    return (seed << 32) | game_index
+
+
+class Simulator:
+    """
+    Runs many headless games back to back with a fixed set of policies, and
+    measures throughput. Per-game results are passed to on_result, if given.
+    Every game gets its own RNG, seeded by game_seed, so any game of a run
+    can be replayed on its own given the run's seed and the game's index.
+    With metrics, every game records into it, for a snapshot() of the run.
+    """
+    def __init__(self, policies: List[Policy], seed: Optional[int] = None,
+                 metrics: Optional[Metrics] = None):
+        self.policies = policies
+        self.seed = seed if seed is not None else random.getrandbits(32)
+        self.metrics = metrics or NO_METRICS
+
+    def play_game(self, game_index: int) -> GameResult:
+        rng = random.Random(game_seed(self.seed, game_index))
+        return Simulation(self.policies, rng, self.metrics).play()
+
+    def run(
+            self,
+            num_games: int,
+            on_result: Optional[Callable[[GameResult], None]] = None,
+            first_game: int = 0) -> SimulationReport:
+        report = SimulationReport(len(self.policies))
+        start = time.perf_counter()
+        for game_index in range(first_game, first_game + num_games):
+            result = self.play_game(game_index)
+            report.add(result)
+            if on_result:
+                on_result(result)
+        report.elapsed = time.perf_counter() - start
+        return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run headless Acquisitions games.")
+    parser.add_argument("--games", type=int, default=1000)
+    parser.add_argument("--players", type=int, default=DEFAULT_PLAYERS)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--metrics", action="store_true",
+                        help="also print per-phase metrics of the run, as JSON")
+    args = parser.parse_args()
+    metrics = Metrics() if args.metrics else None
+    simulator = Simulator([Policy() for _ in range(args.players)], args.seed, metrics)
+    print(simulator.run(args.games))
+    if metrics:
+        print(json.dumps(metrics.snapshot(), indent=2))
+
+# To run: python -m acquisitions.game_logic.simulator from top level dir
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+import struct
+from array import array
+from typing import List, NamedTuple, Tuple
+
+from acquisitions.game_logic.constants import *
+from acquisitions.game_logic.tile import *
+from acquisitions.game_logic.player import *
+from acquisitions.game_logic.board_state import *
+from acquisitions.game_logic.bank import *
+
+# Compact binary snapshots of game state.
+# All integers are little-endian. Board and chain arrays are written as raw
+# NUM_CELLS-long byte / uint16 blocks; tiles are written as uint16 flat indices.
+SNAPSHOT_MAGIC = b"ACQ"
+SNAPSHOT_VERSION = 1
+INPUT_TYPES = ('tile', 'hotel', 'buy_order', 'liquidation')
+
+_HEADER = struct.Struct("<3sBHH")
+_GAME = struct.Struct("<HBBbB")  # turn, curr player, flags, pending player, pending type
+_U8 = struct.Struct("<B")
+_U16 = struct.Struct("<H")
+_I64 = struct.Struct("<q")
+_STARTED, _FINISHED = 1, 2
+_BOT = 1  # seat flags
+
+
+class SnapshotError(Exception):
+    pass
+
+
+class SnapshotSummary(NamedTuple):
+    """What a snapshot says of its game's players, read without restoring it."""
+    finished: bool
+    player_names: List[str]
+    seats: List[Seat]
+
+
+class Reader:
+    def __init__(self, data: bytes):
+        self.data = memoryview(data)
+        self.pos = 0
+
+    def unpack(self, fmt: struct.Struct) -> tuple:
+        values = fmt.unpack_from(self.data, self.pos)
+        self.pos += fmt.size
+        return values
+
+    def read(self, n: int) -> bytes:
+        chunk = bytes(self.data[self.pos:self.pos + n])
+        self.pos += n
+        return chunk
+
+    def read_u16s(self, n: int) -> array:
+        values = array('H')
+        values.frombytes(self.read(2 * n))
+        return values
+
+
+def _u16s(values) -> bytes:
+    return array('H', values).tobytes()
+
+
+def write_board_state(out: bytearray, board_state: BoardState):
+    out += board_state.cells
+    out += board_state.chains.parent.tobytes()
+    out += board_state.chains.size.tobytes()
+    out += _u16s(board_state.hotel_sizes)
+
+
+def read_board_state(reader: Reader) -> BoardState:
+    board_state = BoardState()
+    board_state.cells = bytearray(reader.read(NUM_CELLS))
+    board_state.chains.parent = reader.read_u16s(NUM_CELLS)
+    board_state.chains.size = reader.read_u16s(NUM_CELLS)
+    board_state.hotel_sizes = list(reader.read_u16s(NUM_HOTELS + 1))
+    board_state.rebuild_adjacency()
+    board_state.rebuild_zobrist()
+    return board_state
+
+
+def write_bank_state(out: bytearray, bank: BankState):
+    out += _u16s(bank.property)
+    out += _U16.pack(len(bank.tiles))
+    out += _u16s(t.index for t in bank.tiles)
+
+
+def read_bank_state(reader: Reader) -> BankState:
+    bank = BankState()
+    bank.property = list(reader.read_u16s(NUM_HOTELS))
+    (num_tiles,) = reader.unpack(_U16)
+    bank.tiles = [TILES[i] for i in reader.read_u16s(num_tiles)]
+    return bank
+
+
+def write_player_state(out: bytearray, player: PlayerState):
+    name = player.name.encode("utf-8")
+    out += _U16.pack(len(name)) + name
+    out += _I64.pack(player.money)
+    out += _u16s(player.property)
+    tiles = sorted(t.index for t in player.tiles)
+    out += _U16.pack(len(tiles)) + _u16s(tiles)
+
+
+def read_player_state(reader: Reader) -> PlayerState:
+    (name_len,) = reader.unpack(_U16)
+    name = reader.read(name_len).decode("utf-8")
+    (money,) = reader.unpack(_I64)
+    player = PlayerState(name, money, list(reader.read_u16s(NUM_HOTELS)))
+    (num_tiles,) = reader.unpack(_U16)
+    player.tiles = {TILES[i] for i in reader.read_u16s(num_tiles)}
+    return player
+
+
+def encode_state(
+        board_state: BoardState,
+        bank: BankState,
+        players: List[PlayerState]) -> bytes:
+    """Snapshot of the board, bank and players (without the header)."""
+    out = bytearray()
+    write_board_state(out, board_state)
+    write_bank_state(out, bank)
+    out += _U8.pack(len(players))
+    for player in players:
+        write_player_state(out, player)
+    return bytes(out)
+
+
+def decode_state(reader: Reader) -> Tuple[BoardState, BankState, List[PlayerState]]:
+    board_state = read_board_state(reader)
+    bank = read_bank_state(reader)
+    (num_players,) = reader.unpack(_U8)
+    players = [read_player_state(reader) for _ in range(num_players)]
+    return board_state, bank, players
+
+
+def check_header(reader: Reader):
+    magic, version, rows, cols = reader.unpack(_HEADER)
+    if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+        raise SnapshotError(f"Unrecognized snapshot format {magic!r} v{version}")
+    if (rows, cols) != (NUM_ROWS, NUM_COLS):
+        raise SnapshotError(
+            f"Snapshot is for a {rows}x{cols} board, not {NUM_ROWS}x{NUM_COLS}")
+
+
+def write_seat(out: bytearray, seat: Seat):
+    token = seat.token.encode("utf-8")
+    out += _U8.pack(_BOT if seat.bot else 0)
+    out += _U16.pack(len(token)) + token
+
+
+def read_seat(reader: Reader) -> Seat:
+    (flags,) = reader.unpack(_U8)
+    (token_len,) = reader.unpack(_U16)
+    return Seat(reader.read(token_len).decode("utf-8"), bool(flags & _BOT))
+
+
+def header() -> bytes:
+    return _HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, NUM_ROWS, NUM_COLS)
+
+
+def snapshot_game(game) -> bytes:
+    """
+    Encodes the state of a GameOrchestrator: board, bank, players, turn
+    index, pending input and seats.
+    """
+    flags = (_STARTED if game.started else 0) | (_FINISHED if game.finished else 0)
+    pending_player, pending_type = -1, 0
+    if game.pending_input:
+        pending_player = game.pending_input[0]
+        pending_type = INPUT_TYPES.index(game.pending_input[1])
+    out = bytearray(header())
+    out += _GAME.pack(game.turn, game.curr_player_id, flags, pending_player, pending_type)
+    out += encode_state(game.board_state, game.bank, game.players)
+    for seat in game.seats:
+        write_seat(out, seat)
+    return bytes(out)
+
+
+def summarize_snapshot(data: bytes) -> SnapshotSummary:
+    reader = Reader(data)
+    check_header(reader)
+    flags = reader.unpack(_GAME)[2]
+    _, _, players = decode_state(reader)
+    seats = [read_seat(reader) for _ in players]
+    return SnapshotSummary(bool(flags & _FINISHED), [p.name for p in players], seats)
+
+
+def restore_game(data: bytes, game):
+    """
+    Restores a snapshot taken by snapshot_game into game, a freshly
+    constructed GameOrchestrator, and returns it. The restored game resumes
+    from the start of its current turn when played.
+    """
+    reader = Reader(data)
+    check_header(reader)
+    turn, curr_player_id, flags, pending_player, pending_type = reader.unpack(_GAME)
+    game.board_state, game.bank, game.players = decode_state(reader)
+    game.seats = [read_seat(reader) for _ in game.players]
+    game.turn = turn
+    game.curr_player_id = curr_player_id
+    game.started = bool(flags & _STARTED)
+    game.finished = bool(flags & _FINISHED)
+    game.pending_input = (
+        (pending_player, INPUT_TYPES[pending_type]) if pending_player >= 0 else None)
+    return game
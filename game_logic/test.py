@@ -1,2 +1,377 @@
-# TODO
+import asyncio
+import io
+import random
+import unittest
+from typing import List, Tuple
 
+from acquisitions.game_logic.constants import *
+from acquisitions.game_logic.bank import BankState
+from acquisitions.game_logic.board_state import OCCUPIED_BIT, BoardState
+from acquisitions.game_logic.event_log import *
+from acquisitions.game_logic.game_orchestrator import GameOrchestrator
+from acquisitions.game_logic.game_state import GameState
+from acquisitions.game_logic.input_validation import *
+from acquisitions.game_logic.legal_moves import *
+from acquisitions.game_logic.player import *
+from acquisitions.game_logic.snapshot import *
+from acquisitions.game_logic.tile import *
+from acquisitions.game_logic.zobrist import *
+from acquisitions.ui.ui_interface import BaseUI
+
+# Tests of the game logic. Derived state (incremental hashes, snapshots and
+# event logs) is checked against a rebuild from scratch, over complete games
+# played by RandomUIs from fixed seeds; move generation on small boards built
+# move by move (see build_board).
+
+NUM_GAMES = 20
+
+
+class RandomUI(BaseUI):
+    """Answers every prompt of its game with a random legal choice."""
+    def __init__(self, rng: random.Random):
+        self.rng = rng
+        self.game = None
+
+    def render_board(self, cell_states):
+        pass
+
+    def display_message(self, msg: str):
+        pass
+
+    async def choose(self):
+        return self.rng.choice(self.game.legal_actions())
+
+    async def get_tile_from_user(self, player: PlayerState) -> Tile:
+        return await self.choose()
+
+    async def get_hotel_from_user(self, player: PlayerState, hotels: List[Hotel]) -> Hotel:
+        return await self.choose()
+
+    async def get_buy_order_from_user(self, player: PlayerState, hotels: List[Hotel]) -> List[int]:
+        return list(await self.choose())
+
+    async def get_user_liquidation_option(self, name: str, num_shares: int) -> Tuple[int, int]:
+        return await self.choose()
+
+
+def new_game(seed: int, num_players: int = 2) -> GameOrchestrator:
+    """A game between RandomUIs, reproducible from seed."""
+    rng = random.Random(seed)
+    uis = [RandomUI(rng) for _ in range(num_players)]
+    game = GameOrchestrator(uis)
+    for ui in uis:
+        ui.game = game
+    game.bank = BankState(rng)
+    for i in range(num_players):
+        game.add_player(f"Player{i}")
+    return game
+
+
+def play_logged(game: GameOrchestrator, checkpoint_interval: int) -> bytes:
+    """Plays game to completion with an event log, returning the log."""
+    stream = io.BytesIO()
+    game.event_log = EventLog(stream, checkpoint_interval)
+    asyncio.run(game.play())
+    return stream.getvalue()
+
+
+class ZobristTest(unittest.TestCase):
+    """Incremental Zobrist hashes agree with hashes rebuilt from scratch."""
+    def check_hashes(self, state: GameState):
+        board = state.board_state.clone()
+        board.rebuild_zobrist()
+        self.assertEqual(state.board_state.zobrist, board.zobrist)
+        for player in state.players:
+            self.assertEqual(player.zobrist, holdings_key(player.property))
+        # A position decoded from its encoding is hashed from scratch
+        reader = Reader(header() + state.encode())
+        check_header(reader)
+        self.assertEqual(state.key(), position_key(*decode_state(reader)))
+
+    def test_apply_and_undo(self):
+        for seed in range(NUM_GAMES):
+            replay = GameReplay(play_logged(new_game(seed), checkpoint_interval=1000))
+            reader = Reader(replay.records[0].state)
+            check_header(reader)
+            state = GameState(*decode_state(reader))
+            keys = [state.key()]
+            for record in replay.records[1:]:
+                if isinstance(record, Checkpoint):
+                    continue
+                state.apply(record)
+                self.check_hashes(state)
+                keys.append(state.key())
+            while state.undo_stack:
+                state.undo()
+                keys.pop()
+                self.assertEqual(state.key(), keys[-1])
+            self.check_hashes(state)
+
+    def test_transpositions(self):
+        conti, tober = Hotel.CONTI, Hotel.TOBER
+        # Each list of orders reaches one position, with chains started,
+        # grown and (in all but the last order of each) merged
+        transpositions = [
+            [[("A0", None), ("A1", conti), ("B0", None)],
+             [("B0", None), ("A0", conti), ("A1", None)]],
+            [[("A0", None), ("A1", conti), ("A3", None), ("B3", tober), ("A2", conti)],
+             [("A3", None), ("B3", tober), ("A0", None), ("A1", conti), ("A2", conti)],
+             [("A0", None), ("A1", conti), ("A2", None), ("A3", None), ("B3", None)]],
+            [[("A0", None), ("A1", conti), ("A3", None), ("B3", tober), ("A2", tober)],
+             [("B3", None), ("A3", tober), ("A2", None), ("A1", None), ("A0", None)]],
+        ]
+        keys = []
+        for orders in transpositions:
+            boards = [build_board(order) for order in orders]
+            for board in boards[1:]:
+                self.assertEqual(describe(board), describe(boards[0]))
+                self.assertEqual(board.zobrist, boards[0].zobrist)
+            keys.append(boards[0].zobrist)
+        # The same tiles in other chains, or in none, are other positions
+        keys.append(build_board([("A0", None), ("A1", None), ("B0", None)]).zobrist)
+        keys.append(build_board([("A0", None), ("A1", tober), ("B0", None)]).zobrist)
+        self.assertEqual(len(set(keys)), len(keys))
+
+
+def build_board(moves) -> BoardState:
+    """
+    The board after the given (tile, hotel) moves, where hotel is the one
+    the tile starts or the survivor of the merger it causes.
+    """
+    board = BoardState()
+    for name, hotel in moves:
+        tile = TILES_BY_STR[name]
+        event = board.place_tile(tile)
+        if event == GameEvent.START_CHAIN and hotel is not None:
+            board.mark_recursive(tile, hotel)
+        elif event == GameEvent.MERGER:
+            board.execute_merger(tile, [hotel])
+    return board
+
+
+def describe(board: BoardState) -> list:
+    """The hotel (or None for empty cells) of every cell of a board."""
+    return [board.hotel_at(i) if board.cells[i] & OCCUPIED_BIT else None
+            for i in range(NUM_CELLS)]
+
+
+class SnapshotTest(unittest.TestCase):
+    """Snapshots restore to games that snapshot to the same bytes."""
+    def test_round_trip(self):
+        for seed in range(NUM_GAMES):
+            game = new_game(seed)
+            game.seats = [Seat(token="token0"), Seat(bot=True)]
+            snapshots = []
+            game.on_turn_end = lambda game: snapshots.append(snapshot_game(game))
+            asyncio.run(game.play())
+            for snapshot in snapshots:
+                restored = restore_game(snapshot, GameOrchestrator(game.uis))
+                self.assertEqual(snapshot_game(restored), snapshot)
+                self.assertEqual(restored.seats, game.seats)
+                self.assertEqual(
+                    [p.name for p in restored.players], ["Player0", "Player1"])
+
+    def test_rejects_other_boards(self):
+        snapshot = bytearray(snapshot_game(new_game(0)))
+        snapshot[len(SNAPSHOT_MAGIC) + 1] += 1  # the number of rows
+        with self.assertRaises(SnapshotError):
+            restore_game(bytes(snapshot), GameOrchestrator([]))
+
+
+class EventLogTest(unittest.TestCase):
+    """Event logs replay to the states the game passed through."""
+    def test_replay(self):
+        for seed in range(NUM_GAMES):
+            game = new_game(seed)
+            states = []
+            game.on_turn_end = lambda game: states.append(
+                encode_state(game.board_state, game.bank, game.players))
+            data = play_logged(game, checkpoint_interval=3)
+            replay = GameReplay(data)
+            self.assertTrue(replay.finished)
+            # The last turn is closed by GameEnded rather than TurnEnded
+            self.assertEqual(replay.num_turns, len(states) - 1)
+            for turn in range(1, replay.num_turns + 1):
+                self.assertEqual(encode_state(*replay.state_at(turn)), states[turn - 1])
+            self.assertEqual(encode_state(*replay.state_at()), states[-1])
+            self.assertEqual(b"".join(map(encode_record, replay.records)), data)
+
+    def test_truncated_log(self):
+        data = play_logged(new_game(0), checkpoint_interval=3)
+        replay = GameReplay(data)
+        truncated = GameReplay(data[:-3])
+        self.assertFalse(truncated.finished)
+        self.assertEqual(truncated.records, replay.records[:-1])
+        self.assertEqual(
+            encode_state(*truncated.state_at(truncated.num_turns)),
+            encode_state(*replay.state_at(truncated.num_turns)))
+
+class LegalMovesTest(unittest.TestCase):
+    """Tile classification and the legal tiles, buy orders and liquidations."""
+    def setUp(self):
+        # CONTI on A0-A1, TOBER on A3-B3, and a loose tile on C0
+        self.board = build_board([
+            ("A0", None), ("A1", Hotel.CONTI), ("A3", None), ("B3", Hotel.TOBER),
+            ("C0", None)])
+
+    def make_safe(self, *hotels: Hotel):
+        # Hotels too large to be absorbed do not fit on a small board, so
+        # only their sizes are raised
+        for hotel in hotels:
+            self.board.hotel_sizes[hotel.value] = MAX_MERGEABLE_SIZE + 1
+
+    def test_classify(self):
+        classes = {name: self.board.classify(TILES_BY_STR[name])
+                   for name in ("A2", "B0", "C1", "C2")}
+        self.assertEqual(classes, {
+            "A2": TileClass.MERGER, "B0": TileClass.JOIN,
+            "C1": TileClass.START, "C2": TileClass.ISOLATED})
+        self.make_safe(Hotel.CONTI)
+        self.assertEqual(self.board.classify(TILES_BY_STR["A2"]), TileClass.MERGER)
+        self.make_safe(Hotel.TOBER)
+        self.assertEqual(self.board.classify(TILES_BY_STR["A2"]), TileClass.UNPLAYABLE)
+
+    def hand(self, *names: str) -> List[Tile]:
+        return [TILES_BY_STR[name] for name in names]
+
+    def test_tiles_merging_safe_chains_are_excluded(self):
+        self.make_safe(Hotel.CONTI, Hotel.TOBER)
+        self.assertEqual(legal_tiles(self.board, self.hand("A2", "C2")), self.hand("C2"))
+
+    def test_no_chain_starts_while_every_hotel_is_on_the_board(self):
+        hand = self.hand("C1", "C2")
+        self.assertEqual(legal_tiles(self.board, hand), hand)
+        for hotel in range(NUM_HOTELS):
+            self.board.hotel_sizes[hotel] = self.board.hotel_sizes[hotel] or 2
+        self.assertEqual(legal_tiles(self.board, hand), self.hand("C2"))
+
+    def test_whole_hand_when_no_tile_is_legal(self):
+        self.make_safe(Hotel.CONTI, Hotel.TOBER)
+        for hotel in range(NUM_HOTELS):
+            self.board.hotel_sizes[hotel] = self.board.hotel_sizes[hotel] or 2
+        hand = self.hand("A2", "C1")
+        self.assertEqual(legal_tiles(self.board, hand), hand)
+
+    def check_buy_orders(self, bank: BankState, player: PlayerState) -> List[tuple]:
+        """legal_buy_orders, checked against validate_transaction of every order."""
+        orders = legal_buy_orders(self.board, bank, player)
+        valid = [order for order, _ in BUY_ORDERS if bank.validate_transaction(
+            player, list(order), self.board.hotel_sizes).success]
+        self.assertEqual(orders, valid)
+        return orders
+
+    def test_buy_orders_limited_by_cash(self):
+        bank = BankState()
+        price = share_price(Hotel.CONTI, self.board.hotel_sizes[Hotel.CONTI.value])
+        player = PlayerState("Player0", money=0)
+        self.assertEqual(self.check_buy_orders(bank, player), [(0,) * NUM_HOTELS])
+        player.money = 2 * price
+        orders = self.check_buy_orders(bank, player)
+        two, three = [0] * NUM_HOTELS, [0] * NUM_HOTELS
+        two[Hotel.CONTI.value], three[Hotel.CONTI.value] = 2, 3
+        self.assertIn(tuple(two), orders)
+        self.assertNotIn(tuple(three), orders)
+        # Only hotels on the board are for sale
+        for order in orders:
+            for hotel in range(NUM_HOTELS):
+                self.assertTrue(self.board.hotel_sizes[hotel] or not order[hotel])
+
+    def test_buy_orders_limited_by_bank_stock(self):
+        bank = BankState()
+        bank.property[Hotel.TOBER.value] = 1
+        player = PlayerState("Player0", money=100000)
+        orders = self.check_buy_orders(bank, player)
+        self.assertEqual(max(order[Hotel.TOBER.value] for order in orders), 1)
+        self.assertEqual(max(order[Hotel.CONTI.value] for order in orders), MAX_SHARES_PER_TURN)
+
+    def test_liquidations_have_even_twofers(self):
+        bank = BankState()
+        player = PlayerState("Player0")
+        player.property[Hotel.CONTI.value] = 5
+        options = legal_liquidations(bank, player, Hotel.CONTI, Hotel.TOBER)
+        self.assertEqual(len(options), 6 + 4 + 2)
+        for sell, twofer in options:
+            self.assertEqual(twofer % 2, 0)
+            self.assertLessEqual(sell + twofer, 5)
+        self.assertIn((1, 4), options)
+        # Twofers are limited by the shares of the owning hotel left
+        bank.property[Hotel.TOBER.value] = 1
+        options = legal_liquidations(bank, player, Hotel.CONTI, Hotel.TOBER)
+        self.assertEqual(sorted({twofer for _, twofer in options}), [0, 2])
+
+
+class InputValidationTest(unittest.TestCase):
+    """validate_move refuses whatever the game itself would refuse, and more."""
+    def setUp(self):
+        self.game = new_game(0)
+        # CONTI on A0-A1, TOBER on A3-B3
+        self.game.board_state = build_board([
+            ("A0", None), ("A1", Hotel.CONTI), ("A3", None), ("B3", Hotel.TOBER)])
+        self.player = self.game.players[0]
+        self.player.tiles = {TILES_BY_STR["B0"], TILES_BY_STR["C2"]}
+        self.player.property[Hotel.CONTI.value] = 4
+
+    def check(self, input_type: str, move, options=None):
+        self.game.pending_input = (0, input_type)
+        self.game.pending_options = options
+        return validate_move(self.game, move)
+
+    def test_valid_moves(self):
+        self.assertIsNone(self.check('tile', {'tile': 'B0'}))
+        self.assertIsNone(self.check('hotel', {'hotel': 'CONTI'}, [Hotel.CONTI, Hotel.TOBER]))
+        self.assertIsNone(self.check('buy_order', {'buy_order': {'CONTI': 1, 'TOBER': 2}}))
+        self.assertIsNone(self.check(
+            'liquidation', {'sell': 2, 'twofer': 2}, (Hotel.CONTI, Hotel.TOBER)))
+
+    def test_no_input_awaited(self):
+        self.game.pending_input = None
+        self.assertIsNotNone(validate_move(self.game, {'tile': 'B0'}))
+
+    def test_malformed_moves(self):
+        for input_type, move in [
+                ('tile', None),
+                ('tile', ['B0']),
+                ('tile', {}),  # missing key
+                ('tile', {'hotel': 'B0'}),  # unknown key
+                ('tile', {'tile': 'B0', 'extra': 1}),
+                ('tile', {'tile': 7}),
+                ('buy_order', {'buy_order': [1, 0, 0]}),
+                ('buy_order', {'buy_order': {'CONTI': True}}),  # bools are not ints
+                ('buy_order', {'buy_order': {'CONTI': 1.0}}),
+                ('buy_order', {'buy_order': {'XX': 1}}),  # unknown hotel
+                ('buy_order', {'buy_order': {'NO_HOTEL': 1}}),
+                ('liquidation', {'sell': True, 'twofer': 0}),
+                ('liquidation', {'sell': 1}),
+                ('liquidation', {'sell': '1', 'twofer': 0})]:
+            with self.subTest(input_type=input_type, move=move):
+                self.assertIsNotNone(self.check(input_type, move, (Hotel.CONTI, Hotel.TOBER)))
+
+    def test_out_of_range_tiles_and_hotels(self):
+        for move in [{'tile': 'Z9'}, {'tile': 'A0'}, {'tile': 'C3'}]:  # unknown, placed, not held
+            with self.subTest(move=move):
+                self.assertIsNotNone(self.check('tile', move))
+        for move in [{'hotel': 'XX'}, {'hotel': 'NO_HOTEL'}, {'hotel': 'LEXOR'}]:
+            with self.subTest(move=move):
+                self.assertIsNotNone(self.check('hotel', move, [Hotel.CONTI, Hotel.TOBER]))
+
+    def test_negative_and_excessive_quantities(self):
+        self.assertIsNotNone(self.check('buy_order', {'buy_order': {'CONTI': -1}}))
+        self.assertIsNotNone(self.check('buy_order', {'buy_order': {'CONTI': 2, 'TOBER': 2}}))
+        self.assertIsNotNone(self.check('buy_order', {'buy_order': {'LEXOR': 1}}))  # not on board
+        liquidation = (Hotel.CONTI, Hotel.TOBER)
+        for sell, twofer in [(-1, 0), (0, -2), (3, 2)]:
+            with self.subTest(sell=sell, twofer=twofer):
+                self.assertIsNotNone(self.check(
+                    'liquidation', {'sell': sell, 'twofer': twofer}, liquidation))
+
+    def test_bank_refuses_negative_liquidations(self):
+        # The check behind validate_move's fast path
+        result = self.game.bank.liquidate_shares(
+            self.player, Hotel.CONTI, 2, -1, 0, Hotel.TOBER)
+        self.assertFalse(result.success)
+        self.assertEqual(self.player.property[Hotel.CONTI.value], 4)
+
+
+# To run: python -m acquisitions.game_logic.test from top level dir
+if __name__ == "__main__":
+    unittest.main()
@@ -1,20 +1,49 @@
+from typing import Tuple
+
 from acquisitions.game_logic.constants import *
 
 class Tile:
-    def __init__(self, row: int, col: int):
-        """
-        Initializes a Tile object. Client is responsible for calling is_valid.
-        """
-        self.row = row
-        self.col = col
+    """
+    An immutable board coordinate. Tiles on the board are interned: there is
+    exactly one Tile instance per cell, built at import time, and Tile(r, c)
+    returns that instance. Out-of-range coordinates produce a fresh Tile that
+    is not valid. Client is responsible for calling is_valid.
+    """
+    __slots__ = ("row", "col", "index")
+
+    def __new__(cls, row: int, col: int):
+        if 0 <= row < NUM_ROWS and 0 <= col < NUM_COLS:
+            return TILES[row * NUM_COLS + col]
+        return cls._make(row, col, -1)
+
+    @classmethod
+    def _make(cls, row: int, col: int, index: int):
+        tile = object.__new__(cls)
+        object.__setattr__(tile, "row", row)
+        object.__setattr__(tile, "col", col)
+        object.__setattr__(tile, "index", index)
+        return tile
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Tile is immutable")
+
+    def __reduce__(self):
+        return (Tile, (self.row, self.col))
 
     def __eq__(self, other):
+        if self is other:
+            return True
+        if not isinstance(other, Tile):
+            return NotImplemented
         return self.row == other.row and self.col == other.col
-        
+
+    def __hash__(self):
+        return self.row * NUM_COLS + self.col
+
     def __repr__(self):
         row_char = chr(self.row + ord('A'))
         return f"{row_char}{self.col}"
-    
+
     def __str__(self):
         row_char = chr(self.row + ord('A'))
         return f"{row_char}{self.col}"
@@ -22,20 +51,39 @@ class Tile:
     @classmethod
     def from_str(cls, s: str):
         """
-        Initializes a Tile from a 2-character string, e.g. A4, B7, etc.
-        Ensures that the input string is exactly 2 characters long and that 
-        both characters are valid (row as a letter, column as a digit).
+        Initializes a Tile from a 2-3 character string, e.g. A4, B7, C11, etc.
+        Ensures that the input string is 2 or 3 characters long and that
+        both parts are valid (row as a letter, column as digits).
         """
+        tile = TILES_BY_STR.get(s)
+        if tile is not None:
+            return tile
         if len(s) == 2 or len(s) == 3:
             r = s[0]
             c = s[1:]
             if r.isalpha() and c[0].isdigit() and c[-1].isdigit():
-                print("Input okay")
                 row = ord(r.upper()) - ord('A')
                 col = int(c)
                 return cls(row, col)
         return Tile(-1, -1)
 
     def is_valid(self):
-        return 0 <= self.row < NUM_ROWS and 0 <= self.col < NUM_COLS
-    
\ No newline at end of file
+        return self.index >= 0
+
+
+def _neighbor_indices(idx: int) -> Tuple[int, ...]:
+    r, c = divmod(idx, NUM_COLS)
+    dirs = [(0, 1), (0, -1), (-1, 0), (1, 0)]
+    return tuple(
+        (r + dr) * NUM_COLS + (c + dc) for (dr, dc) in dirs
+        if 0 <= r + dr < NUM_ROWS and 0 <= c + dc < NUM_COLS
+    )
+
+NUM_CELLS = NUM_ROWS * NUM_COLS
+
+# TILES[i] is the interned Tile for flat index i = row * NUM_COLS + col.
+TILES = tuple(Tile._make(i // NUM_COLS, i % NUM_COLS, i) for i in range(NUM_CELLS))
+TILES_BY_STR = {str(tile): tile for tile in TILES}
+
+# NEIGHBOR_INDICES[i] holds the flat indices of the cells adjacent to cell i.
+NEIGHBOR_INDICES = tuple(_neighbor_indices(i) for i in range(NUM_CELLS))
@@ -0,0 +1,94 @@
+import random
+from collections import OrderedDict
+from typing import Optional
+
+from acquisitions.game_logic.constants import *
+from acquisitions.game_logic.tile import *
+
+# Zobrist hashing of game positions: every feature of a position (a cell
+# being occupied, the chain of a hotel, a count of shares held) has a random
+# 64-bit key, and a position hashes to the XOR of the keys of its features,
+# so each move updates the hash in O(1) by XORing out the features it
+# removes and XORing in the ones it adds. The keys come from a fixed seed,
+# so hashes agree across processes and runs.
+#
+# The board's hash (BoardState.zobrist) covers which cells are occupied or
+# dead and, for each hotel, the lowest cell of its chain, which together fix
+# every chain and hence every hotel size. Each player's hash
+# (PlayerState.zobrist) covers their share counts; the bank's counts are
+# implied, since every share is either in the bank or held. position_key()
+# combines them with the parts of a position that change too often to be
+# worth hashing incrementally.
+
+MASK64 = (1 << 64) - 1
+
+_rng = random.Random(0x5EED_AC0)
+
+
+def _keys(n: int) -> tuple:
+    return tuple(_rng.getrandbits(64) for _ in range(n))
+
+
+OCCUPIED_KEYS = _keys(NUM_CELLS)  # cell i occupied
+DEAD_KEYS = _keys(NUM_CELLS)  # cell i occupied by a dead tile
+# HOTEL_KEYS[h][i]: hotel h's chain has i as its lowest cell
+HOTEL_KEYS = tuple(_keys(NUM_CELLS) for _ in range(NUM_HOTELS))
+# SHARE_KEYS[h][n]: n shares of hotel h held
+SHARE_KEYS = tuple(_keys(TOTAL_SHARES + 1) for _ in range(NUM_HOTELS))
+POOL_KEYS = _keys(NUM_CELLS + 1)  # tiles left in the pool
+HAND_KEYS = _keys(NUM_CELLS + 1)  # tiles in a player's hand
+MONEY_KEY = _rng.getrandbits(64) | 1
+SEAT_ROTATION = 11  # bits each seat's player hash is rotated by
+
+
+def holdings_key(property) -> int:
+    """The Zobrist hash of a player's share counts, from scratch."""
+    key = 0
+    for hotel, shares in enumerate(property):
+        key ^= SHARE_KEYS[hotel][shares]
+    return key
+
+
+def position_key(board_state, bank, players) -> int:
+    """
+    64-bit hash of the public position: the board, everyone's shares, money
+    and hand size, and the size of the tile pool. It does not cover which
+    tiles are where, nor whose turn it is.
+    """
+    key = board_state.zobrist ^ POOL_KEYS[len(bank.tiles)]
+    for seat, player in enumerate(players):
+        h = (player.zobrist + player.money * MONEY_KEY) & MASK64
+        h ^= HAND_KEYS[len(player.tiles)]
+        r = seat * SEAT_ROTATION % 64
+        key ^= ((h << r) | (h >> (64 - r))) & MASK64 if r else h
+    return key
+
+
+class TranspositionTable:
+    """
+    Bounded map from position keys to search entries (e.g. evaluations), so
+    that a search reaching a position again, by whatever order of moves,
+    finds what it already learned there. Once full, the least recently used
+    entry is evicted.
+    """
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.entries: "OrderedDict[int, object]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, key: int) -> bool:
+        return key in self.entries
+
+    def get(self, key: int) -> Optional[object]:
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+        return entry
+
+    def put(self, key: int, entry):
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
@@ -0,0 +1,269 @@
+import asyncio
+import json
+import logging
+import os
+from typing import Optional
+from urllib.parse import parse_qs
+
+import jinja2
+import socketio
+
+from acquisitions.game_logic.metrics import PROMETHEUS_CONTENT_TYPE
+from acquisitions.server.game_host import (
+    ADMIN_TOKEN_HEADER, MAX_HISTORY_PAGE, GameHost, parse_sample_rate, profiling_options)
+from acquisitions.server.sharding import BusManager, Shard
+
+# Asyncio-native server: an ASGI app in which python-socketio's AsyncServer,
+# the HTTP pages and every game's play() coroutine share one event loop, so
+# input reaches a game's WebUI queue without crossing threads.
+# To run (needs an ASGI server such as uvicorn):
+#   uvicorn --factory acquisitions.server.async_server:create_app
+
+# Per-game paths, which sharded workers redirect to the game's owner
+GAME_PATHS = ('/join_game/', '/history/', '/profile/')
+
+
+class AsyncEmitter:
+    """
+    Lets WebUI and RoomChannel, which emit synchronously, send through an
+    AsyncServer. Emits are queued and sent in order by a single task.
+    """
+    def __init__(self, sio: socketio.AsyncServer):
+        self.sio = sio
+        self.outbox = asyncio.Queue()
+        self.task = None
+
+    def emit(self, event, data, room=None):
+        self.outbox.put_nowait((event, data, room))
+        if self.task is None or self.task.done():
+            self.task = asyncio.get_running_loop().create_task(self.drain())
+
+    async def drain(self):
+        while not self.outbox.empty():
+            event, data, room = self.outbox.get_nowait()
+            try:
+                await self.sio.emit(event, data, room=room)
+            except Exception:
+                logging.exception("Failed to emit %s to %s", event, room)
+
+
+class AsyncGameServer(GameHost):
+    """
+    Front end for an ASGI server. Socket handlers and games run on the ASGI
+    server's loop; self.app is the ASGI application. With a Shard, this is
+    one worker of a sharded deployment (see sharding.py): it hosts only the
+    games it owns and forwards socket events for other games to their owners.
+    """
+    def __init__(self, db_path='acquisitions.db', max_live_games=1000,
+                 event_log_dir='game_logs', store=None, shard: Shard = None,
+                 lifecycle_policy=None, metrics=True, metrics_emit_sizes=False,
+                 profile_dir=None, profile_sample_rate=0.0, admin_token=None):
+        self.shard = shard
+        self.sio = socketio.AsyncServer(
+            async_mode='asgi',
+            client_manager=BusManager(shard.bus) if shard else None)
+        super().__init__(
+            AsyncEmitter(self.sio), db_path=db_path,
+            max_live_games=max_live_games, event_log_dir=event_log_dir,
+            store=store, lifecycle_policy=lifecycle_policy, metrics=metrics,
+            metrics_emit_sizes=metrics_emit_sizes, profile_dir=profile_dir, profile_sample_rate=profile_sample_rate,
+            admin_token=admin_token)
+        template_dir = os.path.abspath(
+            os.path.join(os.path.dirname(__file__), '..', 'ui', 'templates'))
+        self.templates = jinja2.Environment(
+            loader=jinja2.FileSystemLoader(template_dir), autoescape=True)
+        self.templates.globals['url_for'] = lambda endpoint: f"/{endpoint}"
+        self.app = socketio.ASGIApp(
+            self.sio, other_asgi_app=self.http_app, on_startup=self.startup)
+        self.setup_handlers()
+
+    async def startup(self):
+        self.sio.start_background_task(self.lifecycle.run)
+        if self.shard:
+            self.sio.start_background_task(self.receive_forwarded)
+
+    def setup_handlers(self):
+        @self.sio.on('join')
+        async def on_join(sid, data):
+            logging.debug("Join event received: %s", data)
+            await self.sio.enter_room(sid, data['game_id'])
+            await self.dispatch('join', sid, data)
+
+        @self.sio.on('make_move')
+        async def on_move(sid, data):
+            await self.dispatch('make_move', sid, data)
+
+        @self.sio.on('resync')
+        async def on_resync(sid, data):
+            """Sent by clients that detect a gap in the update sequence."""
+            await self.dispatch('resync', sid, data)
+
+    async def dispatch(self, event, sid, data):
+        """Applies a socket event here, or forwards it to the game's owner."""
+        if self.shard and not self.shard.owns(data['game_id']):
+            await self.shard.forward(data['game_id'], event, sid, data)
+        elif event == 'join':
+            self.join(data['game_id'], data['player'], sid, data.get('token'))
+        elif event == 'make_move':
+            self.move(data['game_id'], data['move'], sid)
+        elif event == 'resync':
+            self.resync(data['game_id'], sid)
+
+    async def receive_forwarded(self):
+        async for message in self.shard.bus.subscribe(self.shard.channel):
+            try:
+                await self.dispatch(message['event'], message['sid'], message['data'])
+            except Exception:
+                logging.exception("Failed to apply forwarded %s", message['event'])
+
+    def new_game_id(self) -> str:
+        return self.shard.new_game_id() if self.shard else super().new_game_id()
+
+    async def http_app(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return
+        headers = [(b'content-type', b'text/html; charset=utf-8')]
+        redirect = self.owner_url(scope)
+        if redirect:
+            status, body = 307, ""
+            headers.append((b'location', redirect.encode('utf-8')))
+        else:
+            status, body = self.route(scope)
+        if isinstance(body, dict):
+            body = json.dumps(body)
+            headers = [(b'content-type', b'application/json')]
+        elif scope['path'] == '/metrics' and status == 200:
+            headers = [(b'content-type', PROMETHEUS_CONTENT_TYPE.encode('latin-1'))]
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': headers,
+        })
+        await send({'type': 'http.response.body', 'body': body.encode('utf-8')})
+
+    def route(self, scope):
+        path = scope['path']
+        if path == '/':
+            return 200, self.render('lobby.html')
+        if path == '/create_game':
+            query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+            try:
+                num_bots = int(query['bots'][0]) if 'bots' in query else 0
+            except ValueError:
+                return 400, "Bad request"
+            game_id = self.create_game(num_bots)
+            if game_id is None:
+                return 503, "Server is full, try again later"
+            join_url = f"{host_url(scope)}join_game/{game_id}"
+            return 200, self.render(
+                'game_created.html', game_id=game_id, join_url=join_url)
+        if path.startswith('/join_game/'):
+            game_id = path[len('/join_game/'):]
+            if self.shard and not self.shard.owns(game_id):
+                return 404, f"Game {game_id} is hosted by worker {self.shard.owner(game_id)}"
+            player_name = self.new_player_name(game_id)
+            if player_name is None:
+                return 404, "error"  # TODO
+            return 200, self.render(
+                'game.html', game_id=game_id, player_name=player_name)
+        if path.startswith('/history/'):
+            game_id = path[len('/history/'):]
+            if self.shard and not self.shard.owns(game_id):
+                return 404, f"Game {game_id} is hosted by worker {self.shard.owner(game_id)}"
+            query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+            try:
+                before = int(query['before'][0]) if 'before' in query else None
+                limit = int(query['limit'][0]) if 'limit' in query else MAX_HISTORY_PAGE
+            except ValueError:
+                return 400, "Bad request"
+            page = self.history(game_id, query.get('player', [None])[0], before, limit)
+            if page is None:
+                return 404, "error"
+            return 200, page
+        if path == '/stats':
+            return 200, self.stats()
+        if path == '/metrics':
+            query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+            text = self.metrics_text(query.get('game_id', [None])[0])
+            if text is None:
+                return 404, "error"
+            return 200, text
+        if path == '/profile' or path.startswith('/profile/'):
+            if scope.get('method') != 'POST':
+                return 405, "Method not allowed"
+            if not self.is_admin(client_address(scope), header(scope, ADMIN_TOKEN_HEADER)):
+                return 403, "Forbidden"
+        if path == '/profile':
+            query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+            try:
+                rate = parse_sample_rate(query['sample_rate'][0]) if 'sample_rate' in query else None
+            except ValueError:
+                return 400, "Bad request"
+            sampling = self.profile_sampling(rate)
+            if sampling is None:
+                return 404, "error"
+            return 200, sampling
+        if path.startswith('/profile/'):
+            game_id = path[len('/profile/'):]
+            if self.shard and not self.shard.owns(game_id):
+                return 404, f"Game {game_id} is hosted by worker {self.shard.owner(game_id)}"
+            query = parse_qs(scope.get('query_string', b'').decode('latin-1'),
+                             keep_blank_values=True)
+            enable = 'stop' not in query
+            files = self.profile_game(game_id, enable)
+            if files is None:
+                return 404, "error"
+            return 200, {'game_id': game_id, 'profiling': enable, 'files': files}
+        return 404, "Not found"
+
+    def owner_url(self, scope) -> str:
+        """URL of a game's page on its owning worker, if that is another worker."""
+        if not (self.shard and self.shard.worker_urls):
+            return None
+        path = scope['path']
+        prefix = next((p for p in GAME_PATHS if path.startswith(p)), None)
+        if prefix is None:
+            return None
+        owner = self.shard.owner(path[len(prefix):])
+        if owner == self.shard.worker_id:
+            return None
+        url = self.shard.worker_urls[owner].rstrip('/') + path
+        query = scope.get('query_string', b'').decode('latin-1')
+        return f"{url}?{query}" if query else url
+
+    def render(self, template, **context):
+        return self.templates.get_template(template).render(**context)
+
+
+def host_url(scope) -> str:
+    host = header(scope, 'host') or 'localhost'
+    return f"{scope.get('scheme', 'http')}://{host}/"
+
+
+def header(scope, name: str) -> Optional[str]:
+    """The value of a request header, if present."""
+    value = dict(scope.get('headers', [])).get(name.lower().encode('latin-1'))
+    return value.decode('latin-1') if value is not None else None
+
+
+def client_address(scope) -> Optional[str]:
+    client = scope.get('client')
+    return client[0] if client else None
+
+
+def create_app():
+    return AsyncGameServer(**profiling_options()).app
+
+
+def main():
+    try:
+        import uvicorn
+    except ImportError:
+        raise SystemExit("The asyncio server needs an ASGI server: pip install uvicorn")
+    print("Starting Acquisitions game server (asyncio)...")
+    print("Open http://127.0.0.1:5000 in your web browser to create or join a game.")
+    uvicorn.run(create_app(), host="127.0.0.1", port=5000)
+
+# To run: python -m acquisitions.server.async_server from top level dir
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+import argparse
+import asyncio
+import multiprocessing
+import os
+import tempfile
+
+from acquisitions.server.async_server import AsyncGameServer
+from acquisitions.server.sharding import BusHub, LocalSocketBus, Shard
+
+# Runs a sharded deployment on one host: a BusHub in this process and one
+# asyncio server process per worker, worker k listening on port + k. Put any
+# load balancer in front of the workers for the lobby; game pages redirect
+# to the game's owning worker, and socket events that reach another worker
+# are forwarded to the owner.
+
+
+def run_worker(worker_id: int, worker_urls, bus_path: str, host: str,
+               port: int, db_path: str):
+    import uvicorn
+    shard = Shard(worker_id, len(worker_urls), LocalSocketBus(bus_path), worker_urls)
+    server = AsyncGameServer(
+        db_path=db_path,
+        event_log_dir=os.path.join('game_logs', f"worker{worker_id}"),
+        shard=shard)
+    uvicorn.run(server.app, host=host, port=port, log_level="warning")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a sharded Acquisitions server.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--db", default="acquisitions.db")
+    args = parser.parse_args()
+    try:
+        import uvicorn
+    except ImportError:
+        raise SystemExit("The sharded server needs an ASGI server: pip install uvicorn")
+
+    bus_path = os.path.join(tempfile.mkdtemp(), "bus.sock")
+    worker_urls = [
+        f"http://{args.host}:{args.port + k}" for k in range(args.workers)]
+
+    async def serve():
+        hub = asyncio.ensure_future(BusHub(bus_path).serve())
+        while not os.path.exists(bus_path):
+            await asyncio.sleep(0.01)
+        workers = [
+            multiprocessing.Process(
+                target=run_worker,
+                args=(k, worker_urls, bus_path, args.host, args.port + k, args.db),
+                daemon=True)
+            for k in range(args.workers)
+        ]
+        for worker in workers:
+            worker.start()
+        print(f"Started {args.workers} workers: {', '.join(worker_urls)}")
+        await hub
+
+    asyncio.run(serve())
+
+# To run: python -m acquisitions.server.cluster from top level dir
+if __name__ == "__main__":
+    main()
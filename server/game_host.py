@@ -0,0 +1,424 @@
+import asyncio
+import logging
+import math
+import os
+import secrets
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional
+
+from acquisitions.game_logic.event_log import EventLog
+from acquisitions.game_logic.game_orchestrator import GameOrchestrator
+from acquisitions.game_logic.input_validation import validate_move
+from acquisitions.game_logic.metrics import Metrics
+from acquisitions.game_logic.player import Seat
+from acquisitions.game_logic.snapshot import restore_game
+from acquisitions.server.lifecycle import LifecycleManager, LifecyclePolicy
+from acquisitions.server.persistence import (
+    GameRegistry, GameStore, MessageArchive, SQLiteGameStore, SQLiteMessageArchive)
+from acquisitions.server.profiling import GameProfiler
+from acquisitions.ui.mcts_ui import MCTSPlayer
+from acquisitions.ui.message_history import MessageHistory
+from acquisitions.ui.web_ui import RoomChannel, WebUI
+
+ROOM_STREAM = 'room'
+MAX_HISTORY_PAGE = 200
+BOT_NAME_PREFIX = 'Bot'  # players seated by add_bot, e.g. Bot0; not for humans
+# Where create_app() writes game profiles, and the fraction of games it
+# profiles; unset, games are profiled only on request (see profile_game)
+PROFILE_DIR_ENV = "ACQUISITIONS_PROFILE_DIR"
+PROFILE_SAMPLE_RATE_ENV = "ACQUISITIONS_PROFILE_SAMPLE_RATE"
+# Admin endpoints (e.g. /profile) are POSTs, allowed with this token in the
+# ADMIN_TOKEN_HEADER if one is set, and otherwise only from this host
+ADMIN_TOKEN_ENV = "ACQUISITIONS_ADMIN_TOKEN"
+ADMIN_TOKEN_HEADER = "X-Admin-Token"
+LOCAL_ADDRESSES = ('127.0.0.1', '::1')
+
+
+def profiling_options() -> dict:
+    """GameHost profiling and admin arguments from the environment (see PROFILE_DIR_ENV)."""
+    return {
+        'profile_dir': os.environ.get(PROFILE_DIR_ENV),
+        'profile_sample_rate': parse_sample_rate(os.environ.get(PROFILE_SAMPLE_RATE_ENV, '0')),
+        'admin_token': os.environ.get(ADMIN_TOKEN_ENV),
+    }
+
+
+def parse_sample_rate(value: str) -> float:
+    """A profiling sample rate, clamped to [0, 1]; ValueError if not a number."""
+    rate = float(value)
+    if math.isnan(rate):
+        raise ValueError(f"Not a sample rate: {value}")
+    return min(max(rate, 0.0), 1.0)
+
+
+class GameHost:
+    """
+    Game bookkeeping shared by the server front ends: creating, restoring,
+    starting and stopping games, and applying socket events to them. A front
+    end supplies the Socket.IO emitter and says how to reach the loop the
+    games run on, by overriding call() and schedule().
+    """
+    def __init__(self, socketio, loop=None, db_path='acquisitions.db',
+                 max_live_games=1000, event_log_dir='game_logs',
+                 store: GameStore = None,
+                 lifecycle_policy: LifecyclePolicy = None,
+                 message_archive: MessageArchive = None,
+                 bot_time_budget: float = 1.0, bot_processes: int = 0,
+                 metrics: bool = True, metrics_emit_sizes: bool = False,
+                 profile_dir: Optional[str] = None,
+                 profile_sample_rate: float = 0.0, admin_token: Optional[str] = None):
+        self.socketio = socketio
+        # Loop the games run on, if it is not the caller's (see WebUI)
+        self.loop = loop
+        lifecycle_policy = lifecycle_policy or LifecyclePolicy(
+            max_live_games=max_live_games)
+        # live games, persisted to SQLite and restored on demand; idle games
+        # are reaped by the lifecycle manager
+        self.games = GameRegistry(
+            store or SQLiteGameStore(db_path), self.restore_game,
+            on_evict=self.stop_game,
+            max_live_games=lifecycle_policy.max_live_games,
+            max_idle_seconds=None)
+        self.lifecycle = LifecycleManager(self, lifecycle_policy)
+        # Messages older than each stream's in-memory tail; without one
+        # (e.g. with a custom store), old messages are dropped
+        self.message_archive = message_archive
+        if message_archive is None and store is None:
+            self.message_archive = SQLiteMessageArchive(db_path)
+        self.tasks = {}  # game_id -> future of the game's play() coroutine
+        self.event_log_dir = event_log_dir  # None disables event logging
+        # Computer players think for bot_time_budget seconds per decision,
+        # in bot_processes worker processes (0: in a thread)
+        self.bot_time_budget = bot_time_budget
+        self.bot_processes = bot_processes
+        self.bot_executors = None  # started with the first bot
+        # Each game records its own metrics (see metrics.py), which are
+        # folded into retired_metrics when it leaves memory
+        # (with metrics_emit_sizes, including the size of every emit)
+        self.metrics = metrics
+        self.metrics_emit_sizes = metrics_emit_sizes
+        self.retired_metrics = Metrics()
+        # Games can be profiled (see profiling.py) only with a directory to
+        # write profiles to; None disables profiling
+        self.profiler = None
+        if profile_dir:
+            self.profiler = GameProfiler(profile_dir, profile_sample_rate)
+        self.admin_token = admin_token
+
+    def call(self, fn, *args):
+        """Runs fn(*args) on the games' loop."""
+        fn(*args)
+
+    def schedule(self, coro):
+        """Starts coro on the games' loop, returning a cancellable future."""
+        return asyncio.ensure_future(coro)
+
+    def new_game_id(self) -> str:
+        return str(uuid.uuid4())[:8]  # Use first 8 characters for brevity
+
+    def create_game(self, num_bots: int = 0) -> Optional[str]:
+        """
+        Creates a game with num_bots of its seats taken by computer players
+        (at most all but one: every game needs a human), and returns its id,
+        or None if the server is full.
+        """
+        if not self.lifecycle.admit():
+            return None
+        game_id = self.new_game_id()
+        game_orchestrator = self.new_game(game_id)
+        self.games.add(game_id, game_orchestrator)
+        for _ in range(min(num_bots, len(game_orchestrator.uis) - 1)):
+            self.add_bot(game_id, game_orchestrator)
+        return game_id
+
+    def add_bot(self, game_id, game_orchestrator):
+        """Seats a computer player in the next free seat of a game."""
+        seat = len(game_orchestrator.players)
+        game_orchestrator.uis[seat] = self.new_bot_ui(game_orchestrator)
+        game_orchestrator.add_player(f"{BOT_NAME_PREFIX}{seat}", Seat(bot=True))
+        self.games.save(game_id, game_orchestrator)
+        if game_orchestrator.is_ready():
+            self.start_game(game_id, game_orchestrator)
+
+    def join(self, game_id, player, sid, token=None):
+        """
+        Seats player in the game, sending their socket a 'joined' event with
+        the seat's reconnect token; or, given the token of a seat (e.g. after
+        a server restart), rebinds that seat to the socket. Only unfinished
+        games are restored for this.
+        """
+        summary = self.games.summary(game_id)
+        if summary is None:
+            return self.reject_join(sid, "No such game")
+        if summary.finished:
+            return self.reject_join(sid, "The game is over")
+        game_orchestrator = self.games.get(game_id)
+        if token:
+            for seat, ui in zip(game_orchestrator.seats, game_orchestrator.uis):
+                if seat.token == token and isinstance(ui, WebUI):
+                    self.call(ui.bind, sid)
+                    return
+            return self.reject_join(sid, "Unknown reconnect token")
+        names = [p.name for p in game_orchestrator.players]
+        if game_orchestrator.started or len(names) >= len(game_orchestrator.uis):
+            return self.reject_join(sid, "The game is full")
+        if (not isinstance(player, str) or player in names
+                or player.startswith(BOT_NAME_PREFIX)):
+            return self.reject_join(sid, f"The name {player} is not available")
+        logging.debug("Adding %s to game %s ...", player, game_id)
+        seat = Seat(token=secrets.token_urlsafe(16))
+        game_orchestrator.add_player(player, seat)
+        self.socketio.emit('joined', {'player': player, 'token': seat.token}, room=sid)
+        self.call(game_orchestrator.uis[len(names)].bind, sid)
+        self.games.save(game_id, game_orchestrator)
+        logging.debug("Added player %s to game %s!", player, game_id)
+        if game_orchestrator.is_ready():
+            logging.debug("Game %s is ready to start", game_id)
+            self.start_game(game_id, game_orchestrator)
+
+    def new_player_name(self, game_id) -> Optional[str]:
+        """
+        The name the join page offers a newcomer, or None if the game is
+        unknown or finished. The game is not restored for this.
+        """
+        summary = self.games.summary(game_id)
+        if summary is None or summary.finished:
+            return None
+        return f"Player{len(summary.player_names)}"
+
+    def reject_join(self, sid, reason):
+        self.socketio.emit('join_rejected', {'reason': reason}, room=sid)
+
+    def move(self, game_id, move, sid=None):
+        """
+        Passes a player's move to the game, unless it is malformed, illegal,
+        stale or (if sent from socket sid) not from the player whose input
+        is awaited: those are refused here, with an 'input_rejected' event
+        to the sender, without waking the game. So are moves for games that
+        are not live, which are not restored for them. An accepted move
+        counts as activity of the game (see LifecyclePolicy).
+        """
+        game_orchestrator = self.games.peek(game_id)
+        if game_orchestrator is None:
+            if sid is not None:
+                self.socketio.emit('input_rejected', {
+                    'reason': "This game is not running; rejoin it to play",
+                    'prompt': None}, room=sid)
+            return
+        reason = self.check_sender(game_orchestrator, sid) or validate_move(
+            game_orchestrator, move)
+        if reason:
+            game_orchestrator.metrics.inc('rejected_inputs')
+            if sid is not None:
+                self.reject_move(game_orchestrator, sid, reason)
+            return
+        self.games.touch(game_id, game_orchestrator)
+        game_orchestrator.receive_input(move)
+
+    def check_sender(self, game_orchestrator, sid) -> Optional[str]:
+        """Why socket sid may not answer the game's pending prompt, if it may not."""
+        if sid is None:
+            return None
+        pending_input = game_orchestrator.pending_input
+        ui = game_orchestrator.uis[pending_input[0]] if pending_input else None
+        if not isinstance(ui, WebUI) or ui.sid != sid:
+            return "It is not your turn"
+        if ui.prompt is None:
+            return "Your move was already received"
+        return None
+
+    def reject_move(self, game_orchestrator, sid, reason):
+        # The sender's prompt goes back with the reason, so the client can
+        # ask again; it is not part of the player's numbered stream
+        prompt = None
+        for ui in game_orchestrator.uis:
+            if isinstance(ui, WebUI) and ui.sid == sid:
+                prompt = ui.prompt
+        self.socketio.emit('input_rejected', {'reason': reason, 'prompt': prompt}, room=sid)
+
+    def resync(self, game_id, sid):
+        """Resends full snapshots to a client that missed updates (of a live game)."""
+        game_orchestrator = self.games.peek(game_id)
+        if game_orchestrator is None:
+            return
+        self.games.touch(game_id, game_orchestrator)
+        for ui in game_orchestrator.uis:
+            if isinstance(ui, WebUI) and ui.sid == sid:
+                self.call(ui.send_snapshot)
+
+    def history(self, game_id, player=None, before=None, limit=MAX_HISTORY_PAGE):
+        """
+        A page of a game's public messages, or of one player's private
+        messages, ending just before message number `before`. Games that
+        are not live are read from the message archive, not restored.
+        """
+        game_orchestrator = self.games.peek(game_id)
+        if game_orchestrator is None:
+            history = self.archived_history(game_id, player)
+        elif player is None:
+            history = game_orchestrator.room.message_history
+        else:
+            names = [p.name for p in game_orchestrator.players]
+            ui = game_orchestrator.uis[names.index(player)] if player in names else None
+            history = ui.message_history if isinstance(ui, WebUI) else None
+        if history is None:
+            return None
+        first, messages = history.page(before, min(limit, MAX_HISTORY_PAGE))
+        return {'first': first, 'count': len(history), 'messages': messages}
+
+    def archived_history(self, game_id, player=None) -> Optional[MessageHistory]:
+        """The archived history of a stored game's room, or of a human player."""
+        summary = self.games.summary(game_id)
+        if summary is None or self.message_archive is None:
+            return None
+        if player is None:
+            return self.new_history(game_id, ROOM_STREAM)
+        if player not in summary.player_names:
+            return None
+        seat = summary.player_names.index(player)
+        if summary.seats[seat].bot:
+            return None
+        return self.new_history(game_id, f"player{seat}")
+
+    def new_history(self, game_id, stream):
+        return MessageHistory(self.message_archive, game_id, stream)
+
+    def new_web_ui(self, game_id, room, seat):
+        ui = WebUI(game_id, self.socketio, self.loop, room,
+                   self.new_history(game_id, f"player{seat}"))
+        ui.metrics = room.metrics
+        return ui
+
+    def new_bot_ui(self, game_orchestrator):
+        if self.bot_executors is None and self.bot_processes:
+            # Single-process pools, so each worker keeps its own search trees
+            self.bot_executors = [
+                ProcessPoolExecutor(max_workers=1) for _ in range(self.bot_processes)]
+        return MCTSPlayer(game_orchestrator, self.bot_time_budget, self.bot_executors)
+
+    def new_game(self, game_id, num_uis=2):
+        room = RoomChannel(
+            game_id, self.socketio, self.new_history(game_id, ROOM_STREAM))
+        if self.metrics:
+            room.metrics = Metrics(self.metrics_emit_sizes)
+        game_orchestrator = GameOrchestrator(
+            [self.new_web_ui(game_id, room, seat) for seat in range(num_uis)])
+        game_orchestrator.room = room
+        game_orchestrator.metrics = room.metrics
+        game_orchestrator.on_turn_end = lambda game: self.games.save(game_id, game)
+        if self.event_log_dir:
+            os.makedirs(self.event_log_dir, exist_ok=True)
+            game_orchestrator.event_log = EventLog.open(self.event_log_path(game_id))
+        return game_orchestrator
+
+    def event_log_path(self, game_id) -> str:
+        return os.path.join(self.event_log_dir, f"{game_id}.log")
+
+    def restore_game(self, game_id, snapshot):
+        """Rebuilds a game evicted from memory (or lost to a restart)."""
+        game_orchestrator = restore_game(snapshot, self.new_game(game_id))
+        while len(game_orchestrator.uis) < len(game_orchestrator.players):
+            game_orchestrator.uis.append(self.new_web_ui(
+                game_id, game_orchestrator.room, len(game_orchestrator.uis)))
+        for seat, seat_info in enumerate(game_orchestrator.seats):
+            if seat_info.bot:
+                game_orchestrator.uis[seat] = self.new_bot_ui(game_orchestrator)
+        # Games snapshotted between seating their players and finishing their
+        # first turn are not marked started yet, but were running
+        if game_orchestrator.is_ready() and not game_orchestrator.finished:
+            self.start_game(game_id, game_orchestrator)
+        return game_orchestrator
+
+    def start_game(self, game_id, game_orchestrator):
+        if game_id in self.tasks and not self.tasks[game_id].done():
+            return
+        logging.debug("Starting game orchestrator for game %s", game_id)
+        if self.profiler and self.profiler.sampled():
+            self.profiler.start(game_id, game_orchestrator)
+        self.tasks[game_id] = self.schedule(self.run_game(game_id, game_orchestrator))
+
+    def stop_game(self, game_id, game_orchestrator):
+        """Called when a game is evicted from memory."""
+        task = self.tasks.pop(game_id, None)
+        if task is not None:
+            task.cancel()
+        if game_orchestrator.event_log:
+            game_orchestrator.event_log.close()
+        if game_orchestrator.metrics.enabled:
+            self.retired_metrics.merge(game_orchestrator.metrics)
+        if self.profiler:
+            self.profiler.stop(game_id, game_orchestrator)
+        if self.message_archive:
+            game_orchestrator.room.message_history.flush()
+            for ui in game_orchestrator.uis:
+                if isinstance(ui, WebUI):
+                    ui.message_history.flush()
+
+    def stats(self) -> dict:
+        """The lifecycle manager's counts of games (see LifecycleManager.counts)."""
+        return self.lifecycle.counts()
+
+    def metrics_text(self, game_id=None) -> Optional[str]:
+        """
+        Metrics in the Prometheus text format: of every game this process
+        has hosted, with server gauges, or of one live game (None if it is
+        not in memory).
+        """
+        live = {g_id: game for g_id, game, _ in self.lifecycle.live_games()}
+        if game_id is not None:
+            game_orchestrator = live.get(game_id)
+            if game_orchestrator is None:
+                return None
+            return game_orchestrator.metrics.prometheus()
+        metrics = Metrics()
+        metrics.merge(self.retired_metrics)
+        for game_orchestrator in live.values():
+            metrics.merge(game_orchestrator.metrics)
+        counts = self.lifecycle.counts()
+        return metrics.prometheus({
+            name: counts[name] for name in
+            ('live_games', 'play_tasks', 'max_live_games', 'rejected_games', 'rss_bytes')})
+
+    def is_admin(self, remote_addr: Optional[str], token: Optional[str]) -> bool:
+        """Whether a request may use the admin endpoints (see ADMIN_TOKEN_ENV)."""
+        if self.admin_token:
+            return bool(token) and secrets.compare_digest(token, self.admin_token)
+        return remote_addr in LOCAL_ADDRESSES
+
+    def profile_game(self, game_id, enable=True) -> Optional[List[str]]:
+        """
+        Starts (or with enable=False, stops) profiling a live game. Returns
+        None if profiling is off or the game is not in memory; on stopping,
+        the paths of the profile's files.
+        """
+        if self.profiler is None:
+            return None
+        game_orchestrator = self.games.peek(game_id)
+        if game_orchestrator is None:
+            return None
+        if enable:
+            self.profiler.start(game_id, game_orchestrator)
+            return []
+        return self.profiler.stop(game_id, game_orchestrator) or []
+
+    def profile_sampling(self, sample_rate: Optional[float] = None) -> Optional[dict]:
+        """
+        Sets the fraction of newly started games that are profiled, if given,
+        and returns it with the ids of the games being profiled; None if
+        profiling is off.
+        """
+        if self.profiler is None:
+            return None
+        if sample_rate is not None:
+            self.profiler.sample_rate = min(max(sample_rate, 0.0), 1.0)
+        return {'sample_rate': self.profiler.sample_rate,
+                'profiling': list(self.profiler.profiles)}
+
+    async def run_game(self, game_id, game_orchestrator):
+        logging.debug("Running game orchestrator for game %s", game_id)
+        logging.debug("Starting play coroutine")
+        await game_orchestrator.play()
+        logging.debug("Finished play coroutine")
+        if self.profiler:
+            self.profiler.stop(game_id, game_orchestrator)
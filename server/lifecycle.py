@@ -0,0 +1,166 @@
+import asyncio
+import logging
+import os
+import time
+from enum import Enum
+from typing import Dict, List, Optional
+
+from acquisitions.game_logic.game_orchestrator import GameOrchestrator
+
+
+class GamePhase(Enum):
+    LOBBY = 'lobby'
+    RUNNING = 'running'
+    AWAITING_INPUT = 'awaiting_input'
+    FINISHED = 'finished'
+
+
+def game_phase(game: GameOrchestrator) -> GamePhase:
+    if game.finished:
+        return GamePhase.FINISHED
+    if not game.started:
+        return GamePhase.LOBBY
+    if game.pending_input:
+        return GamePhase.AWAITING_INPUT
+    return GamePhase.RUNNING
+
+
+def read_rss() -> Optional[int]:
+    """Resident set size of this process in bytes, where /proc is available."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class LifecyclePolicy:
+    """
+    Limits enforced by a LifecycleManager. TTLs are seconds since a game's
+    last activity (a client event or a completed turn); None disables one.
+    """
+    def __init__(
+            self,
+            lobby_ttl: Optional[float] = 30 * 60,
+            running_ttl: Optional[float] = 5 * 60,
+            awaiting_input_ttl: Optional[float] = 60 * 60,
+            max_live_games: int = 1000,
+            max_rss_bytes: Optional[int] = None,
+            pressure_idle_seconds: float = 60,
+            reap_interval: float = 30):
+        self.ttls = {
+            GamePhase.LOBBY: lobby_ttl,
+            # A game that is neither waiting on a player nor finishing turns
+            # has a stalled play() task.
+            GamePhase.RUNNING: running_ttl,
+            GamePhase.AWAITING_INPUT: awaiting_input_ttl,
+            GamePhase.FINISHED: 0,
+        }
+        self.max_live_games = max_live_games
+        # Under memory pressure, games idle for this long are evicted first
+        self.max_rss_bytes = max_rss_bytes
+        self.pressure_idle_seconds = pressure_idle_seconds
+        self.reap_interval = reap_interval
+
+
+class LifecycleManager:
+    """
+    Tracks the phase and last activity of a GameHost's live games, reaps
+    games past their phase's TTL, and admits new games only under the
+    policy's caps on live games and process memory.
+
+    Reaping evicts a game from memory, which cancels its play() task. Games
+    that have started keep their last snapshot and are restored if a player
+    comes back; abandoned lobbies are deleted from the store, along with
+    their messages and event logs.
+    """
+    def __init__(self, host, policy: LifecyclePolicy = None):
+        self.host = host
+        self.policy = policy or LifecyclePolicy()
+        self.reaped: Dict[GamePhase, int] = {phase: 0 for phase in GamePhase}
+        self.rejected = 0
+
+    def live_games(self):
+        registry = self.host.games
+        with registry.lock:
+            return [
+                (game_id, game, registry.last_access[game_id])
+                for game_id, game in registry.live.items()
+            ]
+
+    def reap(self, now: float = None) -> List[str]:
+        """Reaps games past their TTL, then idle games under memory pressure."""
+        now = time.monotonic() if now is None else now
+        reaped = []
+        for game_id, game, last_access in self.live_games():
+            phase = game_phase(game)
+            ttl = self.policy.ttls[phase]
+            if ttl is not None and now - last_access > ttl:
+                self.reap_game(game_id, phase)
+                reaped.append(game_id)
+        if self.memory_pressure():
+            for game_id, game, last_access in self.live_games():
+                if not self.memory_pressure():
+                    break
+                if now - last_access > self.policy.pressure_idle_seconds:
+                    self.reap_game(game_id, game_phase(game))
+                    reaped.append(game_id)
+        return reaped
+
+    def reap_game(self, game_id: str, phase: GamePhase):
+        logging.info("Reaping %s game %s", phase.value, game_id)
+        self.host.games.evict(game_id)
+        if phase == GamePhase.LOBBY:
+            self.host.games.store.delete(game_id)
+            if self.host.message_archive:
+                self.host.message_archive.delete(game_id)
+            # Eviction closed the game's event log; a game that never started
+            # leaves nothing worth replaying in it
+            if self.host.event_log_dir:
+                try:
+                    os.remove(self.host.event_log_path(game_id))
+                except FileNotFoundError:
+                    pass
+        self.reaped[phase] += 1
+
+    def memory_pressure(self) -> bool:
+        if self.policy.max_rss_bytes is None:
+            return False
+        rss = read_rss()
+        return rss is not None and rss > self.policy.max_rss_bytes
+
+    def admit(self) -> bool:
+        """Whether a new game may be created now; reaps first if at a cap."""
+        if self.at_capacity():
+            self.reap()
+        if self.at_capacity():
+            self.rejected += 1
+            return False
+        return True
+
+    def at_capacity(self) -> bool:
+        return len(self.host.games) >= self.policy.max_live_games or self.memory_pressure()
+
+    def counts(self) -> dict:
+        """Live games by phase, totals reaped and rejected, and process RSS."""
+        live = {phase.value: 0 for phase in GamePhase}
+        for _, game, _ in self.live_games():
+            live[game_phase(game).value] += 1
+        return {
+            'live_games': sum(live.values()),
+            'live_by_phase': live,
+            'play_tasks': sum(not task.done() for task in list(self.host.tasks.values())),
+            'reaped_by_phase': {phase.value: n for phase, n in self.reaped.items()},
+            'rejected_games': self.rejected,
+            'max_live_games': self.policy.max_live_games,
+            'rss_bytes': read_rss(),
+        }
+
+    async def run(self):
+        """Reaps periodically; run on the games' loop."""
+        while True:
+            await asyncio.sleep(self.policy.reap_interval)
+            try:
+                self.reap()
+            except Exception:
+                logging.exception("Reaping games failed")
@@ -0,0 +1,363 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import resource
+import statistics
+import tempfile
+import time
+from typing import List, Optional, Tuple
+from urllib.parse import urlencode, urlsplit
+
+from acquisitions.server.async_server import AsyncGameServer
+from acquisitions.server.sharding import InProcessBus, Shard
+
+# Load test of the game servers: virtual players follow a browser's flow
+# (/create_game, /join_game/<id>, then the join and make_move events over
+# Engine.IO long-polling), play complete games by answering every prompt,
+# and record input latency: the time from sending a move to receiving the
+# next update addressed to that player. Each level of --games reports
+# latency percentiles, events delivered per second, and the server's CPU use
+# and RSS, so a ramp shows where a server saturates.
+#
+# By default the asyncio server runs in-process and is called directly, as
+# an ASGI app (the same requests, minus the network); with --workers, the
+# load is spread over in-process sharded workers connected by an
+# InProcessBus. With --url, the players connect over HTTP to a server
+# started separately, e.g. the Flask GameServer; give --server-pid to
+# report its CPU and RSS.
+
+RECORD_SEPARATOR = "\x1e"
+
+
+class LoopbackTransport:
+    """Calls an ASGI app directly, one HTTP request at a time."""
+    def __init__(self, app):
+        self.app = app
+
+    async def request(self, method: str, path: str, query: dict = None,
+                      body: bytes = b"") -> (int, bytes):
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': method,
+            'scheme': 'http',
+            'path': path,
+            'raw_path': path.encode(),
+            'query_string': urlencode(query or {}).encode(),
+            'root_path': '',
+            'headers': [
+                (b'host', b'loadtest'),
+                (b'content-length', str(len(body)).encode()),
+            ],
+            'client': ('127.0.0.1', 0),
+            'server': ('loadtest', 80),
+        }
+        request = {'type': 'http.request', 'body': body, 'more_body': False}
+        response = {'status': 0, 'body': b''}
+
+        async def receive():
+            return request
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                response['status'] = message['status']
+            elif message['type'] == 'http.response.body':
+                response['body'] += message.get('body', b'')
+
+        await self.app(scope, receive, send)
+        return response['status'], response['body']
+
+
+class HTTPTransport:
+    """
+    Sends requests to a server over HTTP/1.1, one connection per request,
+    with the same interface as LoopbackTransport.
+    """
+    def __init__(self, url: str):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+
+    async def request(self, method: str, path: str, query: dict = None,
+                      body: bytes = b"") -> (int, bytes):
+        target = path + (f"?{urlencode(query)}" if query else "")
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        try:
+            writer.write(
+                f"{method} {target} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body)
+            await writer.drain()
+            response = await reader.read()
+        finally:
+            writer.close()
+        head, _, content = response.partition(b"\r\n\r\n")
+        lines = head.decode('latin-1').split("\r\n")
+        headers = dict(line.lower().split(": ", 1) for line in lines[1:] if ": " in line)
+        if headers.get('transfer-encoding') == 'chunked':
+            content = dechunk(content)
+        return int(lines[0].split()[1]), content
+
+
+def dechunk(content: bytes) -> bytes:
+    body = b""
+    while content:
+        size, _, content = content.partition(b"\r\n")
+        size = int(size.split(b";")[0], 16)
+        if not size:
+            break
+        body += content[:size]
+        content = content[size + 2:]
+    return body
+
+
+class ProcessStats:
+    """CPU time and resident memory of a process (by default this one)."""
+    def __init__(self, pid: Optional[int] = None):
+        self.pid = pid
+
+    def sample(self) -> Tuple[float, int]:
+        """(CPU seconds used so far, current RSS in bytes)."""
+        if self.pid is None:
+            usage = resource.getrusage(resource.RUSAGE_SELF)
+            cpu = usage.ru_utime + usage.ru_stime
+            try:
+                with open("/proc/self/statm") as f:
+                    rss = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+            except OSError:  # not Linux; peak rather than current RSS
+                rss = usage.ru_maxrss * 1024
+            return cpu, rss
+        with open(f"/proc/{self.pid}/stat") as f:
+            # Fields after the command name, which may contain spaces
+            fields = f.read().rsplit(")", 1)[1].split()
+        with open(f"/proc/{self.pid}/statm") as f:
+            rss = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        ticks = os.sysconf("SC_CLK_TCK")
+        return (int(fields[11]) + int(fields[12])) / ticks, rss
+
+
+class VirtualPlayer:
+    """
+    A scripted Socket.IO client over Engine.IO long-polling. It answers
+    every prompt with a random choice (seeded, so a run is repeatable): a
+    tile from its hand (trying again if that tile cannot be played), an
+    offered hotel, up to one share of an offered hotel, and selling all
+    shares of a liquidated hotel.
+    """
+    def __init__(self, transport: LoopbackTransport, game_id: str, seed: int = 0):
+        self.transport = transport
+        self.game_id = game_id
+        self.name = None  # assigned by the server's join page
+        self.rng = random.Random(seed)
+        self.sid = None
+        self.moves = 0
+        self.events = 0  # Socket.IO events received
+        self.latencies: List[float] = []
+        self.move_sent_at: Optional[float] = None
+        self.prompt = None  # the prompt to answer next, if any
+        self.last_input_type = None  # of the prompt answered last
+        self.finished = False
+
+    async def join(self, page_transport: LoopbackTransport = None):
+        """
+        Opens the game's join page (through page_transport, if the game's
+        pages are served elsewhere), connects, and joins the game.
+        """
+        page_transport = page_transport or self.transport
+        status, body = await page_transport.request('GET', f'/join_game/{self.game_id}')
+        if status != 200:
+            raise RuntimeError(f"Cannot join game {self.game_id}: {status} {body!r}")
+        self.name = re.search(r'const playerName = "(\w+)"', body.decode()).group(1)
+        _, body = await self.transport.request(
+            'GET', '/socket.io/', {'EIO': 4, 'transport': 'polling'})
+        self.sid = json.loads(body.decode()[1:])['sid']
+        await self.send('40')  # connect to the default namespace
+        await self.emit('join', {'game_id': self.game_id, 'player': self.name})
+        # The server answers a join with a snapshot, so once one arrives
+        # the next player's join page will offer the next seat
+        while not self.events:
+            await self.poll()
+
+    async def send(self, *packets: str):
+        await self.transport.request(
+            'POST', '/socket.io/',
+            {'EIO': 4, 'transport': 'polling', 'sid': self.sid},
+            RECORD_SEPARATOR.join(packets).encode())
+
+    async def emit(self, event: str, data: dict):
+        await self.send('42' + json.dumps([event, data]))
+
+    async def play(self):
+        while not self.finished:
+            if self.prompt is not None:
+                prompt, self.prompt = self.prompt, None
+                await self.answer(prompt)
+            await self.poll()
+
+    async def poll(self):
+        status, body = await self.transport.request(
+            'GET', '/socket.io/',
+            {'EIO': 4, 'transport': 'polling', 'sid': self.sid})
+        if status != 200:
+            raise RuntimeError(f"{self.name} lost its session: {status} {body!r}")
+        for packet in body.decode().split(RECORD_SEPARATOR):
+            if packet == '2':  # Engine.IO ping
+                await self.send('3')
+            elif packet.startswith('42'):
+                event, data = json.loads(packet[2:])
+                self.events += 1
+                self.prompt = self.on_update(event, data) or self.prompt
+
+    def on_update(self, event: str, data: dict) -> Optional[dict]:
+        if self.move_sent_at is not None:
+            self.latencies.append(time.perf_counter() - self.move_sent_at)
+            self.move_sent_at = None
+        if event == 'input_rejected':
+            return data['prompt']
+        if event != 'player_update':
+            return None
+        if data['type'] == 'final_scores':
+            self.finished = True
+        elif data['type'] == 'input_required':
+            return data
+        elif data['type'] == 'snapshot':
+            return data['prompt']
+        return None
+
+    async def answer(self, prompt: dict):
+        input_type = prompt['input_type']
+        if input_type == 'tile':
+            move = {'tile': self.rng.choice(prompt['available_tiles'])}
+        elif input_type == 'hotel':
+            move = {'hotel': self.rng.choice(prompt['available_hotels'])}
+        elif input_type == 'buy_order':
+            # One share, or none if asked again (the share was refused,
+            # e.g. as unaffordable)
+            shares = 0 if self.last_input_type == 'buy_order' else 1
+            move = {'buy_order': {self.rng.choice(prompt['available_hotels']): shares}}
+        else:
+            move = {'sell': prompt['num_shares'], 'twofer': 0}
+        self.last_input_type = input_type
+        self.moves += 1
+        self.move_sent_at = time.perf_counter()
+        await self.emit('make_move', {'game_id': self.game_id, 'move': move})
+
+
+async def run_games(servers: List[AsyncGameServer], num_games: int, timeout: float):
+    """Plays num_games concurrent games on in-process servers."""
+    for server in servers:
+        await server.startup()
+    transports = [LoopbackTransport(server.app) for server in servers]
+    return await play_games(transports, num_games, timeout, ProcessStats())
+
+
+async def play_games(transports: list, num_games: int, timeout: float,
+                     stats: Optional[ProcessStats] = None, seed: int = 0):
+    """
+    Plays num_games concurrent games, measuring the server process with
+    stats if given. With several transports (to the workers of a sharded
+    deployment), games are created round-robin across them and each game's
+    second player connects to a different worker than its first.
+    """
+    players = []
+    for i in range(num_games):
+        host = transports[i % len(transports)]  # serves the game's pages
+        _, body = await host.request('GET', '/create_game')
+        game_id = re.search(r'join_game/(\w+)', body.decode()).group(1)
+        for seat in range(2):
+            transport = transports[(i + seat) % len(transports)]
+            player = VirtualPlayer(transport, game_id, seed=seed + len(players))
+            await player.join(host)
+            players.append(player)
+    before = stats.sample() if stats else None
+    start = time.perf_counter()
+    done, pending = await asyncio.wait(
+        [asyncio.ensure_future(p.play()) for p in players], timeout=timeout)
+    elapsed = time.perf_counter() - start
+    after = stats.sample() if stats else None
+    for task in pending:
+        task.cancel()
+    for task in done:
+        task.result()
+    cpu = after[0] - before[0] if stats else None
+    return LoadReport(num_games, players, elapsed, cpu, after[1] if stats else None)
+
+
+class LoadReport:
+    def __init__(self, num_games: int, players: List[VirtualPlayer], elapsed: float,
+                 cpu_seconds: Optional[float] = None, rss: Optional[int] = None):
+        self.num_games = num_games
+        self.games_finished = sum(p.finished for p in players) // 2
+        self.moves = sum(p.moves for p in players)
+        self.events = sum(p.events for p in players)
+        self.latencies = sorted(l for p in players for l in p.latencies)
+        self.elapsed = elapsed
+        # Of the server process over the run, if measured; in-process, the
+        # virtual players' own work is included
+        self.cpu_seconds = cpu_seconds
+        self.rss = rss
+
+    def percentile(self, q: float) -> float:
+        if not self.latencies:
+            return 0.0
+        return self.latencies[min(int(q * len(self.latencies)), len(self.latencies) - 1)]
+
+    def __str__(self):
+        mean = statistics.fmean(self.latencies) if self.latencies else 0.0
+        return (
+            f"{self.num_games:5d} concurrent games: {self.games_finished} finished, "
+            f"{self.moves} moves in {self.elapsed:.2f}s "
+            f"({self.moves / self.elapsed:.0f} moves/sec), input latency "
+            f"mean {mean * 1000:.2f}ms, p50 {self.percentile(0.5) * 1000:.2f}ms, "
+            f"p99 {self.percentile(0.99) * 1000:.2f}ms, "
+            f"{self.events / self.elapsed:.0f} emits/sec"
+            + (f", CPU {100 * self.cpu_seconds / self.elapsed:.0f}%, "
+               f"RSS {self.rss / 2 ** 20:.1f}MB" if self.cpu_seconds is not None else ""))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Load test a game server with virtual players.")
+    parser.add_argument("--games", type=str, default="1,10,100",
+                        help="comma-separated numbers of concurrent games")
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--event-logs", action="store_true",
+                        help="also write per-game event logs")
+    parser.add_argument("--no-metrics", action="store_true",
+                        help="run the in-process servers with metrics off")
+    parser.add_argument("--emit-sizes", action="store_true",
+                        help="also measure the size of every emit (emit_bytes)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="run this many sharded workers in-process, on an InProcessBus")
+    parser.add_argument("--url", type=str, default=None,
+                        help="load a server running at this URL instead, e.g. http://127.0.0.1:5000")
+    parser.add_argument("--server-pid", type=int, default=None,
+                        help="with --url, report the CPU and RSS of this process")
+    args = parser.parse_args()
+    if args.url:
+        stats = ProcessStats(args.server_pid) if args.server_pid else None
+        for num_games in [int(n) for n in args.games.split(",")]:
+            print(asyncio.run(play_games(
+                [HTTPTransport(args.url)], num_games, args.timeout, stats)))
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        for num_games in [int(n) for n in args.games.split(",")]:
+            db_path = os.path.join(tmp, f"load_{num_games}.db")
+            event_log_dir = os.path.join(tmp, "logs") if args.event_logs else None
+            bus = InProcessBus()
+            servers = [
+                AsyncGameServer(
+                    db_path=db_path, max_live_games=num_games * 2,
+                    event_log_dir=event_log_dir, metrics=not args.no_metrics,
+                    metrics_emit_sizes=args.emit_sizes,
+                    shard=Shard(k, args.workers, bus) if args.workers > 1 else None)
+                for k in range(args.workers)
+            ]
+            print(asyncio.run(run_games(servers, num_games, args.timeout)))
+
+# To run: python -m acquisitions.server.load_test from top level dir
+if __name__ == "__main__":
+    main()
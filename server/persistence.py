@@ -0,0 +1,234 @@
+import logging
+import math
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+from acquisitions.game_logic.game_orchestrator import GameOrchestrator
+from acquisitions.game_logic.snapshot import SnapshotSummary, snapshot_game, summarize_snapshot
+
+
+class GameStore(ABC):
+    """Durable storage for game snapshots, keyed by game_id."""
+    @abstractmethod
+    def save(self, game_id: str, snapshot: bytes, finished: bool):
+        pass
+
+    @abstractmethod
+    def load(self, game_id: str) -> Optional[bytes]:
+        pass
+
+    @abstractmethod
+    def delete(self, game_id: str):
+        pass
+
+
+class MemoryGameStore(GameStore):
+    """Non-durable store, for tests and local development."""
+    def __init__(self):
+        self.snapshots: Dict[str, bytes] = {}
+
+    def save(self, game_id: str, snapshot: bytes, finished: bool):
+        self.snapshots[game_id] = snapshot
+
+    def load(self, game_id: str) -> Optional[bytes]:
+        return self.snapshots.get(game_id)
+
+    def delete(self, game_id: str):
+        self.snapshots.pop(game_id, None)
+
+
+class SQLiteGameStore(GameStore):
+    """Default local backend: one row per game holding its latest snapshot."""
+    def __init__(self, path: str = "acquisitions.db"):
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS games ("
+                "game_id TEXT PRIMARY KEY, snapshot BLOB NOT NULL, "
+                "finished INTEGER NOT NULL, updated REAL NOT NULL)")
+
+    def save(self, game_id: str, snapshot: bytes, finished: bool):
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO games VALUES (?, ?, ?, ?)",
+                (game_id, snapshot, int(finished), time.time()))
+
+    def load(self, game_id: str) -> Optional[bytes]:
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT snapshot FROM games WHERE game_id = ?", (game_id,)).fetchone()
+        return row[0] if row else None
+
+    def delete(self, game_id: str):
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM games WHERE game_id = ?", (game_id,))
+
+
+class MessageArchive(ABC):
+    """
+    Durable storage for old game messages, used by ui.message_history.
+    Messages are keyed by (game_id, stream) and numbered from 0.
+    """
+    @abstractmethod
+    def append(self, game_id: str, stream: str, first_index: int, messages: List[str]):
+        pass
+
+    @abstractmethod
+    def count(self, game_id: str, stream: str) -> int:
+        pass
+
+    @abstractmethod
+    def page(self, game_id: str, stream: str, start: int, stop: int) -> List[str]:
+        """Messages numbered [start, stop)."""
+        pass
+
+    @abstractmethod
+    def delete(self, game_id: str):
+        pass
+
+
+class SQLiteMessageArchive(MessageArchive):
+    def __init__(self, path: str = "acquisitions.db"):
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS messages ("
+                "game_id TEXT NOT NULL, stream TEXT NOT NULL, idx INTEGER NOT NULL, "
+                "text TEXT NOT NULL, PRIMARY KEY (game_id, stream, idx))")
+
+    def append(self, game_id: str, stream: str, first_index: int, messages: List[str]):
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO messages VALUES (?, ?, ?, ?)",
+                [(game_id, stream, first_index + i, msg) for i, msg in enumerate(messages)])
+
+    def count(self, game_id: str, stream: str) -> int:
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT MAX(idx) FROM messages WHERE game_id = ? AND stream = ?",
+                (game_id, stream)).fetchone()
+        return row[0] + 1 if row[0] is not None else 0
+
+    def page(self, game_id: str, stream: str, start: int, stop: int) -> List[str]:
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT text FROM messages WHERE game_id = ? AND stream = ? "
+                "AND idx >= ? AND idx < ? ORDER BY idx",
+                (game_id, stream, start, stop)).fetchall()
+        return [row[0] for row in rows]
+
+    def delete(self, game_id: str):
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM messages WHERE game_id = ?", (game_id,))
+
+
+class GameRegistry:
+    """
+    The live games of a server: an LRU cache of GameOrchestrators in front of
+    a GameStore. Games are snapshotted to the store via save() (after each
+    turn), restored lazily by get() on first access after a restart or
+    eviction, and evicted from memory when finished, when idle for longer
+    than max_idle_seconds (if set), or when more than max_live_games are
+    live. Access and saves both count as activity.
+    """
+    def __init__(
+            self,
+            store: GameStore,
+            restore: Callable[[str, bytes], GameOrchestrator],
+            on_evict: Optional[Callable[[str, GameOrchestrator], None]] = None,
+            max_live_games: int = 1000,
+            max_idle_seconds: Optional[float] = 3600):
+        self.store = store
+        self.restore = restore
+        self.on_evict = on_evict
+        self.max_live_games = max_live_games
+        self.max_idle_seconds = max_idle_seconds
+        self.live: "OrderedDict[str, GameOrchestrator]" = OrderedDict()
+        self.last_access: Dict[str, float] = {}
+        self.lock = threading.RLock()
+
+    def __contains__(self, game_id: str) -> bool:
+        return self.get(game_id) is not None
+
+    def __len__(self) -> int:
+        return len(self.live)
+
+    def add(self, game_id: str, game: GameOrchestrator):
+        with self.lock:
+            self.touch(game_id, game)
+            self.save(game_id, game)
+
+    def get(self, game_id: str) -> Optional[GameOrchestrator]:
+        with self.lock:
+            game = self.live.get(game_id)
+            if game is None:
+                snapshot = self.store.load(game_id)
+                if snapshot is None:
+                    return None
+                logging.info("Restoring game %s from snapshot", game_id)
+                game = self.restore(game_id, snapshot)
+            self.touch(game_id, game)
+            return game
+
+    def peek(self, game_id: str) -> Optional[GameOrchestrator]:
+        """The game if it is live, without restoring it or counting an access."""
+        with self.lock:
+            return self.live.get(game_id)
+
+    def summary(self, game_id: str) -> Optional[SnapshotSummary]:
+        """
+        The players of a game, live or stored, and whether it has finished,
+        without restoring it or counting an access.
+        """
+        game = self.peek(game_id)
+        if game is not None:
+            return SnapshotSummary(
+                game.finished, [p.name for p in game.players], list(game.seats))
+        snapshot = self.store.load(game_id)
+        return summarize_snapshot(snapshot) if snapshot is not None else None
+
+    def save(self, game_id: str, game: GameOrchestrator):
+        """Persists a snapshot of the game; finished games leave memory."""
+        self.store.save(game_id, snapshot_game(game), game.finished)
+        if game.finished:
+            self.evict(game_id)
+        else:
+            with self.lock:
+                if game_id in self.live:
+                    self.last_access[game_id] = time.monotonic()
+
+    def touch(self, game_id: str, game: GameOrchestrator):
+        with self.lock:
+            self.live[game_id] = game
+            self.live.move_to_end(game_id)
+            self.last_access[game_id] = time.monotonic()
+            self.evict_stale()
+
+    def evict(self, game_id: str):
+        with self.lock:
+            game = self.live.pop(game_id, None)
+            self.last_access.pop(game_id, None)
+        if game is not None and self.on_evict:
+            self.on_evict(game_id, game)
+
+    def evict_stale(self):
+        """Evicts least recently used games while over capacity or idle."""
+        with self.lock:
+            cutoff = -math.inf
+            if self.max_idle_seconds is not None:
+                cutoff = time.monotonic() - self.max_idle_seconds
+            while self.live:
+                game_id = next(iter(self.live))
+                if (len(self.live) <= self.max_live_games
+                        and self.last_access[game_id] > cutoff):
+                    break
+                logging.info("Evicting game %s from memory", game_id)
+                self.evict(game_id)
@@ -0,0 +1,268 @@
+import functools
+import json
+import os
+import random
+import sys
+import threading
+import time
+from typing import Dict, List, Optional
+
+from acquisitions.game_logic.game_orchestrator import GameOrchestrator
+from acquisitions.game_logic.metrics import Metrics
+from acquisitions.ui.web_ui import WebUI
+
+# Opt-in profiling of single live games. A profiled game has its
+# orchestrator's phase coroutines (PROFILED_COROUTINES) and per-turn
+# functions (PROFILED_FUNCTIONS) wrapped, on the instance only, to record
+# the wall time and the CPU time (of the loop thread, while the game's own
+# code runs) of every call; its WebUIs record how long each input waits in
+# the user_input queue, and its emits how long their payloads take to
+# serialize. While any game is profiled, a sampler thread records the loop
+# thread's stack whenever a profiled game is running on it.
+#
+# When profiling stops, a game's files are written, named for the game and
+# the profile's start time in ms: <game_id>-<ms>.folded holds the samples
+# in the collapsed format of flamegraph.pl and speedscope ("frame;frame;frame
+# count" per line), and <game_id>-<ms>.json the timings (a Metrics snapshot,
+# see metrics.py). Games that are not profiled are left untouched.
+
+PROFILED_COROUTINES = (
+    'play_turn', 'get_tile', 'get_hotel', 'place_tile', 'start_chain',
+    'handle_merger', 'execute_liquidity_event', 'liquidate_holdings',
+    'execute_purchases', 'handle_game_end',
+)
+PROFILED_FUNCTIONS = ('turn_ended', 'flush')
+SAMPLE_INTERVAL = 0.005  # seconds between stack samples
+
+
+class GameProfile:
+    """Timings and stack samples of one game, while it is profiled."""
+    def __init__(self, game_id: str):
+        self.game_id = game_id
+        self.metrics = Metrics()
+        self.samples: Dict[str, int] = {}  # folded stack -> count
+        self.started = time.time()
+        self.depth = 0  # > 0 while the game's code is running
+        self.thread_id = None  # of the thread it runs on
+        self.input_received_at = None
+
+    def enter(self):
+        if self.depth == 0:
+            self.thread_id = threading.get_ident()
+        self.depth += 1
+
+    def leave(self):
+        self.depth -= 1
+
+    def observe_call(self, name: str, wall: float, cpu: float):
+        self.metrics.observe(f"{name}_wall_seconds", wall)
+        self.metrics.observe(f"{name}_cpu_seconds", cpu)
+
+    def input_received(self):
+        self.input_received_at = time.perf_counter()
+
+    async def wait_for_input(self, queue):
+        """
+        queue.get(), recording the wait and, once the input arrives, how
+        long the game took to resume after it was queued.
+        """
+        start = time.perf_counter()
+        data = await queue.get()
+        now = time.perf_counter()
+        self.metrics.observe('input_queue_wait_seconds', now - start)
+        if self.input_received_at is not None:
+            self.metrics.observe('input_dispatch_seconds', now - self.input_received_at)
+            self.input_received_at = None
+        return data
+
+    def attach(self, game: GameOrchestrator):
+        for name in PROFILED_COROUTINES:
+            setattr(game, name, profiled_coroutine(self, name, getattr(game, name)))
+        for name in PROFILED_FUNCTIONS:
+            setattr(game, name, profiled_function(self, name, getattr(game, name)))
+        game.room.profile = self
+        for ui in game.uis:
+            if isinstance(ui, WebUI):
+                ui.profile = self
+
+    def detach(self, game: GameOrchestrator):
+        for name in PROFILED_COROUTINES + PROFILED_FUNCTIONS:
+            game.__dict__.pop(name, None)
+        game.room.profile = None
+        for ui in game.uis:
+            if isinstance(ui, WebUI):
+                ui.profile = None
+
+    def dump(self, out_dir: str) -> List[str]:
+        """Writes the profile's files, returning their paths."""
+        os.makedirs(out_dir, exist_ok=True)
+        base = os.path.join(out_dir, f"{self.game_id}-{int(self.started * 1000)}")
+        with open(base + ".folded", "w") as f:
+            for stack, count in sorted(self.samples.items()):
+                f.write(f"{stack} {count}\n")
+        with open(base + ".json", "w") as f:
+            json.dump({
+                'game_id': self.game_id,
+                'started': self.started,
+                'elapsed': time.time() - self.started,
+                'sample_interval': SAMPLE_INTERVAL,
+                'samples': sum(self.samples.values()),
+                **self.metrics.snapshot(),
+            }, f, indent=2)
+        return [base + ".folded", base + ".json"]
+
+
+class Stepped:
+    """
+    Awaitable driving coro step by step, as `await coro` would, and timing
+    it: wall time from first step to completion, and CPU time of the steps
+    alone, so time other games spend on the loop is not counted.
+    """
+    __slots__ = ("profile", "name", "coro")
+
+    def __init__(self, profile: GameProfile, name: str, coro):
+        self.profile = profile
+        self.name = name
+        self.coro = coro
+
+    def __await__(self):
+        profile, coro = self.profile, self.coro
+        start, cpu = time.perf_counter(), 0.0
+        value, exc = None, None
+        try:
+            while True:
+                profile.enter()
+                step_start = time.thread_time()
+                try:
+                    if exc is None:
+                        yielded = coro.send(value)
+                    else:
+                        yielded = coro.throw(exc)
+                except StopIteration as stop:
+                    return stop.value
+                finally:
+                    cpu += time.thread_time() - step_start
+                    profile.leave()
+                try:
+                    value, exc = (yield yielded), None
+                except GeneratorExit:
+                    coro.close()
+                    raise
+                except BaseException as e:  # e.g. the task being cancelled
+                    value, exc = None, e
+        finally:
+            profile.observe_call(self.name, time.perf_counter() - start, cpu)
+
+
+def profiled_coroutine(profile: GameProfile, name: str, method):
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        return Stepped(profile, name, method(*args, **kwargs))
+    return wrapper
+
+
+def profiled_function(profile: GameProfile, name: str, method):
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        start, cpu_start = time.perf_counter(), time.thread_time()
+        profile.enter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            profile.leave()
+            profile.observe_call(
+                name, time.perf_counter() - start, time.thread_time() - cpu_start)
+    return wrapper
+
+
+def fold_stack(frame) -> str:
+    """A stack in the collapsed format: outermost frame first, ';'-separated."""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class StackSampler:
+    """
+    Thread sampling the stacks of running profiled games every interval
+    seconds. It runs only while there are games to sample.
+    """
+    def __init__(self, interval: float = SAMPLE_INTERVAL):
+        self.interval = interval
+        self.profiles: List[GameProfile] = []
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def add(self, profile: GameProfile):
+        with self.lock:
+            self.profiles.append(profile)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, daemon=True)
+                self.thread.start()
+
+    def remove(self, profile: GameProfile):
+        with self.lock:
+            if profile in self.profiles:
+                self.profiles.remove(profile)
+
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            with self.lock:
+                if not self.profiles:
+                    self.thread = None
+                    return
+                profiles = list(self.profiles)
+            frames = None
+            for profile in profiles:
+                if profile.depth <= 0:
+                    continue
+                if frames is None:
+                    frames = sys._current_frames()
+                frame = frames.get(profile.thread_id)
+                if frame is not None and profile.depth > 0:
+                    stack = fold_stack(frame)
+                    profile.samples[stack] = profile.samples.get(stack, 0) + 1
+
+
+class GameProfiler:
+    """
+    Starts and stops the profiling of a GameHost's games: on request, by
+    game id, and for a sample_rate fraction of the games it starts. Profiles
+    are written to out_dir when they stop.
+    """
+    def __init__(self, out_dir: str, sample_rate: float = 0.0,
+                 interval: float = SAMPLE_INTERVAL, rng: Optional[random.Random] = None):
+        self.out_dir = out_dir
+        self.sample_rate = sample_rate
+        self.rng = rng or random.Random()
+        self.sampler = StackSampler(interval)
+        self.profiles: Dict[str, GameProfile] = {}
+
+    def sampled(self) -> bool:
+        """Whether to profile a newly started game."""
+        return self.sample_rate > 0 and self.rng.random() < self.sample_rate
+
+    def start(self, game_id: str, game: GameOrchestrator):
+        """
+        Profiles a game, from its next call of each profiled function (for a
+        running game, from its next turn).
+        """
+        if game_id in self.profiles:
+            return
+        profile = GameProfile(game_id)
+        profile.attach(game)
+        self.profiles[game_id] = profile
+        self.sampler.add(profile)
+
+    def stop(self, game_id: str, game: GameOrchestrator) -> Optional[List[str]]:
+        """Stops profiling a game and writes its profile, returning the files."""
+        profile = self.profiles.pop(game_id, None)
+        if profile is None:
+            return None
+        self.sampler.remove(profile)
+        profile.detach(game)
+        return profile.dump(self.out_dir)
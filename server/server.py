@@ -2,30 +2,46 @@ import asyncio
 import logging
 import os
 import threading
-import uuid
 
-from flask import Flask, render_template, request
+from flask import Flask, jsonify, render_template, request
 from flask_socketio import SocketIO, join_room, leave_room
 
-from acquisitions.game_logic.game_orchestrator import GameOrchestrator
-from acquisitions.ui.web_ui import WebUI
-
-logging.basicConfig(level=logging.DEBUG)
-
-class GameServer:
-    def __init__(self):
+from acquisitions.game_logic.metrics import PROMETHEUS_CONTENT_TYPE
+from acquisitions.server.game_host import (
+    ADMIN_TOKEN_HEADER, MAX_HISTORY_PAGE, GameHost, parse_sample_rate, profiling_options)
+
+# Per-message DEBUG logging is costly under load; set e.g.
+# ACQUISITIONS_LOG_LEVEL=DEBUG to see it
+LOG_LEVEL_ENV = "ACQUISITIONS_LOG_LEVEL"
+
+logging.basicConfig(level=os.environ.get(LOG_LEVEL_ENV, "INFO").upper())
+
+class GameServer(GameHost):
+    """
+    Flask-SocketIO front end in threading mode. Socket handlers run on
+    the server's threads, and games run on a separate event loop thread.
+    See async_server.py for a single-loop asyncio front end.
+    """
+    def __init__(self, db_path='acquisitions.db', max_live_games=1000,
+                 event_log_dir='game_logs', lifecycle_policy=None, metrics=True,
+                 metrics_emit_sizes=False, profile_dir=None, profile_sample_rate=0.0, admin_token=None):
         template_dir = os.path.abspath(
             os.path.join(os.path.dirname(__file__), '..', 'ui', 'templates'))
         self.app = Flask(__name__, template_folder=template_dir)
         self.app.config['SECRET_KEY'] = 'your-secret-key'  # TODO - change this
-        self.socketio = SocketIO(self.app, async_mode='threading')
-        self.games = {}  # in-memory table to store active games
-        self.loop = asyncio.new_event_loop()
+        super().__init__(
+            SocketIO(self.app, async_mode='threading'), asyncio.new_event_loop(),
+            db_path=db_path, max_live_games=max_live_games,
+            event_log_dir=event_log_dir, lifecycle_policy=lifecycle_policy,
+            metrics=metrics, metrics_emit_sizes=metrics_emit_sizes,
+            profile_dir=profile_dir,
+            profile_sample_rate=profile_sample_rate, admin_token=admin_token)
         self.setup_routes()
 
         # Start the event loop in a separate thread
         self.loop_thread = threading.Thread(target=self.run_loop, daemon=True)
         self.loop_thread.start()
+        self.schedule(self.lifecycle.run())
 
     def setup_routes(self):
         @self.app.route('/')
@@ -34,50 +50,92 @@ class GameServer:
 
         @self.app.route('/create_game')
         def create_game():
-            game_id = str(uuid.uuid4())[:8]  # Use first 8 characters for brevity
-            self.games[game_id] = GameOrchestrator(
-                [WebUI(game_id, self.socketio, self.loop) for _ in range(2)]
-            )
+            game_id = self.create_game(request.args.get('bots', 0, type=int))
+            if game_id is None:
+                return "Server is full, try again later", 503
             join_url = f"{request.host_url}join_game/{game_id}"
             return render_template(
                 'game_created.html', game_id=game_id, join_url=join_url)
 
         @self.app.route('/join_game/<game_id>')
         def join_game(game_id):
-            if game_id not in self.games:
+            player_name = self.new_player_name(game_id)
+            if player_name is None:
                 return "error", 404  # TODO
-            game_orchestrator = self.games[game_id]
-            player_name = f"Player{len(game_orchestrator.players)}"
             return render_template('game.html', game_id=game_id, player_name=player_name)
 
+        @self.app.route('/history/<game_id>')
+        def history(game_id):
+            before = request.args.get('before', type=int)
+            limit = request.args.get('limit', MAX_HISTORY_PAGE, type=int)
+            page = self.on_loop(
+                self.history, game_id, request.args.get('player'), before, limit)
+            if page is None:
+                return "error", 404
+            return jsonify(page)
+
+        @self.app.route('/stats')
+        def stats():
+            return jsonify(self.on_loop(self.stats))
+
+        @self.app.route('/metrics')
+        def metrics():
+            text = self.on_loop(self.metrics_text, request.args.get('game_id'))
+            if text is None:
+                return "error", 404
+            return text, 200, {'Content-Type': PROMETHEUS_CONTENT_TYPE}
+
+        @self.app.route('/profile', methods=['POST'])
+        def profile_sampling():
+            if not self.is_admin(request.remote_addr, request.headers.get(ADMIN_TOKEN_HEADER)):
+                return "Forbidden", 403
+            rate = request.args.get('sample_rate')
+            try:
+                rate = parse_sample_rate(rate) if rate is not None else None
+            except ValueError:
+                return "Bad request", 400
+            sampling = self.on_loop(self.profile_sampling, rate)
+            if sampling is None:
+                return "error", 404
+            return jsonify(sampling)
+
+        @self.app.route('/profile/<game_id>', methods=['POST'])
+        def profile(game_id):
+            if not self.is_admin(request.remote_addr, request.headers.get(ADMIN_TOKEN_HEADER)):
+                return "Forbidden", 403
+            enable = 'stop' not in request.args
+            files = self.on_loop(self.profile_game, game_id, enable)
+            if files is None:
+                return "error", 404
+            return jsonify({'game_id': game_id, 'profiling': enable, 'files': files})
 
         @self.socketio.on('join')
         def on_join(data):
-            logging.debug(f"Join event received: {data}")
-            game_id = data['game_id']
-            player = data['player']
-            join_room(game_id)
-            game_orchestrator = self.games[game_id]
-            logging.debug(f"Adding {player} to game {game_id} ...")
-            game_orchestrator.add_player(player)
-            logging.debug(f"Added player {player} to game {game_id}!")
-            if game_orchestrator.is_ready():
-                logging.debug(f"Game {game_id} is ready to start")
-                logging.debug(f"Starting game orchestrator for game {game_id}")
-                asyncio.run_coroutine_threadsafe(self.run_game(game_orchestrator), self.loop)
+            logging.debug("Join event received: %s", data)
+            join_room(data['game_id'])
+            self.join(data['game_id'], data['player'], request.sid, data.get('token'))
 
         @self.socketio.on('make_move')
         def on_move(data):
-            game_id = data['game_id']
-            move = data['move']
-            game_orchestrator = self.games[game_id]
-            game_orchestrator.receive_input(move)
+            self.move(data['game_id'], data['move'], request.sid)
+
+        @self.socketio.on('resync')
+        def on_resync(data):
+            """Sent by clients that detect a gap in the update sequence."""
+            self.resync(data['game_id'], request.sid)
+
+    def call(self, fn, *args):
+        # UIs are only touched from the game loop's thread
+        self.loop.call_soon_threadsafe(fn, *args)
+
+    def schedule(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
 
-    async def run_game(self, game_orchestrator):
-        logging.debug(f"Running game orchestrator for game {game_orchestrator}")
-        logging.debug("Starting play coroutine")
-        await game_orchestrator.play()
-        logging.debug("Finished play coroutine")
+    def on_loop(self, fn, *args):
+        """Runs fn(*args) on the game loop's thread and returns its result."""
+        async def run():
+            return fn(*args)
+        return self.schedule(run()).result()
 
     def run_loop(self):
         asyncio.set_event_loop(self.loop)
@@ -88,7 +146,7 @@ class GameServer:
         self.socketio.run(self.app, debug=True, use_reloader=False)
 
 def create_app():
-    server = GameServer()
+    server = GameServer(**profiling_options())
     return server.app, server.socketio
 
 if __name__ == "__main__":
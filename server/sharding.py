@@ -0,0 +1,183 @@
+import asyncio
+import json
+import logging
+import struct
+import uuid
+import zlib
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from typing import AsyncIterator, Dict, List, Optional
+
+from socketio.async_pubsub_manager import AsyncPubSubManager
+
+# Sharded deployments: games are partitioned across N worker processes by a
+# stable hash of game_id. Each game lives (and its play() coroutine runs) on
+# exactly one worker, its owner. Any worker serves the lobby, creating games
+# it owns itself. Socket events for a game that reach another worker are
+# forwarded to the owner over a MessageBus, and Socket.IO emits (room
+# broadcasts and per-player updates) are relayed over the same bus to
+# whichever worker holds each client's connection.
+
+_FRAME = struct.Struct("<I")
+
+
+def worker_for(game_id: str, num_workers: int) -> int:
+    """The worker that owns game_id. Stable across processes and restarts."""
+    return zlib.crc32(game_id.encode("utf-8")) % num_workers
+
+
+class MessageBus(ABC):
+    """Publish/subscribe of JSON-serializable messages on named channels."""
+    @abstractmethod
+    async def publish(self, channel: str, message: dict):
+        pass
+
+    @abstractmethod
+    def subscribe(self, channel: str) -> AsyncIterator[dict]:
+        """Async iterator over the messages published on channel from now on."""
+        pass
+
+
+class InProcessBus(MessageBus):
+    """Bus between workers running in one process, on one loop; for tests."""
+    def __init__(self):
+        self.subscribers: Dict[str, List[asyncio.Queue]] = defaultdict(list)
+
+    async def publish(self, channel: str, message: dict):
+        for queue in self.subscribers[channel]:
+            queue.put_nowait(message)
+
+    async def subscribe(self, channel: str) -> AsyncIterator[dict]:
+        queue = asyncio.Queue()
+        self.subscribers[channel].append(queue)
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            self.subscribers[channel].remove(queue)
+
+
+class BusHub:
+    """
+    Broker for LocalSocketBus: relays every frame it receives to all
+    connected workers over a Unix domain socket. Run by the cluster
+    supervisor.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.writers: List[asyncio.StreamWriter] = []
+
+    async def serve(self):
+        server = await asyncio.start_unix_server(self.handle, path=self.path)
+        async with server:
+            await server.serve_forever()
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.writers.append(writer)
+        try:
+            while True:
+                header = await reader.readexactly(_FRAME.size)
+                frame = header + await reader.readexactly(_FRAME.unpack(header)[0])
+                for peer in self.writers:
+                    peer.write(frame)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.writers.remove(writer)
+            writer.close()
+
+
+class LocalSocketBus(MessageBus):
+    """
+    Bus between worker processes on one host, through a BusHub listening
+    on a Unix domain socket. Frames are a uint32 length followed by
+    JSON-encoded [channel, message].
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.writer: Optional[asyncio.StreamWriter] = None
+        self.connecting: Optional[asyncio.Future] = None
+        self.subscribers: Dict[str, List[asyncio.Queue]] = defaultdict(list)
+
+    async def connect(self):
+        if self.connecting is None:
+            self.connecting = asyncio.ensure_future(self.open())
+        await self.connecting
+
+    async def open(self):
+        reader, self.writer = await asyncio.open_unix_connection(self.path)
+        asyncio.ensure_future(self.read_frames(reader))
+
+    async def read_frames(self, reader: asyncio.StreamReader):
+        while True:
+            header = await reader.readexactly(_FRAME.size)
+            channel, message = json.loads(
+                await reader.readexactly(_FRAME.unpack(header)[0]))
+            for queue in self.subscribers.get(channel, ()):
+                queue.put_nowait(message)
+
+    async def publish(self, channel: str, message: dict):
+        await self.connect()
+        payload = json.dumps([channel, message]).encode("utf-8")
+        self.writer.write(_FRAME.pack(len(payload)) + payload)
+        await self.writer.drain()
+
+    async def subscribe(self, channel: str) -> AsyncIterator[dict]:
+        await self.connect()
+        queue = asyncio.Queue()
+        self.subscribers[channel].append(queue)
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            self.subscribers[channel].remove(queue)
+
+
+class BusManager(AsyncPubSubManager):
+    """Socket.IO client manager relaying emits between workers over a MessageBus."""
+    name = 'acquisitions-bus'
+
+    def __init__(self, bus: MessageBus, channel: str = 'socketio'):
+        super().__init__(channel=channel)
+        self.bus = bus
+
+    async def _publish(self, data):
+        await self.bus.publish(self.channel, data)
+
+    async def _listen(self):
+        async for message in self.bus.subscribe(self.channel):
+            yield message
+
+
+class Shard:
+    """One worker's place in a sharded deployment."""
+    def __init__(self, worker_id: int, num_workers: int, bus: MessageBus,
+                 worker_urls: Optional[List[str]] = None):
+        self.worker_id = worker_id
+        self.num_workers = num_workers
+        self.bus = bus
+        # Base URL of each worker, for redirecting page loads to a game's owner
+        self.worker_urls = worker_urls
+
+    def owner(self, game_id: str) -> int:
+        return worker_for(game_id, self.num_workers)
+
+    def owns(self, game_id: str) -> bool:
+        return self.owner(game_id) == self.worker_id
+
+    def new_game_id(self) -> str:
+        """A fresh game id owned by this worker (num_workers tries on average)."""
+        while True:
+            game_id = str(uuid.uuid4())[:8]
+            if self.owns(game_id):
+                return game_id
+
+    @property
+    def channel(self) -> str:
+        """Bus channel on which this worker receives forwarded socket events."""
+        return f"worker.{self.worker_id}"
+
+    async def forward(self, game_id: str, event: str, sid: str, data: dict):
+        logging.debug("Forwarding %s for game %s to worker %d", event, game_id, self.owner(game_id))
+        await self.bus.publish(
+            f"worker.{self.owner(game_id)}", {'event': event, 'sid': sid, 'data': data})
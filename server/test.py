@@ -0,0 +1,76 @@
+import asyncio
+import os
+import tempfile
+import unittest
+
+from acquisitions.server.game_host import GameHost
+from acquisitions.server.lifecycle import GamePhase
+from acquisitions.server.persistence import MemoryGameStore
+
+# Tests of GameHost's handling of socket events, on games hosted in memory
+# by a GameHost whose emits are recorded instead of sent.
+
+
+class RecordingEmitter:
+    """Stands in for a Socket.IO server, recording (event, data, room)."""
+    def __init__(self):
+        self.emitted = []
+
+    def emit(self, event, data, room=None):
+        self.emitted.append((event, data, room))
+
+    def sent_to(self, room) -> list:
+        return [(event, data) for event, data, to in self.emitted if to == room]
+
+
+class MoveSenderTest(unittest.TestCase):
+    """Moves are only taken from the socket of the seat whose input is awaited."""
+    def test_moves_from_other_seats_are_rejected(self):
+        asyncio.run(self.play_first_move())
+
+    async def play_first_move(self):
+        emitter = RecordingEmitter()
+        host = GameHost(emitter, store=MemoryGameStore(), event_log_dir=None)
+        game_id = host.create_game()
+        host.join(game_id, "alice", "sid0")
+        host.join(game_id, "bob", "sid1")
+        await asyncio.sleep(0.1)  # for the game to prompt its first player
+        game = host.games.peek(game_id)
+        seat, input_type = game.pending_input
+        self.assertEqual(input_type, 'tile')
+        move = {'tile': str(game.legal_actions()[0])}
+        for sid in ("sid1" if seat == 0 else "sid0", "stranger"):
+            host.move(game_id, move, sid)
+            event, data = emitter.sent_to(sid)[-1]
+            self.assertEqual((event, data['reason']), ('input_rejected', "It is not your turn"))
+        self.assertIsNotNone(game.uis[seat].prompt)
+        host.move(game_id, move, f"sid{seat}")
+        self.assertIsNone(game.uis[seat].prompt)  # accepted
+        host.move(game_id, move, f"sid{seat}")
+        event, data = emitter.sent_to(f"sid{seat}")[-1]
+        self.assertEqual(
+            (event, data['reason']), ('input_rejected', "Your move was already received"))
+        host.stop_game(game_id, game)
+
+
+class ReapTest(unittest.TestCase):
+    """Reaping an abandoned lobby deletes everything the game left behind."""
+    def test_reaped_lobby_deletes_its_event_log(self):
+        asyncio.run(self.reap_lobby())
+
+    async def reap_lobby(self):
+        with tempfile.TemporaryDirectory() as log_dir:
+            host = GameHost(RecordingEmitter(), store=MemoryGameStore(), event_log_dir=log_dir)
+            game_id = host.create_game()
+            host.join(game_id, "alice", "sid0")
+            path = host.event_log_path(game_id)
+            self.assertTrue(os.path.exists(path))
+            self.assertEqual(host.lifecycle.reap(now=1e12), [game_id])
+            self.assertEqual(host.lifecycle.reaped[GamePhase.LOBBY], 1)
+            self.assertFalse(os.path.exists(path))
+            self.assertIsNone(host.games.summary(game_id))
+
+
+# To run: python -m acquisitions.server.test from top level dir
+if __name__ == "__main__":
+    unittest.main()
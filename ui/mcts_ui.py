@@ -0,0 +1,103 @@
+import asyncio
+import logging
+import random
+import uuid
+from typing import List, Tuple
+
+from acquisitions.game_logic.constants import *
+from acquisitions.game_logic.tile import *
+from acquisitions.game_logic.player import *
+from acquisitions.game_logic.board_state import *
+from acquisitions.game_logic.mcts import Decision, forget_tree, run_search
+from acquisitions.ui.ui_interface import *
+
+# Extra time allowed for a search to report back (e.g. from another
+# process) before the player gives up on it and picks at random
+SEARCH_GRACE = 0.5
+
+
+class MCTSPlayer(BaseUI):
+    """
+    Computer player for a seat of a GameOrchestrator, deciding by
+    determinized Monte Carlo tree search (see game_logic/mcts.py) within
+    time_budget seconds per decision.
+
+    Searches run off the game's loop, so the server keeps serving while a
+    bot thinks. With executors=None they run on the loop's default thread
+    pool. Otherwise every executor searches in parallel and their root
+    statistics are summed; executors should be single-process
+    ProcessPoolExecutors, so that each worker keeps growing the same tree
+    across this player's turns.
+    """
+    def __init__(self, game=None, time_budget: float = 1.0, executors=None, seed=None):
+        self.game = game  # the GameOrchestrator; set before the game starts
+        self.time_budget = time_budget
+        self.executors = executors or [None]
+        self.rng = random.Random(seed)
+        self.searcher = uuid.uuid4().hex  # names this player's trees in the workers
+
+    def render_board(self, cell_states):
+        pass
+
+    def display_message(self, msg: str):
+        pass
+
+    async def get_tile_from_user(self, player: PlayerState) -> Tile:
+        decision = Decision('tile', self.seat(player), self.game.curr_player_id)
+        tiles = self.game.legal_actions()
+        return TILES[await self.decide(decision, [t.index for t in tiles])]
+
+    async def get_hotel_from_user(self, player: PlayerState, hotels: List[Hotel]) -> Hotel:
+        # Merger ties are asked while the merger is in progress
+        decision = Decision(
+            'hotel', self.seat(player), self.game.curr_player_id,
+            self.game.current_tile, self.game.merger)
+        return HOTELS_BY_ID[await self.decide(decision, [h.value for h in hotels])]
+
+    async def get_buy_order_from_user(self, player: PlayerState, hotels: List[Hotel]) -> List[int]:
+        decision = Decision('buy_order', self.seat(player), self.game.curr_player_id)
+        return list(await self.decide(decision, self.game.legal_actions()))
+
+    async def get_user_liquidation_option(self, name: str, num_shares: int) -> Tuple[int, int]:
+        seat = [p.name for p in self.game.players].index(name)
+        liquidated_hotel, _ = self.game.pending_options
+        decision = Decision(
+            'liquidation', seat, self.game.curr_player_id, self.game.current_tile,
+            list(self.game.merger), liquidated_hotel)
+        return await self.decide(decision, self.game.legal_actions())
+
+    async def display_final_scores(self, players: List[PlayerState]):
+        loop = asyncio.get_running_loop()
+        for executor in self.executors:
+            loop.run_in_executor(executor, forget_tree, self.searcher)
+
+    def seat(self, player: PlayerState) -> int:
+        return self.game.players.index(player)
+
+    async def decide(self, decision: Decision, options: list):
+        """The most visited of options after searching decision."""
+        if len(options) == 1:
+            return options[0]
+        game = self.game
+        state = (game.board_state.clone(), game.bank.clone(),
+                 [player.clone() for player in game.players])
+        loop = asyncio.get_running_loop()
+        searches = [
+            loop.run_in_executor(
+                executor, run_search, self.searcher, *state, decision,
+                self.time_budget, self.rng.getrandbits(32))
+            for executor in self.executors
+        ]
+        visits = dict.fromkeys(options, 0)
+        try:
+            results = await asyncio.wait_for(
+                asyncio.gather(*searches), self.time_budget + SEARCH_GRACE)
+        except Exception:
+            logging.exception("Search for %s failed; choosing at random", decision.kind)
+            results = []
+        for stats in results:
+            for action, (n, _) in stats.items():
+                if action in visits:
+                    visits[action] += n
+        best = max(visits.values())
+        return self.rng.choice([a for a in options if visits[a] == best])
@@ -0,0 +1,69 @@
+from collections import deque
+from typing import List, Optional, Tuple
+
+HISTORY_CAPACITY = 50  # messages kept in memory per stream
+ARCHIVE_BATCH_SIZE = 20
+
+
+class MessageHistory:
+    """
+    Message history of one stream (a game's public messages, or one
+    player's private ones), with constant memory. The newest `capacity`
+    messages are kept in a ring buffer. If an archive is given (see
+    server/persistence.py), every message is also written to it in batches,
+    and older pages are read back from it on demand; otherwise messages
+    older than the ring are dropped. Messages are numbered from 0 in the
+    order they were appended.
+    """
+    def __init__(self, archive=None, game_id: str = None, stream: str = None,
+                 capacity: int = HISTORY_CAPACITY):
+        self.archive = archive
+        self.game_id = game_id
+        self.stream = stream
+        self.ring = deque(maxlen=capacity)
+        self.pending: List[str] = []  # not yet written to the archive
+        self.count = 0
+        if archive is not None:
+            # Continue a restored game's history where it left off
+            self.count = archive.count(game_id, stream)
+            self.ring.extend(archive.page(
+                game_id, stream, max(self.count - capacity, 0), self.count))
+
+    def __len__(self) -> int:
+        return self.count
+
+    def append(self, msg: str):
+        self.ring.append(msg)
+        self.count += 1
+        if self.archive is not None:
+            self.pending.append(msg)
+            if len(self.pending) >= ARCHIVE_BATCH_SIZE:
+                self.flush()
+
+    def tail(self, n: int) -> List[str]:
+        """The last n messages (fewer if the ring holds fewer)."""
+        n = min(n, len(self.ring))
+        return [self.ring[i] for i in range(len(self.ring) - n, len(self.ring))]
+
+    def page(self, before: Optional[int] = None, limit: int = HISTORY_CAPACITY) -> Tuple[int, List[str]]:
+        """
+        Up to limit messages immediately before message number `before`
+        (default: the end), as (number of the first message, messages).
+        """
+        stop = self.count if before is None else min(max(before, 0), self.count)
+        start = max(stop - limit, 0)
+        first_in_ring = self.count - len(self.ring)
+        if start >= first_in_ring:
+            return start, [self.ring[i - first_in_ring] for i in range(start, stop)]
+        if self.archive is None:
+            start = min(first_in_ring, stop)
+            return start, [self.ring[i - first_in_ring] for i in range(start, stop)]
+        self.flush()
+        return start, self.archive.page(self.game_id, self.stream, start, stop)
+
+    def flush(self):
+        """Writes pending messages to the archive."""
+        if self.pending:
+            self.archive.append(
+                self.game_id, self.stream, self.count - len(self.pending), self.pending)
+            self.pending = []
@@ -16,6 +16,13 @@ class BaseUI(ABC):
     def display_message(self, msg: str):
         pass
 
+    def flush(self):
+        """
+        Sends any buffered updates. Called by the orchestrator before it
+        waits for input and at the end of every turn.
+        """
+        pass
+
     @abstractmethod
     def get_tile_from_user(self, player: PlayerState) -> Tile:
         pass
@@ -31,3 +38,7 @@ class BaseUI(ABC):
     @abstractmethod
     def get_user_liquidation_option(self, name: str, num_shares: int) -> Tuple[int, int]:
         pass
+
+    async def display_final_scores(self, players: List[PlayerState]):
+        """Called once when the game ends."""
+        pass
@@ -1,134 +1,279 @@
 import asyncio
+import json
 import logging
+import time
 from flask_socketio import SocketIO
-from typing import List, Tuple
+from typing import List, Optional, Tuple
 from acquisitions.game_logic.constants import *
 from acquisitions.game_logic.tile import Tile
 from acquisitions.game_logic.player import PlayerState
 from acquisitions.game_logic.board_state import CellState
+from acquisitions.game_logic.metrics import NO_METRICS, SIZE_BUCKETS
+from acquisitions.ui.message_history import MessageHistory
 from acquisitions.ui.ui_interface import BaseUI
 
+# Cell codes sent to the browser: 0-6 are hotels (Hotel value), the rest are
+# as below.
+CELL_UNINCORPORATED = Hotel.NO_HOTEL.value  # occupied, not part of a hotel
+CELL_EMPTY = CELL_UNINCORPORATED + 1
+CELL_DEAD = CELL_UNINCORPORATED + 2
+HOTEL_CODES = [str(hotel) for hotel in Hotel if hotel != Hotel.NO_HOTEL]
+NUM_LAST_MESSAGES = 5
+
+class RoomChannel:
+    """
+    The public, room-wide update stream of one game, shared by its WebUIs.
+    Board renders and public messages are buffered and go out as a single
+    'delta' broadcast to the game's room per flush; the first update a
+    client sees (and the reply to a 'resync' request) is a full 'snapshot'
+    sent to that client alone. Every update carries a sequence number so
+    clients can detect gaps and resync.
+    """
+    def __init__(self, game_id, socketio, history: Optional[MessageHistory] = None):
+        self.game_id = game_id
+        self.socketio = socketio
+        self.message_history = history if history is not None else MessageHistory()
+        self.seq = 0
+        self.cell_codes = bytearray([CELL_EMPTY]) * (NUM_ROWS * NUM_COLS)
+        self.changed_cells = {}  # index -> code, not yet sent
+        self.new_messages = []  # messages not yet sent
+        self.metrics = NO_METRICS  # counts emits and their sizes, if enabled
+        self.profile = None  # the game's GameProfile, while it is profiled
+
+    def render_board(self, cell_states: List[List[CellState]]):
+        idx = 0
+        for row in cell_states:
+            for cell_state in row:
+                if not cell_state.occupied:
+                    code = CELL_EMPTY
+                elif cell_state.dead_zone:
+                    code = CELL_DEAD
+                else:
+                    code = cell_state.hotel.value
+                if code != self.cell_codes[idx]:
+                    self.cell_codes[idx] = code
+                    self.changed_cells[idx] = code
+                idx += 1
+
+    def display_message(self, msg: str):
+        self.message_history.append(msg)
+        self.new_messages.append(msg)
+
+    def last_messages(self):
+        return self.message_history.tail(NUM_LAST_MESSAGES)
+
+    def flush(self):
+        """Broadcasts everything buffered since the last flush, if anything."""
+        if not self.changed_cells and not self.new_messages:
+            return
+        self.seq += 1
+        update = {'type': 'delta', 'seq': self.seq}
+        if self.changed_cells:
+            update['cells'] = [x for item in self.changed_cells.items() for x in item]
+            self.changed_cells = {}
+        if self.new_messages:
+            update['messages'] = self.new_messages
+            self.new_messages = []
+        self._emit('game_update', update, self.game_id)
+
+    def send_snapshot(self, sid: str):
+        """Sends the current state of the stream to a single client."""
+        self.flush()
+        self._emit('game_update', {
+            'type': 'snapshot',
+            'seq': self.seq,
+            'board_dimensions': {'rows': NUM_ROWS, 'cols': NUM_COLS},
+            'hotel_codes': HOTEL_CODES,
+            'board': list(self.cell_codes),
+            'messages': self.last_messages(),
+        }, sid)
+
+    def _emit(self, event, data, room):
+        record_emit(self, data)
+        self.socketio.emit(event, data, room=room)
+
+
+def record_emit(channel, data):
+    """Records an emit in the metrics and profile of the channel (or WebUI)."""
+    metrics, profile = channel.metrics, channel.profile
+    metrics.inc('emits')
+    # Sizing a payload serializes it once more than sending it does
+    if profile is None and not metrics.emit_sizes:
+        return
+    start = time.perf_counter()
+    size = len(json.dumps(data))
+    if profile is not None:
+        profile.metrics.observe('emit_serialize_seconds', time.perf_counter() - start)
+    if metrics.emit_sizes:
+        metrics.observe('emit_bytes', size, SIZE_BUCKETS)
+
+
 class WebUI(BaseUI):
-    def __init__(self, game_id, socketio, loop):
+    """
+    UI for one player in a browser, over Socket.IO.
+    Public updates (board and messages for everyone) go through the game's
+    shared RoomChannel. This UI carries the player's private stream:
+    'player_update's with prompts and messages for this player only, sent
+    to the player's socket with their own sequence number ('pseq'). Private
+    messages are buffered until the next flush or prompt.
+    """
+    def __init__(self, game_id, socketio, loop, room: Optional[RoomChannel] = None,
+                 history: Optional[MessageHistory] = None):
         self.game_id = game_id
         self.socketio = socketio
         self.loop = loop
+        self.room = room or RoomChannel(game_id, socketio)
         self.user_input = asyncio.Queue()
-        self.message_history = []
-        self.board_data = None
+        self.message_history = history if history is not None else MessageHistory()
+        self.sid = None  # socket id of the player's client, once joined
+        self.pseq = 0
+        self.new_messages = []  # private messages not yet sent to the client
+        self.prompt = None  # the outstanding input_required payload, if any
+        self.metrics = NO_METRICS
+        self.profile = None
+
+    def bind(self, sid: str):
+        """Binds this UI to a player's socket and sends it full snapshots."""
+        self.sid = sid
+        self.send_snapshot()
+
+    def send_snapshot(self):
+        """Resends both the public and the private stream state."""
+        if self.sid is None:
+            return
+        self.room.send_snapshot(self.sid)
+        self.new_messages = []
+        self._emit('player_update', {
+            'type': 'snapshot',
+            'pseq': self.pseq,
+            'messages': self.last_messages(),
+            'prompt': self.prompt,
+        })
 
     def receive_input(self, data):
-        logging.debug(f"Received input: {data}")
-        self.user_input.put_nowait(data)
+        logging.debug("Received input: %s", data)
+        if self.loop is None:
+            # Socket handlers share the game's loop (see AsyncGameServer)
+            self.accept_input(data)
+        else:
+            # Called from the socket thread; the queue belongs to the game's loop.
+            self.loop.call_soon_threadsafe(self.accept_input, data)
         logging.debug("Added to user input")
 
+    def accept_input(self, data):
+        self.prompt = None
+        if self.profile is not None:
+            self.profile.input_received()
+        self.user_input.put_nowait(data)
+
+    async def next_input(self):
+        """The player's next input, once it arrives."""
+        if self.profile is None:
+            return await self.user_input.get()
+        return await self.profile.wait_for_input(self.user_input)
+
     def display_message(self, msg: str):
-        logging.debug(f"Displaying message: {msg}")
+        """Buffers a message for this player only, until the next flush."""
+        logging.debug("Displaying message: %s", msg)
         self.message_history.append(msg)
-        self._emit('game_update', {
-            'type': 'message',
-            'board_dimensions': {'rows': NUM_ROWS, 'cols': NUM_COLS},
-            'board': self.board_data,
-            'messages': self.last_messages()
-        })
+        self.new_messages.append(msg)
 
     def render_board(self, cell_states: List[List[CellState]]):
-        logging.debug("Rendering board")
-        self._emit('game_update', {
-            'type': 'board_update',
-            'board': self.update_board_data(cell_states),
-            'board_dimensions': {'rows': NUM_ROWS, 'cols': NUM_COLS},
-            'messages': self.last_messages()
-        })
-        logging.debug("Emitted board")
+        self.room.render_board(cell_states)
+
+    def flush(self):
+        self.room.flush()
+        if self.new_messages:
+            self._emit('player_update', {
+                'type': 'messages',
+                'pseq': self.next_pseq(),
+                'messages': self.take_new_messages(),
+            })
 
     async def get_tile_from_user(self, player: PlayerState) -> Tile:
-        logging.debug(f"Getting tile from user: {player.name}")
-        await self._emit('game_update', {
-            'type': 'input_required',
+        logging.debug("Getting tile from user: %s", player.name)
+        self.send_prompt({
             'input_type': 'tile',
             'player': player.name,
-            'available_tiles': [str(tile) for tile in player.tiles],
-            'board_dimensions': {'rows': NUM_ROWS, 'cols': NUM_COLS},
-            'messages': self.last_messages()
+            'available_tiles': [str(tile) for tile in sorted(player.tiles, key=lambda t: t.index)],
         })
         logging.debug("Emitted message to frontend")
-        result = await self.user_input.get()
+        result = await self.next_input()
         logging.debug("Got tile str")
         return Tile.from_str(result['tile'])
 
     async def get_hotel_from_user(self, player: PlayerState, hotels: List[Hotel]) -> Hotel:
-        logging.debug(f"Getting hotel from user: {player.name}")
-        await self._emit('game_update', {
-            'type': 'input_required',
+        logging.debug("Getting hotel from user: %s", player.name)
+        self.send_prompt({
             'input_type': 'hotel',
             'player': player.name,
             'available_hotels': [hotel.name for hotel in hotels],
-            'board_dimensions': {'rows': NUM_ROWS, 'cols': NUM_COLS},
-            'messages': self.last_messages()
         })
-        hotel_str = await self.user_input.get()
-        return Hotel.from_str(hotel_str)
+        hotel_data = await self.next_input()
+        return Hotel.from_str(hotel_data['hotel'])
 
-    async def get_buy_order_from_user(self, player: PlayerState) -> List[int]:
-        logging.debug(f"Getting buy order from user: {player.name}")
-        await self._emit('game_update', {
-            'type': 'input_required',
+    async def get_buy_order_from_user(self, player: PlayerState, hotels: List[Hotel]) -> List[int]:
+        logging.debug("Getting buy order from user: %s", player.name)
+        self.send_prompt({
             'input_type': 'buy_order',
             'player': player.name,
-            'available_hotels': [hotel.name for hotel in Hotel if hotel != Hotel.NO_HOTEL],
-            'board_dimensions': {'rows': NUM_ROWS, 'cols': NUM_COLS},
-            'messages': self.last_messages()
+            'available_hotels': [hotel.name for hotel in hotels],
         })
-        buy_order_data = await self.user_input.get()
+        buy_order_data = await self.next_input()
         buy_order = [0] * NUM_HOTELS
-        for hotel, quantity in buy_order_data.items():
+        for hotel, quantity in buy_order_data['buy_order'].items():
             hotel_enum = Hotel.from_str(hotel)
             buy_order[hotel_enum.value] = int(quantity)
         return buy_order
 
     async def get_user_liquidation_option(self, name: str, num_shares: int) -> Tuple[int, int]:
-        logging.debug(f"Getting liquidation option from user: {name}")
-        await self._emit('game_update', {
-            'type': 'input_required',
+        logging.debug("Getting liquidation option from user: %s", name)
+        self.send_prompt({
             'input_type': 'liquidation',
             'player': name,
             'num_shares': num_shares,
-            'board_dimensions': {'rows': NUM_ROWS, 'cols': NUM_COLS},
-            'messages': self.last_messages()
         })
-        liquidation_data = await self.user_input.get()
+        liquidation_data = await self.next_input()
         return int(liquidation_data['sell']), int(liquidation_data['twofer'])
 
     async def display_final_scores(self, players: List[PlayerState]):
         logging.debug("Displaying final scores")
         scores = [{'name': p.name, 'money': p.money} for p in players]
         rankings = sorted(scores, key=lambda x: -x['money'])
-        await self._emit('game_update', {
+        self.room.flush()
+        self._emit('player_update', {
             'type': 'final_scores',
+            'pseq': self.next_pseq(),
             'scores': rankings,
-            'board_dimensions': {'rows': NUM_ROWS, 'cols': NUM_COLS},
-            'messages': self.last_messages()
+            'messages': self.take_new_messages()
         })
 
     def last_messages(self):
-        return self.message_history[-5:] if len(self.message_history) > 5 else self.message_history[:]
-    
-    def update_board_data(self, cell_states):
-        self.board_data = []
-        for r in range(NUM_ROWS):
-            row = []
-            for c in range(NUM_COLS):
-                cell_state = cell_states[r][c]
-                cell = {
-                    'occupied': cell_state.occupied,
-                    'dead_zone': cell_state.dead_zone,
-                    'content': cell_state.hotel.name[:2] if cell_state.occupied and cell_state.hotel != Hotel.NO_HOTEL
-                               else ('ZZ' if cell_state.dead_zone else f"{r}-{c}")
-                }
-                row.append(cell)
-            self.board_data.append(row)
-        return self.board_data
+        return self.message_history.tail(NUM_LAST_MESSAGES)
+
+    def take_new_messages(self):
+        new_messages, self.new_messages = self.new_messages, []
+        return new_messages
+
+    def next_pseq(self) -> int:
+        self.pseq += 1
+        return self.pseq
+
+    def send_prompt(self, prompt: dict):
+        """Prompts are a flush point: pending updates go out first."""
+        self.prompt = prompt
+        self.room.flush()
+        self._emit('player_update', {
+            'type': 'input_required',
+            'pseq': self.next_pseq(),
+            'messages': self.take_new_messages(),
+            **prompt,
+        })
 
     def _emit(self, event, data):
-        self.socketio.emit(event, data, room=self.game_id)
+        # Until the player's client joins, there is no one to send to; it
+        # receives full snapshots when it binds.
+        if self.sid is None:
+            return
+        record_emit(self, data)
+        self.socketio.emit(event, data, room=self.sid)